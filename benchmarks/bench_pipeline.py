@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+CognOS pipeline latency benchmarks.
+
+Times every stage of a natural language request (config load and lookup,
+logger setup, tool registry construction, prompt build, inference, JSON
+parse, tool calls, shell classification, per-command shell overhead, shell
+time-to-prompt) against FakeLlama, so it runs on CI boxes without a model
+file. Results are written as JSON and can be compared against a stored
+baseline to catch regressions.
+
+Usage:
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --baseline baseline.json --tolerance 0.25
+"""
+
+import argparse
+import copy
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.fake_llama import FakeLlama
+
+
+REQUESTS = [
+    "show me the files in this folder",
+    "create a file called notes.txt",
+    "find the downloads directory",
+    "make a python environment for my project"
+]
+
+COMMANDS = [
+    "ls -la",
+    "git status",
+    "please show me my documents",
+    "go to the downloads folder",
+    "python3 manage.py runserver",
+    "what is using all the disk space on this machine"
+]
+
+# Isolates the measured stages from caches that would hide inference cost
+BENCH_CONFIG = {
+    "agent": {
+        "prompt_cache": {"enabled": True},
+        "response_cache": {"enabled": False},
+        "intents": {"enabled": False},
+        "grammar": {"enabled": False}
+    }
+}
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Summary statistics for a list of durations in milliseconds."""
+    ordered = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    return {
+        "iterations": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1]
+    }
+
+
+def time_stage(func: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    """Call ``func(i)`` ``iterations`` times and summarize the durations."""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def shell_startup_ms() -> float:
+    """Time to first prompt of a fresh cognos-shell process, as it reports it."""
+    shell = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'shell', 'main.py')
+    result = subprocess.run(
+        [sys.executable, shell, "--profile-startup"],
+        input="exit\n", capture_output=True, text=True, timeout=60
+    )
+    for line in result.stderr.splitlines():
+        if line.strip().startswith("time to prompt"):
+            return float(line.split()[-1])
+    raise RuntimeError(f"cognos-shell did not report its startup time: {result.stderr[-500:]}")
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run every stage and return machine-readable results."""
+    # Imported after HOME is redirected so nothing touches the real config
+    from src.common.config import Config, get_config
+    from src.common.logger import Logger
+    from src.tools.registry import ToolRegistry
+    from src.agent.llama_client import LlamaClient
+    from src.agent.main import CognosAgent
+    from src.shell.main import CognosShell
+    from src.shell.backend import PersistentShell
+    from src.tools.output_cache import OutputCache
+
+    iterations = args.iterations
+    config_path = os.path.join(os.environ["HOME"], ".config", "cognos", "config.json")
+    stages = {}
+
+    stages["config_load"] = time_stage(lambda i: Config(config_path), iterations)
+
+    shared_config = get_config(config_path)
+    stages["config_get"] = time_stage(lambda i: shared_config.get("agent.temperature"), iterations)
+
+    loggers = []
+    stages["logger_setup"] = time_stage(
+        lambda i: loggers.append(Logger(name=f"cognos.bench.{i}")), iterations
+    )
+    for bench_logger in loggers:
+        for handler in list(bench_logger.logger.handlers):
+            handler.close()
+            bench_logger.logger.removeHandler(handler)
+
+    stages["registry_construction"] = time_stage(lambda i: ToolRegistry(), iterations)
+
+    fake_model = FakeLlama(
+        token_latency=args.token_latency_ms / 1000,
+        prompt_token_latency=args.prompt_token_latency_ms / 1000
+    )
+    agent = CognosAgent(llama_client=LlamaClient(model=fake_model))
+
+    def request(i: int) -> str:
+        return REQUESTS[i % len(REQUESTS)]
+
+    stages["build_prompt"] = time_stage(lambda i: agent._build_prompt(request(i)), iterations)
+
+    prompts = [agent._build_prompt(text) for text in REQUESTS]
+    outputs = []
+    stages["inference"] = time_stage(
+        lambda i: outputs.append(agent.llama_client.generate(prompts[i % len(prompts)])),
+        iterations
+    )
+
+    stages["json_parse"] = time_stage(lambda i: json.loads(outputs[i % len(outputs)]), iterations)
+
+    parsed = json.loads(outputs[0])
+    stages["process_tool_calls"] = time_stage(
+        lambda i: agent._process_tool_calls(copy.deepcopy(parsed)), iterations
+    )
+
+    # Classification is stateless; skip __init__, which starts the agent loader
+    shell = CognosShell.__new__(CognosShell)
+    stages["classification"] = time_stage(
+        lambda i: [shell.is_natural_language(command) for command in COMMANDS], iterations
+    )
+
+    stages["end_to_end"] = time_stage(lambda i: agent.process_command(request(i)), iterations)
+
+    # Per-command overhead of the shell backends, measured on a no-op command
+    stages["command_subprocess"] = time_stage(
+        lambda i: subprocess.run("true", shell=True), iterations
+    )
+    backend = PersistentShell()
+    backend.start()
+    stages["command_persistent"] = time_stage(
+        lambda i: backend.run("true", output=io.BytesIO()), iterations
+    )
+    backend.close()
+
+    # Repeated read-only command answered from the output cache
+    output_cache = OutputCache()
+    stages["command_cached"] = time_stage(
+        lambda i: output_cache.run("ls", cwd=os.environ["HOME"]), iterations
+    )
+
+    # Each sample is a new process, so fewer of them
+    stages["shell_startup"] = summarize([shell_startup_ms() for _ in range(min(iterations, 10))])
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "token_latency_ms": args.token_latency_ms,
+            "prompt_token_latency_ms": args.prompt_token_latency_ms,
+            "timestamp": time.time()
+        },
+        "stages": stages
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float, min_delta_ms: float) -> List[str]:
+    """Return a description of every stage whose p50 regressed past tolerance."""
+    regressions = []
+    for name, stage in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+
+        delta = stage["p50_ms"] - base["p50_ms"]
+        if delta > min_delta_ms and stage["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {stage['p50_ms']:.3f} ms vs baseline {base['p50_ms']:.3f} ms "
+                f"(+{delta / base['p50_ms']:.0%})"
+            )
+    return regressions
+
+
+def print_table(results: Dict[str, Any]):
+    """Human-readable summary on stderr (stdout may carry the JSON)."""
+    print(f"{'stage':<24}{'p50 ms':>12}{'p95 ms':>12}{'mean ms':>12}", file=sys.stderr)
+    for name, stage in results["stages"].items():
+        print(
+            f"{name:<24}{stage['p50_ms']:>12.3f}{stage['p95_ms']:>12.3f}{stage['mean_ms']:>12.3f}",
+            file=sys.stderr
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CognOS pipeline latency benchmarks")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0,
+                        help="simulated decode latency per generated token")
+    parser.add_argument("--prompt-token-latency-ms", type=float, default=0.0,
+                        help="simulated prefill latency per uncached prompt token")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="compare against results from a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative p50 slowdown before a stage counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore regressions smaller than this absolute slowdown")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        # Keep config, logs and caches out of the real home directory
+        os.environ["HOME"] = home
+        config_dir = os.path.join(home, ".config", "cognos")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "config.json"), "w") as f:
+            json.dump(BENCH_CONFIG, f)
+
+        results = run_benchmarks(args)
+        logging.shutdown()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    print_table(results)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
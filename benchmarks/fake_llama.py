@@ -0,0 +1,94 @@
+"""
+Deterministic stand-in for llama_cpp.Llama used by the benchmarks.
+
+Implements the subset of the Llama interface that LlamaClient relies on
+(tokenize, eval, reset, save/load_state, streaming completion) and charges a
+configurable latency per prefilled and per decoded token, so the pipeline can
+be timed on a machine without a model file or llama-cpp-python.
+"""
+
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+
+DEFAULT_RESPONSE = (
+    '{"action": "execute", "command": "ls -la", "message": "List files in the current directory", '
+    '"tool_calls": [{"tool": "run_command", "args": {"command": "ls -la"}}]}'
+)
+
+
+class FakeLlamaState:
+    """Saved KV state: just the evaluated token ids."""
+
+    def __init__(self, input_ids: List[int]):
+        self.input_ids = list(input_ids)
+
+
+class FakeLlama:
+    """Fake model with per-token prefill and decode latency."""
+
+    def __init__(self, response: str = DEFAULT_RESPONSE, token_latency: float = 0.0,
+                 prompt_token_latency: float = 0.0, chars_per_token: int = 4):
+        self.response = response
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.chars_per_token = chars_per_token
+        self.input_ids: List[int] = []
+        self.n_tokens = 0
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [zlib.crc32(word) % 32000 for word in text.split()]
+        return ([1] if add_bos else []) + tokens
+
+    def reset(self):
+        self.input_ids = []
+        self.n_tokens = 0
+
+    def eval(self, tokens: List[int]):
+        self._sleep(self.prompt_token_latency * len(tokens))
+        self.input_ids = self.input_ids[:self.n_tokens] + list(tokens)
+        self.n_tokens = len(self.input_ids)
+
+    def save_state(self) -> FakeLlamaState:
+        return FakeLlamaState(self.input_ids[:self.n_tokens])
+
+    def load_state(self, state: FakeLlamaState):
+        self.input_ids = list(state.input_ids)
+        self.n_tokens = len(self.input_ids)
+
+    def __call__(self, prompt: str, stream: bool = False, max_tokens: int = 512, **kwargs) -> Any:
+        self._prefill(self.tokenize(prompt.encode("utf-8")))
+        pieces = [
+            self.response[i:i + self.chars_per_token]
+            for i in range(0, len(self.response), self.chars_per_token)
+        ][:max_tokens]
+
+        if stream:
+            return self._stream(pieces)
+
+        self._sleep(self.token_latency * len(pieces))
+        return {
+            "choices": [{"text": "".join(pieces), "finish_reason": "stop"}],
+            "usage": {"completion_tokens": len(pieces)}
+        }
+
+    def _prefill(self, tokens: List[int]):
+        """Evaluate only the tokens after the longest cached prefix."""
+        reused = 0
+        for cached, token in zip(self.input_ids[:self.n_tokens], tokens):
+            if cached != token:
+                break
+            reused += 1
+        self.n_tokens = reused
+        self.eval(tokens[reused:])
+
+    def _stream(self, pieces: List[str]) -> Iterator[Dict[str, Any]]:
+        for piece in pieces:
+            self._sleep(self.token_latency)
+            yield {"choices": [{"text": piece, "finish_reason": None}]}
+
+    @staticmethod
+    def _sleep(seconds: Optional[float]):
+        if seconds:
+            time.sleep(seconds)
@@ -27,6 +27,11 @@ source venv/bin/activate
 echo "Installing Python dependencies..."
 pip install -r requirements.txt
 
+# Precompile bytecode so the first shell start does not compile sources
+# (and later starts do not need a writable __pycache__)
+echo "Compiling Python bytecode..."
+python3 -m compileall -q src
+
 # Download models
 echo "Downloading models..."
 ./scripts/download-models.sh
@@ -48,5 +53,8 @@ echo ""
 echo "To test CognOS without changing your default shell:"
 echo "  /usr/local/bin/cognos-shell"
 echo ""
+echo "To see where startup time goes:"
+echo "  cognos-shell --profile-startup"
+echo ""
 echo "Configuration: ~/.config/cognos/config.json"
-echo "Logs: ~/.local/share/cognos/cognos.log"
\ No newline at end of file
+echo "Logs: ~/.local/share/cognos/cognos.jsonl"
\ No newline at end of file
@@ -41,6 +41,8 @@ setup(
             "cognos-shell=shell.main:main",
             "cognos-ui=ui.main:main",
             "cognos-agent=agent.main:main",
+            "cognos-agentd=agent.daemon:main",
+            "cognos-trace=common.tracing:main",
         ],
     },
     include_package_data=True,
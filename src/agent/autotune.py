@@ -0,0 +1,205 @@
+"""
+Per-host inference tuning for llama.cpp (``cognos-agent --autotune``).
+
+The best thread count, batch size, mmap/mlock setting and context length
+depend on the CPU, memory and model, so they are measured rather than
+hardcoded. The sweep is a coordinate search: it tunes one parameter at a
+time and keeps the best value of each for the next. Every candidate is
+scored by the time it takes to prefill a fixed prompt and decode a fixed
+number of tokens. A candidate within ``TOLERANCE`` of the best score counts
+as tied, and ties go to the earlier, cheaper candidate, e.g. fewer threads,
+so a machine is not oversubscribed for noise-level gains.
+
+Profiles are saved per host and model fingerprint; LlamaClient._load_model
+picks them up at startup.
+"""
+
+import json
+import os
+import platform
+import socket
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# What _load_model used before any tuning; still used when no profile exists
+DEFAULT_PROFILE = {"n_threads": 2, "n_batch": 128, "use_mmap": True, "use_mlock": False}
+
+TOLERANCE = 0.03
+
+# A realistic request: the agent's prompt core plus a user request
+BENCH_PROMPT = (
+    "System: You are CognOS, an AI assistant that helps users interact with their Linux system. "
+    "ALWAYS respond in JSON with action, command, message and tool_calls.\n\n"
+    "Context:\n- Current directory: /home/pi/projects\n- User: pi\n- Operating system: Linux\n\n"
+    "User request: find every python file changed in the last two days and show their sizes\n\n"
+    "Response (JSON):"
+)
+BENCH_DECODE_TOKENS = 32
+
+
+def host_id() -> str:
+    """Hostname plus CPU model and count: a profile is only valid on the same machine."""
+    cpu = platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.lower().startswith(("model name", "hardware")):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return f"{socket.gethostname()}|{cpu}|{os.cpu_count()}"
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def profile_path(config) -> str:
+    return os.path.expanduser(config.get("agent.autotune.path", "~/.cache/cognos/tuning.json"))
+
+
+def _read_profiles(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_profile(config, model_hash: str) -> Optional[Dict[str, Any]]:
+    """Saved profile for this host and model, or None."""
+    if not config.get("agent.autotune.enabled", True):
+        return None
+    return _read_profiles(profile_path(config)).get(f"{host_id()}|{model_hash}")
+
+
+def save_profile(config, model_hash: str, profile: Dict[str, Any]):
+    """Store ``profile`` for this host and model (atomic rewrite of the profile file)."""
+    import tempfile
+
+    path = profile_path(config)
+    profiles = _read_profiles(path)
+    profiles[f"{host_id()}|{model_hash}"] = profile
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tuning-", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(profiles, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def llama_kwargs(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """The llama_cpp.Llama arguments a profile sets."""
+    return {key: profile[key] for key in ("n_threads", "n_batch", "use_mmap", "use_mlock") if key in profile}
+
+
+class Autotuner:
+    """Coordinate search over llama.cpp load parameters for one model."""
+
+    def __init__(self, model_path: str, max_ctx: int, min_ctx: int = 512,
+                 log: Callable[[str], None] = print):
+        self.model_path = model_path
+        self.max_ctx = max_ctx
+        self.min_ctx = min(min_ctx, max_ctx)
+        self.log = log
+        self.results: List[Dict[str, Any]] = []
+
+    def candidates(self) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        """Each parameter's values to try, default or cheapest first."""
+        cpus = available_cpus()
+        threads = sorted({n for n in (1, 2, 3, 4, 6, 8, 12, 16, 24, 32) if n <= cpus} | {cpus})
+        contexts = sorted({n for n in (self.max_ctx, 4096, 2048, 1024) if self.min_ctx <= n <= self.max_ctx},
+                          reverse=True)
+        return [
+            ("n_threads", [{"n_threads": n} for n in threads]),
+            ("n_batch", [{"n_batch": n} for n in (128, 32, 64, 256, 512)]),
+            ("memory", [{"use_mmap": True, "use_mlock": False},
+                        {"use_mmap": True, "use_mlock": True},
+                        {"use_mmap": False, "use_mlock": False}]),
+            # Largest first: more room for prompts unless it costs speed
+            ("n_ctx", [{"n_ctx": n} for n in contexts])
+        ]
+
+    def measure(self, params: Dict[str, Any]) -> Dict[str, float]:
+        """Load the model with ``params`` and time prefill and greedy decode."""
+        from llama_cpp import Llama
+
+        start = time.perf_counter()
+        model = Llama(model_path=self.model_path, verbose=False, **params)
+        load_s = time.perf_counter() - start
+        try:
+            tokens = model.tokenize(BENCH_PROMPT.encode("utf-8"))
+            best = None
+            # Two runs; the faster one is less disturbed by the rest of the system
+            for _ in range(2):
+                model.reset()
+                start = time.perf_counter()
+                model.eval(tokens)
+                prefill_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in range(BENCH_DECODE_TOKENS):
+                    model.eval([model.sample(top_k=1, temp=0.0)])
+                decode_s = time.perf_counter() - start
+
+                if best is None or prefill_s + decode_s < best[0] + best[1]:
+                    best = (prefill_s, decode_s)
+        finally:
+            del model
+
+        return {
+            "load_s": load_s,
+            "prefill_tps": len(tokens) / best[0],
+            "decode_tps": BENCH_DECODE_TOKENS / best[1],
+            "score_s": best[0] + best[1]
+        }
+
+    def run(self) -> Dict[str, Any]:
+        """Sweep every parameter and return the best profile with its measurements."""
+        chosen = dict(DEFAULT_PROFILE, n_ctx=self.max_ctx)
+        measurement = None
+
+        for name, options in self.candidates():
+            scored = []
+            for option in options:
+                params = {**chosen, **option}
+                try:
+                    result = self.measure(params)
+                except ImportError:
+                    raise
+                except Exception as e:
+                    self.log(f"  {name} {option}: failed ({e})")
+                    continue
+                self.results.append({"params": params, **result})
+                self.log(
+                    f"  {name} {option}: prefill {result['prefill_tps']:.1f} tok/s, "
+                    f"decode {result['decode_tps']:.1f} tok/s, load {result['load_s']:.1f}s"
+                )
+                scored.append((option, result))
+
+            if not scored:
+                continue
+            best_score = min(result["score_s"] for _, result in scored)
+            option, measurement = next(
+                (option, result) for option, result in scored
+                if result["score_s"] <= best_score * (1 + TOLERANCE)
+            )
+            chosen.update(option)
+
+        if measurement is None:
+            raise RuntimeError("No configuration could be measured")
+
+        return {
+            **chosen,
+            "prefill_tps": round(measurement["prefill_tps"], 2),
+            "decode_tps": round(measurement["decode_tps"], 2),
+            "tuned_at": time.time()
+        }
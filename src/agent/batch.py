@@ -0,0 +1,169 @@
+"""
+Batch (non-interactive) mode for cognos-agent.
+
+Reads requests as JSONL and writes one JSONL result per request, in input
+order, with a single loaded model. Each input line is either a JSON string or
+an object such as
+
+    {"id": "deploy-3", "command": "show me disk usage", "context": {"pwd": "/srv"}}
+
+and each output line looks like
+
+    {"id": "deploy-3", "ok": true, "response": {...}, "duration_ms": 412.5,
+     "usage": {"prompt_tokens": 180, "cached_tokens": 151, "completion_tokens": 38}}
+
+Every prompt starts with the agent's static prefix, which stays in the KV
+cache, so only the per-request tail is prefilled (``cached_tokens``).
+Requests the agent fails on (or that are cancelled or time out) have
+``"ok": false`` and an ``"error"`` next to the response. A ``pwd`` in the
+context is the working directory the request's tools run in.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent import futures as cf
+from typing import Dict, Any, Iterable, Iterator, Optional, TextIO, Tuple
+
+
+def parse_request(line: str, number: int) -> Tuple[Any, Optional[str], Dict[str, Any], Optional[str]]:
+    """Split an input line into (id, command, context, error)."""
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        return number, None, {}, f"Invalid JSON: {e}"
+
+    if isinstance(item, str):
+        return number, item, {}, None
+    if not isinstance(item, dict):
+        return number, None, {}, "Expected a JSON object or string"
+
+    command = item.get("command", item.get("request"))
+    if not isinstance(command, str) or not command.strip():
+        return item.get("id", number), None, {}, "Missing \"command\""
+    return item.get("id", number), command, item.get("context") or {}, None
+
+
+class BatchRunner:
+    """Runs a stream of requests through one agent and totals throughput."""
+
+    def __init__(self, agent, parallel: int = 1):
+        self.agent = agent
+        self.parallel = max(1, parallel)
+        self.totals = {
+            "requests": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0
+        }
+        self.elapsed = 0.0
+        # Tools resolve relative paths against the process cwd, which requests
+        # share: requests for the same directory run together, others wait
+        self._cwd_cond = threading.Condition()
+        self._home = None
+        self._cwd = None
+        self._cwd_users = 0
+
+    def _enter_directory(self, directory: str) -> None:
+        with self._cwd_cond:
+            while self._cwd_users and self._cwd != directory:
+                self._cwd_cond.wait()
+            if self._cwd != directory:
+                os.chdir(directory)
+                self._cwd = directory
+            self._cwd_users += 1
+
+    def _leave_directory(self) -> None:
+        with self._cwd_cond:
+            self._cwd_users -= 1
+            if not self._cwd_users:
+                self._cwd_cond.notify_all()
+
+    def _process(self, request_id, command: Optional[str], context: Dict[str, Any],
+                 error: Optional[str]) -> Dict[str, Any]:
+        if error is not None:
+            return {"id": request_id, "ok": False, "error": error}
+
+        client = self.agent.llama_client
+        client.last_usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        pwd = context.get("pwd")
+        self._enter_directory(pwd if pwd and os.path.isdir(pwd) else self._home)
+        try:
+            start = time.perf_counter()
+            response = self.agent.process_command(command, context)
+        finally:
+            self._leave_directory()
+
+        result = {
+            "id": request_id,
+            "ok": True,
+            "response": response,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "usage": dict(client.last_usage)
+        }
+        error = response.get("error") or response.get("cancelled")
+        if error:
+            result["ok"] = False
+            result["error"] = error
+        return result
+
+    def results(self, lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Result per non-blank input line, in input order.
+
+        With ``parallel`` > 1, intent matching, cache lookups and tool calls
+        of several requests overlap; model generation itself is serialized by
+        the client, since llama_cpp.Llama decodes a single sequence.
+        """
+        requests = (
+            parse_request(line, number)
+            for number, line in enumerate(lines, 1) if line.strip()
+        )
+        start = time.perf_counter()
+        self._home = self._cwd = os.getcwd()
+
+        try:
+            if self.parallel == 1:
+                for request in requests:
+                    yield self._count(self._process(*request))
+                return
+
+            # A bounded window keeps thousands of queued requests out of memory
+            with cf.ThreadPoolExecutor(max_workers=self.parallel,
+                                       thread_name_prefix="cognos-batch") as pool:
+                window = []
+                for request in requests:
+                    window.append(pool.submit(self._process, *request))
+                    if len(window) >= self.parallel * 2:
+                        yield self._count(window.pop(0).result())
+                for future in window:
+                    yield self._count(future.result())
+        finally:
+            self.elapsed = time.perf_counter() - start
+            os.chdir(self._home)
+
+    def _count(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        self.totals["requests"] += 1
+        if not result["ok"]:
+            self.totals["errors"] += 1
+        for field, count in result.get("usage", {}).items():
+            self.totals[field] += count
+        return result
+
+    def run(self, lines: Iterable[str], output: TextIO) -> Dict[str, Any]:
+        """Write one JSON line per request to ``output`` and return the summary."""
+        for result in self.results(lines):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = self.elapsed
+        return {
+            **self.totals,
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_sec": round(self.totals["requests"] / elapsed, 2) if elapsed > 0 else None,
+            "tokens_per_sec": round(self.totals["completion_tokens"] / elapsed, 2) if elapsed > 0 else None,
+            "parallel": self.parallel
+        }
@@ -0,0 +1,150 @@
+"""
+Response cache for natural language → command translations.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+# Context fields that change what the model should answer
+CONTEXT_KEY_FIELDS = ("pwd", "user", "os")
+
+
+def normalize_request(text: str) -> str:
+    """Normalize a request so trivially different phrasings share a key."""
+    text = text.strip().lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(" .!?")
+
+
+class ResponseCache:
+    """LRU + TTL cache of parsed agent responses, persisted in SQLite.
+
+    Entries are keyed on the normalized request plus the context fields in
+    ``CONTEXT_KEY_FIELDS``. Hit/miss/eviction counters are stored alongside
+    the entries so they accumulate across restarts.
+    """
+
+    def __init__(self, path: str, max_entries: int = 500, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = os.path.expanduser(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=1.0, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    def make_key(self, request: str, context: Dict[str, Any]) -> str:
+        """Build the cache key for a request in a given context."""
+        parts = [normalize_request(request)]
+        parts.extend(str(context.get(field, "")) for field in CONTEXT_KEY_FIELDS)
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _bump(self, name: str, amount: int = 1):
+        self._db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def get(self, request: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the cached response, or None on a miss or expired entry."""
+        key = self.make_key(request, context)
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and now - row[1] <= self.ttl_seconds:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._bump("hits")
+                self._db.commit()
+                return json.loads(row[0])
+
+            if row:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bump("evictions")
+            self._bump("misses")
+            self._db.commit()
+            return None
+
+    def put(self, request: str, context: Dict[str, Any], response: Dict[str, Any]):
+        """Store a response and evict expired and least recently used entries."""
+        key = self.make_key(request, context)
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, request, response, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, normalize_request(request), json.dumps(response), now, now)
+            )
+
+            evicted = self._db.execute(
+                "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            evicted += self._db.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            ).rowcount
+            if evicted:
+                self._bump("evictions", evicted)
+            self._db.commit()
+
+    def invalidate(self, request: Optional[str] = None, context: Optional[Dict[str, Any]] = None) -> int:
+        """Drop one request's entry, or every entry when no request is given."""
+        with self._lock:
+            if request is None:
+                removed = self._db.execute("DELETE FROM responses").rowcount
+            else:
+                key = self.make_key(request, context or {})
+                removed = self._db.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+            self._db.commit()
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count and hit/miss/eviction counters."""
+        with self._lock:
+            counters = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        """Close the underlying database."""
+        with self._lock:
+            self._db.close()
@@ -4,24 +4,243 @@ Agent client for shell integration.
 
 import json
 import os
+import socket
 import sys
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
 
 # Handle both relative and absolute imports
 try:
-    from .main import CognosAgent
+    from .daemon import get_socket_path
+    from ..common.config import get_config
+    from ..common.logger import Logger
+    from ..common.tracing import get_tracer
 except ImportError:
     # Add parent directory to path for direct execution
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-    from src.agent.main import CognosAgent
+    from src.agent.daemon import get_socket_path
+    from src.common.config import get_config
+    from src.common.logger import Logger
+    from src.common.tracing import get_tracer
 
 
-class AgentClient:
-    """Client interface for shell to communicate with CognOS agent."""
-    
-    def __init__(self):
-        self.agent = CognosAgent()
+def create_local_agent():
+    """Build an in-process CognosAgent.
     
-    def process_command(self, command: str) -> Dict[str, Any]:
-        """Process a command through the agent and return structured response."""
-        return self.agent.process_command(command)
\ No newline at end of file
+    Imported here rather than at module load: the agent pulls in the model
+    client, tool registry and grammar builder, which the shell only needs
+    once it has no daemon to talk to.
+    """
+    try:
+        from .main import CognosAgent
+    except ImportError:
+        from src.agent.main import CognosAgent
+    return CognosAgent()
+
+
+class AgentClient:
+    """Client interface for shell to communicate with CognOS agent.
+
+    Requests go to the resident agent daemon (cognos-agentd) when one is
+    listening, and to an in-process CognosAgent otherwise.
+
+    With ``background=True`` the connection/model load happens on a worker
+    thread; ``status`` reports 'loading', 'ready' or 'failed' and the first
+    request waits only for whatever load time is left. cancel() ends that
+    wait too.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, background: bool = False):
+        self.config = get_config()
+        self.logger = Logger()
+        self.tracer = get_tracer()
+        self.socket_path = socket_path or get_socket_path(self.config)
+        self.agent = None
+        self.status = "loading"
+        self.error = None
+        self.load_time = None
+        self._sock = None
+        self._reader = None
+        self._request_id = None
+        self._ready = threading.Event()
+        # Set when loading finishes or a waiting request is cancelled
+        self._wake = threading.Event()
+        self._load_cancelled = False
+
+        if background:
+            threading.Thread(target=self._start, name="cognos-agent-loader", daemon=True).start()
+        else:
+            self._start()
+            if self.status == "failed":
+                raise self.error
+
+    @property
+    def mode(self) -> str:
+        """Transport in use: 'daemon' or 'local'."""
+        return "daemon" if self._sock else "local"
+
+    def _start(self):
+        """Connect to the daemon or load the model in-process."""
+        start = time.perf_counter()
+        try:
+            if not self._connect():
+                self.agent = create_local_agent()
+            self.status = "ready"
+            self.load_time = time.perf_counter() - start
+            self.logger.info(f"Agent ready ({self.mode}) in {self.load_time * 1000:.0f} ms")
+        except Exception as e:
+            self.status = "failed"
+            self.error = e
+            self.logger.error(f"Agent failed to load: {e}")
+        finally:
+            self._ready.set()
+            self._wake.set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading has finished; returns True if the agent is usable."""
+        self._ready.wait(timeout)
+        return self.status == "ready"
+
+    def _wait_for_load(self) -> bool:
+        """Block until loading has finished; returns False if cancel() was called first."""
+        while not self._ready.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._load_cancelled:
+                return False
+        return True
+
+    def _connect(self) -> bool:
+        """Try to connect to the agent daemon."""
+        if not os.path.exists(self.socket_path):
+            return False
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.config.get("agent.daemon.connect_timeout", 0.5))
+            sock.connect(self.socket_path)
+            # Generation can take a while; block without a timeout from here on
+            sock.settimeout(None)
+        except OSError as e:
+            sock.close()
+            self.logger.debug(f"Agent daemon not available at {self.socket_path}: {e}")
+            return False
+
+        self._sock = sock
+        self._reader = sock.makefile("r", encoding="utf-8")
+        self.logger.info(f"Connected to agent daemon at {self.socket_path}")
+        return True
+
+    def _disconnect(self):
+        """Drop the daemon connection."""
+        for resource in (self._reader, self._sock):
+            try:
+                if resource:
+                    resource.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def _request(self, payload: Dict[str, Any],
+                 on_partial: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Send one request to the daemon and wait for its reply."""
+        self._sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        
+        while True:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("Agent daemon closed the connection")
+            
+            reply = json.loads(line)
+            if "partial" not in reply:
+                return reply
+            if on_partial:
+                on_partial(reply["partial"])
+
+    def cancel(self):
+        """Stop the request in progress; called from the shell's SIGINT handler.
+        
+        The daemon connection is busy waiting for the reply, so the cancel
+        goes over a short-lived second connection.
+        """
+        if self._sock and self._request_id:
+            payload = {"op": "cancel", "request_id": self._request_id}
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(self.config.get("agent.daemon.connect_timeout", 0.5))
+                    sock.connect(self.socket_path)
+                    sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+                    sock.recv(4096)
+            except OSError as e:
+                self.logger.warning(f"Could not cancel daemon request {self._request_id}: {e}")
+        elif self.agent is not None:
+            self.agent.cancel()
+        elif not self._ready.is_set():
+            # The request is still waiting for the model to load
+            self._load_cancelled = True
+            self._wake.set()
+
+    def _context(self) -> Dict[str, Any]:
+        """Context of this shell session, forwarded to the daemon."""
+        return {
+            "pwd": os.getcwd(),
+            "user": os.getenv("USER", "unknown"),
+            "hostname": os.getenv("HOSTNAME", "localhost")
+        }
+
+    def process_command(self, command: str,
+                        on_message: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Process a command through the agent and return structured response.
+        
+        ``on_message`` receives the response message as it is generated.
+        """
+        self._load_cancelled = False
+        if not self._wait_for_load():
+            return {
+                "action": "info",
+                "message": "Cancelled.",
+                "command": None,
+                "cancelled": "cancelled"
+            }
+        if self.status != "ready":
+            return {
+                "action": "info",
+                "message": f"Error: AI agent unavailable ({self.error})",
+                "command": None
+            }
+
+        if self._sock:
+            try:
+                self._request_id = os.urandom(8).hex()
+                payload = {
+                    "op": "process_command",
+                    "command": command,
+                    "context": self._context(),
+                    "stream": on_message is not None,
+                    "request_id": self._request_id
+                }
+                span = self.tracer.current()
+                if span is not None:
+                    # Let the daemon's spans join this shell's trace
+                    payload["trace"] = {"trace_id": span.trace_id, "parent_id": span.span_id}
+                
+                reply = self._request(payload, on_message)
+                if reply.get("ok"):
+                    return reply["response"]
+
+                self.logger.error(f"Agent daemon error: {reply.get('error')}")
+                return {
+                    "action": "info",
+                    "message": f"Error: {reply.get('error')}",
+                    "command": None
+                }
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Lost connection to agent daemon ({e}), falling back to in-process agent")
+                self._disconnect()
+                self.agent = create_local_agent()
+            finally:
+                self._request_id = None
+
+        return self.agent.process_command(command, on_message=on_message)
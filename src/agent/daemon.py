@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+CognOS Agent Daemon - resident model server
+
+Runs a single CognosAgent (and therefore a single loaded model) and serves
+requests from cognos-shell sessions over a Unix domain socket, so the model
+is loaded once per machine instead of once per login shell.
+
+Protocol: one JSON object per line in each direction.
+    {"op": "ping"}
+    {"op": "stats"}
+    {"op": "process_command", "command": "...", "context": {...}, "stream": true,
+     "request_id": "..."}
+    {"op": "cancel", "request_id": "..."}
+
+Streaming requests receive {"ok": true, "partial": "..."} lines with the
+message text as it is generated before the final reply. A connection waits
+for its own reply, so "cancel" is sent over a second connection. It stops
+the named request whether it is running or still queued behind another
+shell's request.
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from typing import Dict, Any, Callable, Optional
+
+# Handle both relative and absolute imports
+try:
+    from ..common.config import Config, get_config
+    from ..common.logger import Logger
+    from ..common.tracing import get_tracer
+except ImportError:
+    # Add parent directory to path for direct execution
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from src.common.config import Config, get_config
+    from src.common.logger import Logger
+    from src.common.tracing import get_tracer
+
+
+DEFAULT_SOCKET_PATH = "~/.local/share/cognos/agentd.sock"
+
+
+def get_socket_path(config: Config) -> str:
+    """Resolve the daemon socket path from configuration."""
+    return os.path.expanduser(config.get("agent.daemon.socket_path", DEFAULT_SOCKET_PATH))
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    """Handle one shell connection; a connection may carry many requests."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                reply = {"ok": False, "error": f"Invalid request: {e}"}
+            else:
+                emit = self._send_partial if request.get("stream") else None
+                reply = self.server.dispatch(request, emit)
+
+            try:
+                self._send(reply)
+            except (BrokenPipeError, ConnectionResetError):
+                break
+
+    def _send(self, message: Dict[str, Any]):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_partial(self, text: str):
+        try:
+            self._send({"ok": True, "partial": text})
+        except (BrokenPipeError, ConnectionResetError):
+            # The shell went away; let generation finish and drop the reply
+            pass
+
+
+class AgentDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that owns the model and tool registry."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Optional[str] = None, agent=None):
+        self.config = get_config()
+        self.logger = Logger()
+        self.tracer = get_tracer()
+        self.socket_path = socket_path or get_socket_path(self.config)
+
+        # The model is not safe for concurrent use, and requests temporarily
+        # switch the working directory, so requests are served one at a time.
+        self._lock = threading.Lock()
+        # Cancel events of running and queued requests by request_id
+        self._requests: Dict[str, threading.Event] = {}
+        self._requests_lock = threading.Lock()
+
+        self._remove_stale_socket()
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+
+        if agent is None:
+            # Imported on use so cognos-shell can read get_socket_path() cheaply
+            try:
+                from .main import CognosAgent
+            except ImportError:
+                from src.agent.main import CognosAgent
+            agent = CognosAgent()
+        self.agent = agent
+
+        # The socket is created owner-only: a chmod after bind() would leave
+        # a window in which other users could connect
+        umask = os.umask(0o077)
+        try:
+            super().__init__(self.socket_path, AgentRequestHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self.logger.info(f"Agent daemon listening on {self.socket_path}")
+
+    def _remove_stale_socket(self):
+        """Remove a socket file left behind by a daemon that is no longer running."""
+        if not os.path.exists(self.socket_path):
+            return
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+        else:
+            raise RuntimeError(f"Agent daemon already running on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def dispatch(self, request: Dict[str, Any],
+                 emit: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Route a decoded request to the matching operation."""
+        op = request.get("op", "process_command")
+
+        try:
+            if op == "ping":
+                return {"ok": True, "pid": os.getpid()}
+            elif op == "stats":
+                return {"ok": True, "stats": self.agent.get_stats()}
+            elif op == "cancel":
+                return {"ok": True, "cancelled": self._cancel(request.get("request_id"))}
+            elif op == "process_command":
+                command = request.get("command", "")
+                context = request.get("context") or {}
+                trace = request.get("trace") or {}
+                with self.tracer.span("daemon_request", trace_id=trace.get("trace_id"),
+                                      parent_id=trace.get("parent_id")):
+                    response = self._process_command(command, context, emit, request.get("request_id"))
+                return {"ok": True, "response": response}
+            else:
+                return {"ok": False, "error": f"Unknown operation: {op}"}
+        except Exception as e:
+            self.logger.error(f"Error handling daemon request {op}: {e}")
+            return {"ok": False, "error": str(e)}
+
+    def _process_command(self, command: str, context: Dict[str, Any],
+                         on_message: Optional[Callable[[str], None]] = None,
+                         request_id: Optional[str] = None) -> Dict[str, Any]:
+        """Run a command in the calling shell's working directory."""
+        # Registered before waiting for the lock, so a request queued behind
+        # another shell's can be cancelled; the agent checks the event first
+        cancel_event = threading.Event()
+        if request_id:
+            with self._requests_lock:
+                self._requests[request_id] = cancel_event
+
+        try:
+            with self._lock:
+                original_cwd = os.getcwd()
+                pwd = context.get("pwd")
+                try:
+                    # Tools resolve relative paths against the process cwd
+                    if pwd and os.path.isdir(pwd):
+                        os.chdir(pwd)
+                    return self.agent.process_command(command, context, on_message,
+                                                      cancel_event=cancel_event)
+                finally:
+                    os.chdir(original_cwd)
+        finally:
+            if request_id:
+                with self._requests_lock:
+                    self._requests.pop(request_id, None)
+
+    def _cancel(self, request_id: Optional[str]) -> bool:
+        """Cancel ``request_id`` if it is running or waiting to run.
+
+        Runs on another connection's thread without taking the request lock,
+        which the running request holds.
+        """
+        with self._requests_lock:
+            cancel_event = self._requests.get(request_id) if request_id else None
+        if cancel_event is None:
+            return False
+        self.logger.info(f"Cancelling daemon request {request_id}")
+        cancel_event.set()
+        return True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    """Main entry point for cognos-agentd."""
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else None
+    daemon = AgentDaemon(socket_path)
+
+    def _handle_terminate(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        threading.Thread(target=daemon.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _handle_terminate)
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+
+
+if __name__ == "__main__":
+    main()
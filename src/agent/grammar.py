@@ -0,0 +1,84 @@
+"""
+GBNF grammar generation for the agent's JSON tool-call schema.
+
+The grammar is derived from the tools in a ToolRegistry (tool names and the
+argument names of each tool's execute()), so llama.cpp can only sample
+responses that parse and name real tools with real arguments.
+"""
+
+import typing
+from typing import Any, Dict, List
+
+
+# Whitespace is optional and at most one space, which keeps outputs short
+_COMMON_RULES = r'''
+ws ::= " "?
+string ::= "\"" ( [^"\\\x00-\x1f] | "\\" ( ["\\/bfnrt] | "u" hex hex hex hex ) )* "\""
+hex ::= [0-9a-fA-F]
+number ::= "-"? [0-9]+ ( "." [0-9]+ )?
+boolean ::= "true" | "false"
+string-array ::= "[" ws ( string ( "," ws string )* )? ws "]"
+'''.strip()
+
+ACTIONS = ("execute", "info", "question")
+
+
+def _rule_name(tool_name: str) -> str:
+    """GBNF rule names may not contain underscores."""
+    return "call-" + tool_name.replace("_", "-").lower()
+
+
+def _value_rule(annotation: Any) -> str:
+    """Map a Python annotation to the grammar rule for its JSON value."""
+    if annotation is bool:
+        return "boolean"
+    if annotation in (int, float):
+        return "number"
+    if typing.get_origin(annotation) in (list, List):
+        return "string-array"
+    return "string"
+
+
+def _literal(text: str) -> str:
+    """Quote a JSON literal (including its own quotes) as a GBNF string."""
+    return '"\\"' + text + '\\""'
+
+
+def _args_rule(parameters: List[Dict[str, Any]]) -> str:
+    """Grammar for an args object: first parameter always, later optional ones optional."""
+    if not parameters:
+        return '"{" ws "}"'
+
+    parts = []
+    for index, param in enumerate(parameters):
+        pair = f'{_literal(param["name"])} ":" ws {_value_rule(param["type"])}'
+        if index == 0:
+            parts.append(pair)
+        elif param["required"]:
+            parts.append(f'"," ws {pair}')
+        else:
+            parts.append(f'( "," ws {pair} )?')
+
+    return '"{" ws ' + " ".join(parts) + ' ws "}"'
+
+
+def build_tool_call_grammar(tool_registry) -> str:
+    """Build a GBNF grammar for responses that call the registered tools."""
+    call_rules = []
+    for tool_name, tool in tool_registry.tools.items():
+        call_rules.append(
+            f'{_rule_name(tool_name)} ::= "{{" ws {_literal("tool")} ":" ws {_literal(tool_name)} '
+            f'"," ws {_literal("args")} ":" ws {_args_rule(tool.parameters())} ws "}}"'
+        )
+
+    root = (
+        'root ::= "{" ws '
+        f'{_literal("action")} ":" ws action "," ws '
+        f'{_literal("command")} ":" ws ( string | "null" ) "," ws '
+        f'{_literal("message")} ":" ws string "," ws '
+        f'{_literal("tool_calls")} ":" ws "[" ws ( call ( "," ws call )* )? ws "]" ws "}}"'
+    )
+    action = "action ::= " + " | ".join(_literal(action) for action in ACTIONS)
+    call = "call ::= " + " | ".join(_rule_name(name) for name in tool_registry.tools)
+
+    return "\n".join([root, action, call] + call_rules + [_COMMON_RULES]) + "\n"
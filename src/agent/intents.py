@@ -0,0 +1,125 @@
+"""
+Deterministic fast-path intent matching for common requests.
+
+Requests like "show files" or "make directory foo" always map to the same
+tool call, so they are answered by compiled patterns instead of the model.
+"""
+
+import re
+import shlex
+from typing import Dict, Any, List, Optional
+
+
+# Mirrors the fixed mappings in the tool guides of prompt.DEFAULT_SECTIONS
+DEFAULT_RULES = [
+    {
+        "name": "list_files",
+        "patterns": [
+            r"(?:show|list) (?:me )?(?:the |all )?files(?: here| in (?:the |this )?(?:current )?(?:directory|folder))?",
+            r"what'?s here",
+            r"what is here"
+        ],
+        "tool": "run_command",
+        "args": {"command": "ls -la"},
+        "message": "List files in the current directory"
+    },
+    {
+        "name": "create_file",
+        "patterns": [
+            r"(?:create|make|touch) (?:a |an )?(?:new )?(?:empty )?file (?:called |named )?(?P<name>\S+)"
+        ],
+        "tool": "run_command",
+        "args": {"command": "touch {name}"},
+        "message": "Create the file {name}"
+    },
+    {
+        "name": "make_directory",
+        "patterns": [
+            r"(?:create|make) (?:a |an )?(?:new )?(?:directory|folder|dir) (?:called |named )?(?P<name>\S+)"
+        ],
+        "tool": "run_command",
+        "args": {"command": "mkdir {name}"},
+        "message": "Create the directory {name}"
+    },
+    {
+        "name": "find_directory",
+        "patterns": [
+            r"find (?:the |my |a )?(?:directory|folder|dir) (?:called |named )?(?P<pattern>\S+)",
+            r"find (?:the |my )?(?P<pattern>\S+) (?:directory|folder|dir)"
+        ],
+        "tool": "search_folder",
+        "action": "info",
+        "args": {"pattern": "{pattern}"},
+        "message": "Search for directories matching {pattern}"
+    }
+]
+
+# Politeness that should not stop a pattern from matching
+_PREFIX = r"(?:(?:please|can you|could you|would you)\s+)?"
+_SUFFIX = r"(?:\s+please)?"
+
+
+class IntentRule:
+    """A compiled rule: patterns with named slots mapped to one tool call."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        if not spec.get("tool") or not spec.get("patterns"):
+            raise ValueError(f"Intent rule needs 'tool' and 'patterns': {spec}")
+
+        self.name = spec.get("name", spec["tool"])
+        self.tool = spec["tool"]
+        self.action = spec.get("action", "execute")
+        self.args = spec.get("args", {})
+        self.message = spec.get("message", "")
+
+        try:
+            self.patterns = [
+                re.compile(f"^{_PREFIX}(?:{pattern}){_SUFFIX}$", re.IGNORECASE)
+                for pattern in spec["patterns"]
+            ]
+        except re.error as e:
+            raise ValueError(f"Invalid pattern in intent rule '{self.name}': {e}")
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return the agent response for ``text`` if a pattern matches."""
+        for pattern in self.patterns:
+            found = pattern.match(text)
+            if found:
+                return self._build_response(found.groupdict())
+        return None
+
+    def _build_response(self, slots: Dict[str, str]) -> Dict[str, Any]:
+        # Slot values end up in shell commands, so quote them there
+        quoted = {key: shlex.quote(value) for key, value in slots.items()}
+        args = {
+            key: value.format(**(quoted if key == "command" else slots)) if isinstance(value, str) else value
+            for key, value in self.args.items()
+        }
+
+        return {
+            "action": self.action,
+            "command": args.get("command"),
+            "message": self.message.format(**slots),
+            "tool_calls": [{"tool": self.tool, "args": args}]
+        }
+
+
+class IntentMatcher:
+    """Runs compiled intent rules in order; the first match wins."""
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, include_defaults: bool = True):
+        specs = list(rules or [])
+        if include_defaults:
+            specs.extend(DEFAULT_RULES)
+
+        self.rules = [IntentRule(spec) for spec in specs]
+
+    def match(self, request: str) -> Optional[Dict[str, Any]]:
+        """Return a response with the same shape as the model's, or None."""
+        # Keep case: slot values such as file names must survive untouched
+        text = re.sub(r"\s+", " ", request.strip()).rstrip(" .!?")
+        for rule in self.rules:
+            response = rule.match(text)
+            if response is not None:
+                return response
+        return None
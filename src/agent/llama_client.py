@@ -2,75 +2,507 @@
 LLama.cpp client for CognOS AI agent.
 """
 
+import hashlib
 import json
 import os
-from typing import Dict, Any, Optional
-from llama_cpp import Llama
+import pickle
+import threading
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional
 
 # Handle both relative and absolute imports
 try:
-    from ..common.config import Config
+    from .streaming import JsonStreamScanner
+    from .speculative import acceptance, create_drafter
+    from .autotune import DEFAULT_PROFILE, llama_kwargs, load_profile
+    from .memory import MB, MemoryBudgetError, select_configuration, vm_rss
+    from ..common.config import get_config
+    from ..common.tracing import get_tracer
     from ..common.logger import Logger
 except ImportError:
     # Add parent directory to path for direct execution
     import sys
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-    from src.common.config import Config
+    from src.agent.streaming import JsonStreamScanner
+    from src.agent.speculative import acceptance, create_drafter
+    from src.agent.autotune import DEFAULT_PROFILE, llama_kwargs, load_profile
+    from src.agent.memory import MB, MemoryBudgetError, select_configuration, vm_rss
+    from src.common.config import get_config
+    from src.common.tracing import get_tracer
     from src.common.logger import Logger
 
 
+def resolve_model_path(config, model_path: Optional[str] = None) -> str:
+    """Path of the model to load: ``model_path`` as given, else ``agent.model_path``
+    with the repository's models directory as a fallback."""
+    if model_path:
+        return model_path
+    
+    model_path = config.get("agent.model_path", "./models/mistral-7b-q4.gguf")
+    # Try relative path from current directory
+    if not os.path.exists(model_path):
+        # Try absolute path from script location
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        model_path = os.path.join(script_dir, "..", "..", "models", "mistral-7b-q4.gguf")
+        model_path = os.path.normpath(model_path)
+    return model_path
+
+
+def model_fingerprint(model_path: str, sample_size: int = 1024 * 1024) -> str:
+    """Cheap identity hash for a model file.
+    
+    Hashing a multi-GB GGUF on every start would cost more than it saves, so
+    this hashes the size plus the first and last ``sample_size`` bytes.
+    """
+    digest = hashlib.sha256()
+    size = os.path.getsize(model_path)
+    digest.update(str(size).encode())
+    
+    with open(model_path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            digest.update(f.read(sample_size))
+    
+    return digest.hexdigest()
+
+
+class GenerationCancelled(Exception):
+    """Decoding was stopped by cancel() or by the request deadline."""
+    
+    def __init__(self, reason: str, tokens: int = 0):
+        self.reason = reason
+        self.tokens = tokens
+        if reason == "deadline":
+            super().__init__(f"Generation stopped at the deadline after {tokens} tokens")
+        else:
+            super().__init__(f"Generation cancelled after {tokens} tokens")
+
+
 class LlamaClient:
     """Client interface to llama.cpp for AI inference."""
     
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, model=None, model_path: Optional[str] = None, logprobs: bool = False):
+        """Load the configured model, or wrap an already constructed one.
+        
+        Passing ``model`` (any object with the llama_cpp.Llama interface)
+        skips loading; benchmarks use this to run without a model file.
+        ``model_path`` overrides ``agent.model_path`` (routing tiers). With
+        ``logprobs``, each generation records its average token
+        log-probability in ``last_avg_logprob``.
+        """
+        self.config = get_config()
         self.logger = Logger()
-        self.model = None
-        self._load_model()
+        self.tracer = get_tracer()
+        self.model = model
+        self.model_path = model_path
+        self.logprobs = logprobs
+        self.n_ctx = self.config.get("agent.context_length", 2048)
+        self.grammar = None
+        self.drafter = None
+        # Memory estimate and measured RSS of the loaded model (see _fit_memory)
+        self.footprint = None
+        # Token counts are per thread, so concurrent batch workers each see
+        # their own request's usage; the model itself decodes one at a time
+        self._local = threading.local()
+        self._generate_lock = threading.Lock()
+        if self.model is None:
+            self._load_model()
+    
+    @property
+    def last_usage(self) -> Dict[str, int]:
+        """Token counts of this thread's most recent generation."""
+        usage = getattr(self._local, "usage", None)
+        if usage is None:
+            usage = self._local.usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        return usage
+    
+    @last_usage.setter
+    def last_usage(self, usage: Dict[str, int]):
+        self._local.usage = usage
+    
+    @property
+    def last_avg_logprob(self) -> Optional[float]:
+        """Mean token log-probability of this thread's last generation, if recorded."""
+        total, count = getattr(self._local, "logprob", (0.0, 0))
+        return total / count if count else None
     
     def _load_model(self):
         """Load the LLM model via llama.cpp."""
-        model_path = self.config.get("agent.model_path", "./models/mistral-7b-q4.gguf")
-        
-        # Try relative path from current directory
-        if not os.path.exists(model_path):
-            # Try absolute path from script location
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            model_path = os.path.join(script_dir, "..", "..", "models", "mistral-7b-q4.gguf")
-            model_path = os.path.normpath(model_path)
-        
+        model_path = resolve_model_path(self.config, self.model_path)
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found at {model_path}")
         
+        self.n_ctx = self.config.get("agent.context_length", 2048)  # Reduced context
+        if self.config.get("agent.memory.enabled", True):
+            model_path = self._fit_memory(model_path)
+        self.model_path = model_path
+        
         try:
+            # Imported here so the shell does not pay for llama_cpp until the
+            # model is actually loaded (usually on a background thread)
+            from llama_cpp import Llama
+            
+            profile = self._tuning_profile()
+            
+            # draft_model only exists in newer llama-cpp-python; create_drafter()
+            # returns None where its import fails, and the argument is left out
+            self.drafter = create_drafter(self.config, self.logger, self.n_ctx, n_threads=profile["n_threads"])
+            extra = {"draft_model": self.drafter} if self.drafter else {}
+            if self.logprobs:
+                # Keeps logits for every position: n_ctx * n_vocab floats
+                extra["logits_all"] = True
+            rss_before = vm_rss()
             self.model = Llama(
                 model_path=model_path,
-                n_ctx=self.config.get("agent.context_length", 2048),  # Reduced context
-                n_threads=2,  # Fewer threads for Pi
-                n_batch=128,  # Smaller batch size
+                n_ctx=self.n_ctx,
                 low_vram=True,  # Low VRAM mode
-                verbose=False
+                verbose=False,
+                **llama_kwargs(profile),
+                **extra
             )
             self.logger.info(f"Model loaded successfully: {model_path}")
+            self._report_footprint(rss_before)
+            self._check_draft_vocab()
         except Exception as e:
             self.logger.error(f"Failed to load model: {e}")
             raise
     
-    def generate(self, prompt: str) -> str:
-        """Generate response from the model."""
+    def _fit_memory(self, model_path: str) -> str:
+        """Pick the model and context length that fit in memory; see memory.py.
+        
+        Other models in the models directory are only considered when the
+        client was not given an explicit ``model_path`` and
+        ``agent.memory.select_model`` is on. Sets ``self.n_ctx`` and returns
+        the model path; raises MemoryBudgetError rather than load into swap.
+        """
+        select_model = self.model_path is None and self.config.get("agent.memory.select_model", True)
+        try:
+            chosen, n_ctx, plan = select_configuration(self.config, model_path, select_model,
+                                                       logits_all=self.logprobs)
+        except MemoryBudgetError as e:
+            self.logger.error(str(e))
+            raise
+        
+        estimate = plan["choice"]["estimate"]
+        if estimate is None:
+            self.logger.info("Could not read available memory or model metadata, skipping memory budget check")
+            return model_path
+        
+        self.n_ctx = n_ctx
+        self.footprint = {"budget_mb": plan["budget"] // MB, "estimate_mb": estimate // MB}
+        self.logger.info(
+            f"Memory budget {plan['budget'] // MB} MB: loading {os.path.basename(chosen)} with "
+            f"n_ctx {n_ctx}, estimated {estimate // MB} MB"
+        )
+        if chosen != os.path.normpath(model_path):
+            self.logger.warning(f"{model_path} does not fit in the memory budget, using {chosen}")
+        return chosen
+    
+    def _report_footprint(self, rss_before: Optional[int]):
+        """Log resident memory after loading next to the estimate."""
+        rss = vm_rss()
+        if rss is None or rss_before is None:
+            return
+        
+        self.footprint = {**(self.footprint or {}), "rss_mb": rss // MB, "model_rss_mb": (rss - rss_before) // MB}
+        message = f"Resident memory after load: {rss // MB} MB, +{(rss - rss_before) // MB} MB for the model"
+        if "estimate_mb" in self.footprint:
+            message += f" (estimated {self.footprint['estimate_mb']} MB)"
+        self.logger.info(message)
+    
+    def memory_report(self) -> Optional[Dict[str, Any]]:
+        """Footprint recorded at load time plus the current resident size."""
+        if self.footprint is None:
+            return None
+        rss = vm_rss()
+        return {**self.footprint, "current_rss_mb": rss // MB if rss is not None else None}
+    
+    def _tuning_profile(self) -> Dict[str, Any]:
+        """Load parameters from ``cognos-agent --autotune`` for this host and model.
+        
+        Without a profile the Pi-oriented defaults apply (2 threads, batch 128).
+        A tuned context length never exceeds ``agent.context_length``.
+        """
+        try:
+            profile = load_profile(self.config, model_fingerprint(self.model_path))
+        except OSError as e:
+            self.logger.warning(f"Could not read tuning profile: {e}")
+            profile = None
+        
+        if profile is None:
+            self.logger.info("No tuning profile for this host and model, using defaults "
+                             "(run cognos-agent --autotune)")
+            return dict(DEFAULT_PROFILE)
+        
+        if profile.get("n_ctx"):
+            self.n_ctx = min(self.n_ctx, profile["n_ctx"])
+        self.logger.info(
+            f"Using tuning profile: {llama_kwargs(profile)}, n_ctx {self.n_ctx} "
+            f"(measured {profile.get('prefill_tps')} prefill / {profile.get('decode_tps')} decode tokens/sec)"
+        )
+        return {**DEFAULT_PROFILE, **profile}
+    
+    def _check_draft_vocab(self):
+        """Turn speculation off if a draft model's tokenizer differs from the target's."""
+        draft_model = getattr(self.drafter.drafter, "model", None) if self.drafter else None
+        if draft_model is not None and draft_model.n_vocab() != self.model.n_vocab():
+            self.logger.warning(
+                f"Draft model vocabulary ({draft_model.n_vocab()}) does not match the main "
+                f"model ({self.model.n_vocab()}), speculative decoding disabled"
+            )
+            self.drafter = self.model.draft_model = None
+    
+    def set_grammar(self, gbnf: Optional[str]):
+        """Constrain sampling to a GBNF grammar, or remove the constraint with None."""
+        if gbnf is None:
+            self.grammar = None
+            return
+        
+        try:
+            from llama_cpp import LlamaGrammar
+            self.grammar = LlamaGrammar.from_string(gbnf, verbose=False)
+            self.logger.info("Grammar-constrained decoding enabled")
+        except Exception as e:
+            self.grammar = None
+            self.logger.warning(f"Could not compile response grammar, decoding unconstrained: {e}")
+    
+    def _tokenize(self, text: str) -> List[int]:
+        """Tokenize text the same way llama_cpp tokenizes a completion prompt."""
+        return self.model.tokenize(text.encode("utf-8"), special=True)
+    
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens ``text`` adds to a prompt (no BOS token)."""
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+    
+    def _cached_token_count(self, tokens: List[int]) -> int:
+        """Number of leading prompt tokens already evaluated in the KV cache."""
+        cached = self.model.input_ids[:self.model.n_tokens]
+        count = 0
+        for cached_token, token in zip(cached, tokens):
+            if cached_token != token:
+                break
+            count += 1
+        return count
+    
+    def _prefix_cache_path(self, prefix: str) -> str:
+        """Cache file for a prompt prefix, keyed by model, prefix and n_ctx."""
+        cache_dir = os.path.expanduser(
+            self.config.get("agent.prompt_cache.dir", "~/.cache/cognos/prompt-cache")
+        )
+        key = hashlib.sha256(":".join([
+            model_fingerprint(self.model_path),
+            hashlib.sha256(prefix.encode("utf-8")).hexdigest(),
+            str(self.n_ctx)
+        ]).encode()).hexdigest()
+        return os.path.join(cache_dir, f"{key[:32]}.state")
+    
+    def prepare_prefix(self, prefix: str):
+        """Evaluate a static prompt prefix once and persist the KV state.
+        
+        Later prompts that start with ``prefix`` only need to prefill the
+        tokens after it: llama_cpp reuses the longest matching prefix of the
+        evaluated tokens. The state is saved to disk so cold starts can
+        restore it instead of prefilling again.
+        """
+        if not self.model or not self.config.get("agent.prompt_cache.enabled", True):
+            return
+        
+        if not self.model_path:
+            # Injected model: keep the prefix warm in memory only
+            self.model.reset()
+            self.model.eval(self._tokenize(prefix))
+            return
+        
+        try:
+            tokens = self._tokenize(prefix)
+            if len(tokens) >= self.n_ctx:
+                self.logger.warning("Prompt prefix does not fit in the context window, not caching it")
+                return
+            
+            cache_path = self._prefix_cache_path(prefix)
+            if os.path.exists(cache_path):
+                with open(cache_path, 'rb') as f:
+                    self.model.load_state(pickle.load(f))
+                self.logger.info(f"Restored prompt prefix state ({len(tokens)} tokens) from {cache_path}")
+                return
+            
+            self.model.reset()
+            self.model.eval(tokens)
+            
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self.model.save_state(), f)
+            os.replace(tmp_path, cache_path)
+            self._prune_prefix_cache(os.path.dirname(cache_path))
+            self.logger.info(f"Saved prompt prefix state ({len(tokens)} tokens) to {cache_path}")
+            
+        except Exception as e:
+            # The cache is an optimization only; fall back to full prefill
+            self.logger.warning(f"Prompt prefix cache unavailable: {e}")
+    
+    def _prune_prefix_cache(self, cache_dir: str, keep: int = 4):
+        """Keep only the most recently written prefix states."""
+        states = [
+            os.path.join(cache_dir, name)
+            for name in os.listdir(cache_dir)
+            if name.endswith(".state")
+        ]
+        states.sort(key=os.path.getmtime, reverse=True)
+        for path in states[keep:]:
+            os.remove(path)
+    
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """Start generating and return an iterator over tokens as text.
+        
+        Prefill happens on the first ``next()``; closing the iterator stops
+        decoding. Token counts are kept in ``last_usage``.
+        """
         if not self.model:
             raise RuntimeError("Model not loaded")
         
+        tokens = self._tokenize(prompt)
+        reused = self._cached_token_count(tokens)
+        self.last_usage = {
+            "prompt_tokens": len(tokens),
+            "cached_tokens": reused,
+            "completion_tokens": 0
+        }
+        self.logger.info(
+            f"Prefill: {len(tokens) - reused} of {len(tokens)} prompt tokens, "
+            f"{reused} saved by the prefix cache"
+        )
+        
+        stream = self.model(
+            prompt,
+            max_tokens=self.config.get("agent.max_tokens", 512),
+            temperature=self.config.get("agent.temperature", 0.7),
+            stop=["Human:", "User:", "\n\n"],
+            grammar=self.grammar,
+            logprobs=1 if self.logprobs else None,
+            stream=True
+        )
+        return self._iter_text(stream)
+    
+    def _iter_text(self, stream) -> Iterator[str]:
+        self._local.logprob = (0.0, 0)
         try:
-            response = self.model(
-                prompt,
-                max_tokens=self.config.get("agent.max_tokens", 512),
-                temperature=self.config.get("agent.temperature", 0.7),
-                stop=["Human:", "User:", "\n\n"]
-            )
+            for chunk in stream:
+                choice = chunk['choices'][0]
+                self.last_usage["completion_tokens"] += 1
+                logprobs = choice.get('logprobs')
+                if logprobs:
+                    values = [value for value in logprobs.get('token_logprobs') or [] if value is not None]
+                    total, count = self._local.logprob
+                    self._local.logprob = (total + sum(values), count + len(values))
+                yield choice['text']
+        finally:
+            stream.close()
+    
+    def generate(self, prompt: str, on_message: Optional[Callable[[str], None]] = None,
+                 deadline: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> str:
+        """Generate response from the model.
+        
+        Decoding stops as soon as the top-level JSON object is complete.
+        ``on_message`` receives the response's ``message`` field as it is
+        decoded. ``deadline`` is a time.perf_counter() value; past it, or
+        once ``cancel_event`` is set, GenerationCancelled is raised within
+        one token. The event belongs to the request, so cancelling one
+        request never affects another waiting for the model.
+        """
+        if not self.model:
+            raise RuntimeError("Model not loaded")
+        
+        # llama_cpp.Llama holds a single sequence; concurrent callers take turns
+        with self._generate_lock:
+            return self._generate(prompt, on_message, deadline, cancel_event)
+    
+    def _check_cancelled(self, deadline: Optional[float], cancel_event: Optional[threading.Event]):
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled("cancelled", self.last_usage["completion_tokens"])
+        if deadline is not None and time.perf_counter() >= deadline:
+            raise GenerationCancelled("deadline", self.last_usage["completion_tokens"])
+    
+    def _generate(self, prompt: str, on_message: Optional[Callable[[str], None]],
+                  deadline: Optional[float], cancel_event: Optional[threading.Event]) -> str:
+        scanner = JsonStreamScanner()
+        stream = None
+        try:
+            with self.tracer.span("tokenize"):
+                stream = self.generate_stream(prompt)
             
-            return response['choices'][0]['text'].strip()
+            draft_before = self.drafter.snapshot() if self.drafter else None
+            start = first_token = time.perf_counter()
+            self._check_cancelled(deadline, cancel_event)
+            for text in stream:
+                # Closing the stream in finally frees the model for the next request
+                self._check_cancelled(deadline, cancel_event)
+                if self.last_usage["completion_tokens"] == 1:
+                    first_token = time.perf_counter()
+                message_delta = scanner.feed(text)
+                if message_delta and on_message:
+                    on_message(message_delta)
+                if scanner.complete:
+                    break
+            end = time.perf_counter()
             
+            speculation = self._speculation(draft_before)
+            tokens_per_sec = self._trace_generation(start, first_token, end, speculation)
+            message = f"Decoded {self.last_usage['completion_tokens']} tokens"
+            if tokens_per_sec:
+                message += f" at {tokens_per_sec:.1f} tokens/sec"
+            if scanner.complete:
+                message += " (stopped at end of JSON object)"
+            if speculation:
+                message += f"; draft acceptance {speculation['accepted']}/{speculation['proposed']}"
+                if speculation["rate"] is not None:
+                    message += f" ({speculation['rate']:.0%})"
+            self.logger.info(message)
+            return scanner.text.strip()
+            
+        except GenerationCancelled as e:
+            self.logger.warning(f"{e} ({e.reason}, {(time.perf_counter() - start) * 1000:.0f} ms into decoding)")
+            raise
         except Exception as e:
             self.logger.error(f"Generation failed: {e}")
-            return f"Error: {str(e)}"
\ No newline at end of file
+            return f"Error: {str(e)}"
+        finally:
+            if stream is not None:
+                stream.close()
+    
+    def _speculation(self, draft_before) -> Optional[Dict[str, Any]]:
+        """Draft acceptance for the generation that just finished."""
+        if draft_before is None:
+            return None
+        rounds, proposed = self.drafter.snapshot()
+        return acceptance(
+            self.last_usage["completion_tokens"],
+            rounds - draft_before[0],
+            proposed - draft_before[1]
+        )
+    
+    def _trace_generation(self, start: float, first_token: float, end: float,
+                          speculation: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """Record prefill (until the first token) and decode spans.
+        
+        Returns the effective decode speed in tokens/sec.
+        """
+        usage = self.last_usage
+        decode_tokens = max(usage["completion_tokens"] - 1, 0)
+        decode_time = end - first_token
+        tokens_per_sec = round(decode_tokens / decode_time, 2) if decode_time > 0 else None
+        
+        self.tracer.record(
+            "prefill", start, first_token, parent=self.tracer.current(),
+            prompt_tokens=usage["prompt_tokens"], cached_tokens=usage["cached_tokens"]
+        )
+        self.tracer.record(
+            "decode", first_token, end, parent=self.tracer.current(),
+            tokens=usage["completion_tokens"],
+            tokens_per_sec=tokens_per_sec,
+            **({"draft_proposed": speculation["proposed"], "draft_accepted": speculation["accepted"]}
+               if speculation else {})
+        )
+        return tokens_per_sec
@@ -6,99 +6,226 @@ This module handles natural language processing and command generation
 using the local Mistral 7B model via llama.cpp.
 """
 
+import argparse
 import json
 import os
 import sys
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
 
 # Handle both relative and absolute imports
 try:
-    from .llama_client import LlamaClient
+    from .llama_client import LlamaClient, GenerationCancelled, model_fingerprint, resolve_model_path
+    from .autotune import Autotuner, save_profile, profile_path
+    from .memory import MB, min_context, plan as memory_plan
+    from .batch import BatchRunner
+    from .cache import ResponseCache
+    from .intents import IntentMatcher
+    from .grammar import build_tool_call_grammar
+    from .prompt import PromptAssembler
+    from .router import ModelRouter, Tier, ESCALATION_REASONS
+    from ..common.tracing import get_tracer
     from ..tools.registry import ToolRegistry
-    from ..common.config import Config
+    from ..tools.executor import ToolExecutor
+    from ..common.config import Config, get_config
     from ..common.logger import Logger
 except ImportError:
     # Add parent directory to path for direct execution
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-    from src.agent.llama_client import LlamaClient
+    from src.agent.llama_client import LlamaClient, GenerationCancelled, model_fingerprint, resolve_model_path
+    from src.agent.autotune import Autotuner, save_profile, profile_path
+    from src.agent.memory import MB, min_context, plan as memory_plan
+    from src.agent.batch import BatchRunner
+    from src.agent.cache import ResponseCache
+    from src.agent.intents import IntentMatcher
+    from src.agent.grammar import build_tool_call_grammar
+    from src.agent.prompt import PromptAssembler
+    from src.agent.router import ModelRouter, Tier, ESCALATION_REASONS
+    from src.common.tracing import get_tracer
     from src.tools.registry import ToolRegistry
-    from src.common.config import Config
+    from src.tools.executor import ToolExecutor
+    from src.common.config import Config, get_config
     from src.common.logger import Logger
 
 
 class CognosAgent:
     """Main agent class that processes natural language commands."""
     
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, llama_client: Optional[LlamaClient] = None):
+        self.config = get_config()
         self.logger = Logger()
-        self.llama_client = LlamaClient()
+        self.tracer = get_tracer()
         self.tool_registry = ToolRegistry()
+        self.llama_client = llama_client or self._create_llama_client()
+        self.tool_executor = ToolExecutor(self.tool_registry, tracer=self.tracer)
+        self.response_cache = self._create_response_cache(self.config)
+        self.intent_matcher = self._create_intent_matcher()
+        # Cancel events of the requests in progress, for cancel()
+        self._active_requests = set()
+        
+        # Parse outcomes of model responses, split by decoding mode
+        self.parse_stats = {
+            "grammar": {"responses": 0, "failures": 0},
+            "free": {"responses": 0, "failures": 0}
+        }
+        
+        # Only allow responses that parse and call registered tools
+        if self.config.get("agent.grammar.enabled", True):
+            self.llama_client.set_grammar(build_tool_call_grammar(self.tool_registry))
         
         # Load system prompt
+        self.prompt_assembler = self._create_prompt_assembler()
         self.system_prompt = self._load_system_prompt()
+        
+        # Evaluate the static part of every prompt once up front
+        self.llama_client.prepare_prefix(self._prompt_prefix())
+    
+    def _create_llama_client(self):
+        """The configured model, or a ModelRouter over ``agent.routing.tiers``."""
+        tiers = self.config.get("agent.routing.tiers", [])
+        if not self.config.get("agent.routing.enabled", False) or len(tiers) < 2:
+            return LlamaClient()
+        
+        return ModelRouter(
+            [
+                Tier(
+                    tier.get("name", f"tier{index}"),
+                    LlamaClient(
+                        model_path=tier.get("model_path"),
+                        logprobs=tier.get("min_avg_logprob") is not None
+                    ),
+                    tier.get("min_avg_logprob")
+                )
+                for index, tier in enumerate(tiers)
+            ],
+            self._check_response,
+            self.logger,
+            escalate_on=self.config.get("agent.routing.escalate_on", list(ESCALATION_REASONS))
+        )
+    
+    def _check_response(self, text: str) -> Optional[str]:
+        """Why a raw model answer is unusable ("schema" or "unknown_tool"), or None."""
+        try:
+            response = json.loads(text)
+        except json.JSONDecodeError:
+            return "schema"
+        
+        if not isinstance(response, dict) or not isinstance(response.get("message"), str):
+            return "schema"
+        tool_calls = response.get("tool_calls", [])
+        if not isinstance(tool_calls, list) or not all(isinstance(call, dict) for call in tool_calls):
+            return "schema"
+        if any(call.get("tool") not in self.tool_registry.tools for call in tool_calls):
+            return "unknown_tool"
+        return None
+    
+    @staticmethod
+    def _create_response_cache(config: Config) -> Optional[ResponseCache]:
+        """Create the response cache if it is enabled in configuration."""
+        if not config.get("agent.response_cache.enabled", True):
+            return None
+        
+        return ResponseCache(
+            config.get("agent.response_cache.path", "~/.cache/cognos/responses.db"),
+            max_entries=config.get("agent.response_cache.max_entries", 500),
+            ttl_seconds=config.get("agent.response_cache.ttl_seconds", 7 * 24 * 3600)
+        )
+    
+    def _create_intent_matcher(self) -> Optional[IntentMatcher]:
+        """Compile the fast-path intent rules from configuration."""
+        if not self.config.get("agent.intents.enabled", True):
+            return None
+        
+        try:
+            return IntentMatcher(
+                self.config.get("agent.intents.rules", []),
+                include_defaults=self.config.get("agent.intents.include_defaults", True)
+            )
+        except ValueError as e:
+            self.logger.error(f"Invalid intent rules in config, using defaults only: {e}")
+            return IntentMatcher()
+    
+    def _create_prompt_assembler(self) -> PromptAssembler:
+        """Prompt assembler bounded by ``agent.prompt.budget_tokens``.
+        
+        The budget never exceeds the context window minus room for the
+        response.
+        """
+        room = self.llama_client.n_ctx - self.config.get("agent.max_tokens", 512)
+        budget = min(self.config.get("agent.prompt.budget_tokens", 1024), room)
+        return PromptAssembler(
+            self.tool_registry.list_tools(),
+            self.llama_client.count_tokens,
+            budget,
+            dynamic=self.config.get("agent.prompt.dynamic", True)
+        )
     
     def _load_system_prompt(self) -> str:
-        """Load the system prompt for the agent."""
-        return """You are CognOS, an AI assistant that helps users interact with their Linux system.
-
-When users ask for file/directory operations, ALWAYS use the appropriate tool instead of just describing what to do.
-
-Common command mappings:
-- "show files" / "list files" / "what's here" → use run_command with "ls -la"
-- "create file" / "make file" / "touch file" → use run_command with "touch filename"
-- "create directory" / "make directory" → use run_command with "mkdir dirname"
-- "find directory X" → use search_folder with pattern X
-- "go to directory" → use run_command with "cd path"
-- "create virtual environment" / "create python environment" → use create_env
-- "switch environment" → use switch_env
-
-IMPORTANT FILE OPERATIONS:
-- For creating files: use "touch filename" or "echo 'content' > filename"
-- For creating directories: use "mkdir dirname"
-- Do NOT confuse file creation with virtual environment creation
-
-Available tools:
-- search_folder: Find directories matching a pattern
-- run_command: Execute shell commands safely (USE THIS for ls, cd, cat, touch, mkdir, echo, etc.)
-- list_options: Present multiple choices to the user
-- create_env: Create virtual environments (ONLY for Python venv/virtualenv)
-- switch_env: Switch between environments
-
-ALWAYS respond in this JSON format:
-{
-    "action": "execute",
-    "command": "actual shell command",
-    "message": "explanation of what will be done",
-    "tool_calls": [{"tool": "run_command", "args": {"command": "ls -la"}}]
-}
-
-Examples:
-- "create a file called test.txt" → {"tool": "run_command", "args": {"command": "touch test.txt"}}
-- "show me files" → {"tool": "run_command", "args": {"command": "ls -la"}}
-- "create python environment" → {"tool": "create_env", "args": {"env_name": "myenv"}}
-
-Be helpful and ALWAYS use tools to perform actual actions, not just descriptions."""
-    
-    def process_command(self, user_input: str) -> Dict[str, Any]:
-        """Process a natural language command and return structured response."""
+        """Load the system prompt for the agent.
+        
+        Only the part every request needs; tool guides are added per request.
+        """
+        return self.prompt_assembler.core
+    
+    def process_command(self, user_input: str, context: Optional[Dict[str, Any]] = None,
+                        on_message: Optional[Callable[[str], None]] = None,
+                        cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Process a natural language command and return structured response.
+        
+        ``context`` overrides fields of the local system context, which lets
+        the agent daemon answer on behalf of a shell running elsewhere.
+        ``on_message`` receives the model's message text as it is generated.
+        Setting ``cancel_event`` stops this request only, even if it was set
+        before the request started; cancel() stops every running request.
+        """
+        # The deadline covers the whole request, including any escalation
+        timeout_ms = self.config.get("agent.timeout_ms", 0)
+        deadline = time.perf_counter() + timeout_ms / 1000 if timeout_ms else None
+        cancel_event = cancel_event or threading.Event()
+        self._active_requests.add(cancel_event)
+        
         try:
-            # Prepare the prompt
-            prompt = self._build_prompt(user_input)
+            if cancel_event.is_set():
+                raise GenerationCancelled("cancelled")
             
-            # Get response from LLM
-            response = self.llama_client.generate(prompt)
+            context = {**self._get_context(), **(context or {})}
             
-            # Parse JSON response
-            try:
-                parsed_response = json.loads(response)
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                parsed_response = {
-                    "action": "info",
-                    "message": response,
-                    "command": None
-                }
+            # Fixed mappings are answered without the model
+            with self.tracer.span("intent_match") as span:
+                parsed_response = self._match_intent(user_input)
+                span.set(matched=parsed_response is not None)
+            
+            if parsed_response is None:
+                with self.tracer.span("cache_lookup") as span:
+                    parsed_response = self._lookup_cache(user_input, context)
+                    span.set(hit=parsed_response is not None)
+            
+            if parsed_response is None:
+                # Prepare the prompt
+                with self.tracer.span("prompt_build"):
+                    prompt = self._build_prompt(user_input, context)
+                
+                # Get response from LLM
+                with self.tracer.span("inference"):
+                    response = self.llama_client.generate(prompt, on_message=on_message, deadline=deadline,
+                                                          cancel_event=cancel_event)
+                
+                # Parse JSON response
+                with self.tracer.span("parse") as span:
+                    try:
+                        parsed_response = json.loads(response)
+                        self._record_parse(True)
+                        self._store_cache(user_input, context, parsed_response)
+                    except json.JSONDecodeError:
+                        self._record_parse(False)
+                        span.set(failed=True)
+                        # Fallback if JSON parsing fails
+                        parsed_response = {
+                            "action": "info",
+                            "message": response,
+                            "command": None
+                        }
             
             # Process any tool calls
             if "tool_calls" in parsed_response:
@@ -106,22 +233,104 @@ Be helpful and ALWAYS use tools to perform actual actions, not just descriptions
             
             return parsed_response
             
+        except GenerationCancelled as e:
+            self.logger.warning(f"Request {e.reason}: {user_input}")
+            return {
+                "action": "info",
+                "message": "Cancelled." if e.reason == "cancelled" else f"Timed out after {timeout_ms} ms.",
+                "command": None,
+                "cancelled": e.reason
+            }
         except Exception as e:
             self.logger.error(f"Error processing command: {e}")
             return {
                 "action": "info",
                 "message": f"Error: {str(e)}",
-                "command": None
+                "command": None,
+                "error": str(e)
             }
+        finally:
+            self._active_requests.discard(cancel_event)
+    
+    def cancel(self):
+        """Abort every request in progress within one token step (signal-safe)."""
+        for cancel_event in list(self._active_requests):
+            cancel_event.set()
+    
+    def _match_intent(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """Return a fast-path response if a deterministic rule matches."""
+        if not self.intent_matcher:
+            return None
+        
+        response = self.intent_matcher.match(user_input)
+        if response is not None:
+            self.logger.info(f"Fast-path intent matched: {user_input} -> {response['tool_calls']}")
+        return response
+    
+    def _lookup_cache(self, user_input: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return a cached response for this request, if any."""
+        if not self.response_cache:
+            return None
+        
+        try:
+            cached = self.response_cache.get(user_input, context)
+        except Exception as e:
+            self.logger.warning(f"Response cache lookup failed: {e}")
+            return None
+        
+        self.logger.info(f"Response cache {'hit' if cached is not None else 'miss'}: {user_input}")
+        return cached
+    
+    def _record_parse(self, success: bool):
+        """Track the JSON parse-failure rate of model responses."""
+        mode = "grammar" if self.llama_client.grammar is not None else "free"
+        stats = self.parse_stats[mode]
+        stats["responses"] += 1
+        if not success:
+            stats["failures"] += 1
+        
+        rate = stats["failures"] / stats["responses"]
+        log = self.logger.info if success else self.logger.warning
+        log(
+            f"JSON parse {'succeeded' if success else 'failed'} ({mode} decoding); "
+            f"failure rate {rate:.1%} over {stats['responses']} responses"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters for the parse-failure rate, response cache and model tiers."""
+        stats = {"parse": self.parse_stats}
+        if self.response_cache:
+            stats["response_cache"] = self.response_cache.stats()
+        if isinstance(self.llama_client, ModelRouter):
+            stats["routing"] = self.llama_client.stats()
+        elif isinstance(self.llama_client, LlamaClient) and self.llama_client.footprint:
+            stats["memory"] = self.llama_client.memory_report()
+        return stats
+    
+    def _store_cache(self, user_input: str, context: Dict[str, Any], response: Dict[str, Any]):
+        """Cache a parsed translation.
+        
+        Called before tool processing: tool results depend on the filesystem
+        at the time of the call and are recomputed on every hit.
+        """
+        if not self.response_cache:
+            return
+        
+        try:
+            self.response_cache.put(user_input, context, response)
+        except Exception as e:
+            self.logger.warning(f"Response cache store failed: {e}")
+    
+    def _prompt_prefix(self) -> str:
+        """Static start of every prompt, shared across requests."""
+        return f"System: {self.system_prompt}\n\n"
     
-    def _build_prompt(self, user_input: str) -> str:
+    def _build_prompt(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> str:
         """Build the complete prompt for the LLM."""
         # Get current context
-        context = self._get_context()
+        context = {**self._get_context(), **(context or {})}
         
-        prompt = f"""System: {self.system_prompt}
-
-Context:
+        tail = f"""Context:
 - Current directory: {context['pwd']}
 - User: {context['user']}
 - Operating system: {context['os']}
@@ -130,6 +339,11 @@ User request: {user_input}
 
 Response (JSON):"""
         
+        # Only the tool guides relevant to the request, within the token budget
+        prompt, info = self.prompt_assembler.assemble(self._prompt_prefix(), tail, user_input)
+        log = self.logger.warning if info["tokens"] > info["budget"] else self.logger.info
+        log(f"Prompt: {info['tokens']} tokens (budget {info['budget']}), tool guides: {', '.join(info['tools'])}")
+        
         return prompt
     
     def _get_context(self) -> Dict[str, Any]:
@@ -142,38 +356,166 @@ Response (JSON):"""
         }
     
     def _process_tool_calls(self, response: Dict[str, Any]) -> Dict[str, Any]:
-        """Process tool calls in the response."""
-        if "tool_calls" not in response:
+        """Run the response's tool calls concurrently and merge their results.
+        
+        Every outcome is kept, in call order, under ``tool_results``; messages
+        are joined in the same order and the first proposed command wins.
+        """
+        if not response.get("tool_calls"):
             return response
         
-        for tool_call in response["tool_calls"]:
-            tool_name = tool_call.get("tool")
-            tool_args = tool_call.get("args", {})
-            
-            if tool_name in self.tool_registry.tools:
-                try:
-                    tool_result = self.tool_registry.call_tool(tool_name, **tool_args)
-                    
-                    # Update response with tool result
-                    if tool_result.get("command"):
-                        response["command"] = tool_result["command"]
-                    if tool_result.get("message"):
-                        response["message"] = tool_result["message"]
-                        
-                except Exception as e:
-                    self.logger.error(f"Error calling tool {tool_name}: {e}")
-                    response["message"] = f"Error using tool {tool_name}: {str(e)}"
+        outcomes = self.tool_executor.run(response["tool_calls"])
+        response["tool_results"] = outcomes
+        
+        messages = []
+        command = None
+        for outcome in outcomes:
+            tool_name = outcome["tool"]
+            if outcome["status"] == "ok":
+                tool_result = outcome["result"]
+                if tool_result.get("command") and command is None:
+                    command = tool_result["command"]
+                if tool_result.get("message"):
+                    messages.append(tool_result["message"])
+            elif outcome["status"] == "timeout":
+                self.logger.warning(f"Tool {tool_name} timed out")
+                messages.append(f"{outcome['error']}; no result")
+            elif outcome["status"] == "error":
+                self.logger.error(f"Error calling tool {tool_name}: {outcome['error']}")
+                messages.append(f"Error using tool {tool_name}: {outcome['error']}")
+        
+        if command:
+            response["command"] = command
+        if messages:
+            response["message"] = "\n".join(messages)
         
         return response
 
 
+def run_batch(agent: CognosAgent, args: argparse.Namespace) -> int:
+    """Run ``--batch``: JSONL results to stdout (or --output), summary to stderr."""
+    parallel = args.parallel or agent.config.get("agent.batch.parallel", 1)
+    runner = BatchRunner(agent, parallel=parallel)
+    
+    source = sys.stdin if args.batch == "-" else open(args.batch)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        summary = runner.run(source, output)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    
+    agent.logger.info(f"Batch finished: {json.dumps(summary)}")
+    print(
+        f"{summary['requests']} requests ({summary['errors']} errors) in {summary['elapsed_s']:.2f}s: "
+        f"{summary['requests_per_sec']} requests/sec, {summary['tokens_per_sec']} tokens/sec "
+        f"({summary['completion_tokens']} generated, {summary['cached_tokens']} of "
+        f"{summary['prompt_tokens']} prompt tokens reused)",
+        file=sys.stderr
+    )
+    return 1 if summary["errors"] else 0
+
+
+def run_autotune(config: Config) -> int:
+    """Run ``--autotune``: measure load parameters for this host and model and save the best."""
+    model_path = resolve_model_path(config)
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}", file=sys.stderr)
+        return 1
+    
+    # The context never shrinks below what one prompt plus its answer needs
+    max_ctx = config.get("agent.context_length", 2048)
+    min_ctx = min_context(config)
+    
+    print(f"Tuning {model_path} (this loads the model once per candidate)")
+    tuner = Autotuner(model_path, max_ctx=max_ctx, min_ctx=min_ctx)
+    try:
+        profile = tuner.run()
+    except (ImportError, RuntimeError) as e:
+        print(f"Autotune failed: {e}", file=sys.stderr)
+        return 1
+    
+    save_profile(config, model_fingerprint(model_path), profile)
+    print(json.dumps(profile, indent=2))
+    print(f"Saved to {profile_path(config)}")
+    return 0
+
+
+def print_memory_plan(config: Config) -> int:
+    """Run ``--memory-plan``: estimated footprint of each model and context against the budget."""
+    model_path = resolve_model_path(config)
+    result = memory_plan(config, model_path, config.get("agent.memory.select_model", True))
+    budget = result["budget"]
+    print(f"Memory budget: {budget // MB} MB" if budget is not None else "Memory budget: unknown (no /proc/meminfo)")
+    
+    choice = result["choice"]
+    for candidate in result["candidates"]:
+        name = os.path.basename(candidate["model_path"])
+        if "error" in candidate:
+            print(f"  {name}: {candidate['error']}")
+            continue
+        marker = "*" if candidate is choice else " "
+        verdict = "fits" if candidate["fits"] else "would swap"
+        print(f"{marker} {name} n_ctx {candidate['n_ctx']}: {candidate['estimate'] // MB} MB, {verdict}")
+    
+    if choice is None:
+        print("Nothing fits; the agent will refuse to load a model")
+        return 1
+    return 0
+
+
 def main():
     """Main entry point for standalone agent testing."""
+    parser = argparse.ArgumentParser(prog="cognos-agent", description="CognOS agent")
+    parser.add_argument("command", nargs="*", help="natural language command to process")
+    parser.add_argument("--invalidate-cache", action="store_true",
+                        help="drop all cached responses and exit")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="print response cache counters and exit")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="process JSONL requests from FILE (default: stdin) and write JSONL results")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write batch results to FILE instead of stdout")
+    parser.add_argument("--parallel", type=int, metavar="N",
+                        help="requests in flight at once in batch mode (default: agent.batch.parallel)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the response cache, e.g. to evaluate a prompt change")
+    parser.add_argument("--autotune", action="store_true",
+                        help="measure threads, batch size, mmap/mlock and context length on this host and save the fastest")
+    parser.add_argument("--memory-plan", action="store_true",
+                        help="show the estimated memory use of each model and context length and exit")
+    args = parser.parse_args()
+    
+    if args.memory_plan:
+        return print_memory_plan(get_config())
+    
+    if args.autotune:
+        return run_autotune(get_config())
+    
+    if args.invalidate_cache or args.cache_stats:
+        # Cache maintenance does not need the model
+        cache = CognosAgent._create_response_cache(get_config())
+        if cache is None:
+            print("Response cache is disabled")
+            return
+        if args.invalidate_cache:
+            print(f"Removed {cache.invalidate()} cached responses")
+        if args.cache_stats:
+            print(json.dumps(cache.stats(), indent=2))
+        return
+    
     agent = CognosAgent()
+    if args.no_cache:
+        agent.response_cache = None
+    
+    if args.batch:
+        return run_batch(agent, args)
     
-    if len(sys.argv) > 1:
+    if args.command:
         # Process command from command line
-        command = " ".join(sys.argv[1:])
+        command = " ".join(args.command)
         result = agent.process_command(command)
         print(json.dumps(result, indent=2))
     else:
@@ -199,4 +541,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
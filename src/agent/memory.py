@@ -0,0 +1,233 @@
+"""
+Memory budgeting for model loading.
+
+A model needs its weights plus a KV cache that grows with the context length:
+``2 (K and V) * n_layer * n_ctx * n_embd_kv * 2 bytes (f16)``, where
+``n_embd_kv`` is smaller than the embedding width for grouped-query
+attention. The layer and head counts come from the GGUF header, so the
+footprint of every model in the models directory can be estimated without
+loading any of them. The agent picks the largest model, then the largest
+context, that fits in available memory minus a reserve for the rest of the
+system, and refuses to load anything that would push the host into swap.
+"""
+
+import glob
+import os
+import struct
+from typing import Dict, Any, List, Optional, Tuple
+
+MB = 1024 * 1024
+
+# f16 K and V entries, llama.cpp's default cache type
+KV_BYTES = 2
+
+_GGUF_MAGIC = b"GGUF"
+# GGUF value type -> struct format for the fixed-size types
+_SCALARS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?",
+            10: "<Q", 11: "<q", 12: "<d"}
+_STRING, _ARRAY = 8, 9
+
+
+class MemoryBudgetError(RuntimeError):
+    """No model and context length fit in the memory budget."""
+
+
+def read_meminfo(path: str = "/proc/meminfo") -> Dict[str, int]:
+    """``/proc/meminfo`` in bytes, or an empty dict where it does not exist."""
+    info = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                fields = value.split()
+                if fields:
+                    info[key] = int(fields[0]) * (1024 if fields[1:] == ["kB"] else 1)
+    except OSError:
+        pass
+    return info
+
+
+def vm_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or None off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _read(f, fmt: str):
+    size = struct.calcsize(fmt)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated GGUF header")
+    return struct.unpack(fmt, data)[0]
+
+
+def _read_string(f) -> str:
+    length = _read(f, "<Q")
+    return f.read(length).decode("utf-8", errors="replace")
+
+
+def _read_value(f, value_type: int):
+    """A metadata value; arrays are skipped and return their length only."""
+    if value_type in _SCALARS:
+        return _read(f, _SCALARS[value_type])
+    if value_type == _STRING:
+        return _read_string(f)
+    if value_type == _ARRAY:
+        item_type = _read(f, "<I")
+        count = _read(f, "<Q")
+        if item_type in _SCALARS:
+            f.seek(count * struct.calcsize(_SCALARS[item_type]), os.SEEK_CUR)
+        else:
+            for _ in range(count):
+                _read_value(f, item_type)
+        return count
+    raise ValueError(f"unknown GGUF value type {value_type}")
+
+
+def gguf_metadata(path: str) -> Dict[str, Any]:
+    """Key/value metadata from a GGUF (v2+) file header, arrays as their lengths."""
+    metadata = {}
+    with open(path, "rb") as f:
+        if f.read(4) != _GGUF_MAGIC:
+            raise ValueError(f"{path} is not a GGUF file")
+        version = _read(f, "<I")
+        if version < 2:
+            raise ValueError(f"GGUF version {version} is not supported")
+        _read(f, "<Q")  # tensor count
+        for _ in range(_read(f, "<Q")):
+            key = _read_string(f)
+            metadata[key] = _read_value(f, _read(f, "<I"))
+    return metadata
+
+
+def kv_cache_bytes(metadata: Dict[str, Any], n_ctx: int) -> int:
+    """KV cache size for ``n_ctx`` tokens of the model described by ``metadata``."""
+    arch = metadata["general.architecture"]
+    n_layer = metadata[f"{arch}.block_count"]
+    n_embd = metadata[f"{arch}.embedding_length"]
+    n_head = metadata[f"{arch}.attention.head_count"]
+    n_head_kv = metadata.get(f"{arch}.attention.head_count_kv", n_head)
+    n_embd_kv = n_embd * n_head_kv // n_head
+    return 2 * n_layer * n_ctx * n_embd_kv * KV_BYTES
+
+
+def estimate_footprint(model_path: str, n_ctx: int, metadata: Optional[Dict[str, Any]] = None,
+                       overhead: int = 0, logits_all: bool = False) -> int:
+    """Bytes needed to run ``model_path`` with ``n_ctx``: weights, KV cache and ``overhead``.
+
+    ``logits_all`` (needed for logprobs) adds a float per vocabulary entry
+    for every context position.
+    """
+    metadata = metadata if metadata is not None else gguf_metadata(model_path)
+    total = os.path.getsize(model_path) + kv_cache_bytes(metadata, n_ctx) + overhead
+    if logits_all:
+        total += n_ctx * metadata.get("tokenizer.ggml.tokens", 32000) * 4
+    return total
+
+
+def min_context(config) -> int:
+    """Smallest useful context: a full prompt plus the longest answer."""
+    return config.get("agent.prompt.budget_tokens", 1024) + config.get("agent.max_tokens", 512)
+
+
+def memory_budget(config, meminfo: Optional[Dict[str, int]] = None) -> Optional[int]:
+    """Bytes a model may use: available memory less ``agent.memory.reserve_mb``,
+    capped at ``agent.memory.budget_mb``. None where memory cannot be read."""
+    meminfo = read_meminfo() if meminfo is None else meminfo
+    available = meminfo.get("MemAvailable")
+    if available is None:
+        return None
+
+    budget = available - config.get("agent.memory.reserve_mb", 256) * MB
+    budget_mb = config.get("agent.memory.budget_mb")
+    if budget_mb:
+        budget = min(budget, budget_mb * MB)
+    return max(budget, 0)
+
+
+def context_sizes(max_ctx: int, min_ctx: int) -> List[int]:
+    """``max_ctx`` halved down to ``min_ctx``, largest first."""
+    min_ctx = min(min_ctx, max_ctx)
+    sizes = []
+    n_ctx = max_ctx
+    while n_ctx > min_ctx:
+        sizes.append(n_ctx)
+        n_ctx //= 2
+    return sizes + [min_ctx]
+
+
+def candidate_models(config, model_path: str) -> List[str]:
+    """GGUF files next to ``model_path`` (or in ``agent.memory.models_dir``), largest first."""
+    models_dir = config.get("agent.memory.models_dir") or os.path.dirname(model_path)
+    draft = config.get("agent.speculative.draft_model_path")
+    paths = {os.path.normpath(path) for path in glob.glob(os.path.join(models_dir, "*.gguf"))}
+    paths.add(os.path.normpath(model_path))
+    if draft:
+        paths.discard(os.path.normpath(draft))
+    return sorted((path for path in paths if os.path.exists(path)), key=os.path.getsize, reverse=True)
+
+
+def plan(config, model_path: str, select_model: bool = True, logits_all: bool = False,
+         meminfo: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Footprint of every candidate model and context length against the budget.
+
+    Returns ``{"budget", "choice", "candidates"}``. Candidates are in
+    preference order (largest model, then largest context) and ``choice``
+    is the first that fits, or None. Without readable meminfo (budget None)
+    or GGUF metadata the configured model and context are chosen unchecked,
+    with an ``estimate`` of None.
+    """
+    budget = memory_budget(config, meminfo)
+    overhead = config.get("agent.memory.overhead_mb", 128) * MB
+    sizes = context_sizes(config.get("agent.context_length", 2048), min_context(config))
+    models = candidate_models(config, model_path) if select_model else [model_path]
+
+    candidates = []
+    for path in models:
+        try:
+            metadata = gguf_metadata(path)
+        except (OSError, ValueError, KeyError) as e:
+            candidates.append({"model_path": path, "error": str(e)})
+            continue
+        for n_ctx in sizes:
+            try:
+                estimate = estimate_footprint(path, n_ctx, metadata, overhead, logits_all)
+            except KeyError as e:
+                candidates.append({"model_path": path, "error": f"missing metadata {e}"})
+                break
+            candidates.append({
+                "model_path": path,
+                "n_ctx": n_ctx,
+                "estimate": estimate,
+                "fits": budget is None or estimate <= budget
+            })
+
+    choice = next((c for c in candidates if c.get("fits")), None)
+    if budget is None or not any("estimate" in c for c in candidates):
+        # Nothing to check against: load the configured model as before
+        choice = {"model_path": model_path, "n_ctx": sizes[0], "estimate": None, "fits": True}
+    return {"budget": budget, "choice": choice, "candidates": candidates}
+
+
+def select_configuration(config, model_path: str, select_model: bool = True,
+                         logits_all: bool = False) -> Tuple[str, int, Dict[str, Any]]:
+    """Model path and context length to load, plus the plan they came from.
+
+    Raises MemoryBudgetError when nothing fits.
+    """
+    result = plan(config, model_path, select_model, logits_all)
+    choice = result["choice"]
+    if choice is None:
+        smallest = min((c["estimate"] for c in result["candidates"] if "estimate" in c), default=None)
+        raise MemoryBudgetError(
+            f"No model fits in {result['budget'] // MB} MB of memory"
+            + (f" (smallest needs {smallest // MB} MB)" if smallest is not None else "")
+            + "; loading would swap. Free memory, lower agent.context_length or use a smaller model"
+        )
+    return choice["model_path"], choice["n_ctx"], result
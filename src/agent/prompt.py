@@ -0,0 +1,160 @@
+"""
+Token-budgeted prompt assembly for the CognOS agent.
+
+The system prompt is split into a small core that every request needs (role,
+tool names, response format) and one guide section per tool (description,
+command mappings, examples). The core is the static prefix kept in the KV
+cache; for each request only the guide sections whose keywords overlap the
+request are added, in registry order, until the token budget is used up.
+"""
+
+import re
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+
+CORE_PROMPT = """You are CognOS, an AI assistant that helps users interact with their Linux system.
+
+When users ask for file/directory operations, ALWAYS use the appropriate tool instead of just describing what to do.
+
+Available tools: {tool_names}
+
+ALWAYS respond in this JSON format:
+{{
+    "action": "execute",
+    "command": "actual shell command",
+    "message": "explanation of what will be done",
+    "tool_calls": [{{"tool": "run_command", "args": {{"command": "ls -la"}}}}]
+}}
+
+Be helpful and ALWAYS use tools to perform actual actions, not just descriptions."""
+
+# Guide sections for the built-in tools. "always" sections are sent with
+# every request; the rest only when a keyword appears in the request.
+DEFAULT_SECTIONS = [
+    {
+        "tool": "search_folder",
+        "keywords": ["find", "search", "locate", "where", "folder", "directory", "dir", "go", "navigate"],
+        "text": """- search_folder: Find directories matching a pattern
+  - "find directory X" → use search_folder with pattern X"""
+    },
+    {
+        "tool": "list_options",
+        "keywords": ["choose", "option", "options", "select", "pick", "which", "choice"],
+        "text": """- list_options: Present multiple choices to the user"""
+    },
+    {
+        "tool": "run_command",
+        "always": True,
+        "keywords": [],
+        "text": """- run_command: Execute shell commands safely (USE THIS for ls, cd, cat, touch, mkdir, echo, etc.)
+  - "show files" / "list files" / "what's here" → use run_command with "ls -la"
+  - "create file" / "make file" / "touch file" → use run_command with "touch filename"
+  - "create directory" / "make directory" → use run_command with "mkdir dirname"
+  - "go to directory" → use run_command with "cd path"
+  - For creating files: use "touch filename" or "echo 'content' > filename"
+  Examples:
+  - "create a file called test.txt" → {"tool": "run_command", "args": {"command": "touch test.txt"}}
+  - "show me files" → {"tool": "run_command", "args": {"command": "ls -la"}}"""
+    },
+    {
+        "tool": "create_env",
+        "keywords": ["environment", "env", "venv", "virtualenv", "virtual", "python"],
+        "text": """- create_env: Create virtual environments (ONLY for Python venv/virtualenv)
+  - "create virtual environment" / "create python environment" → use create_env
+  - Do NOT confuse file creation with virtual environment creation
+  Example:
+  - "create python environment" → {"tool": "create_env", "args": {"name": "myenv"}}"""
+    },
+    {
+        "tool": "switch_env",
+        "keywords": ["switch", "activate", "deactivate", "workon", "venv"],
+        "text": """- switch_env: Switch between environments
+  - "switch environment" → use switch_env"""
+    }
+]
+
+GUIDE_HEADER = "Tool guide:\n"
+
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+def keywords(text: str) -> set:
+    """Lowercase words of ``text``, with a plural "s" also matching the singular."""
+    words = set(_WORD.findall(text.lower()))
+    return words | {word[:-1] for word in words if len(word) > 3 and word.endswith("s")}
+
+
+class PromptAssembler:
+    """Builds prompts from the core plus the tool guides relevant to a request."""
+
+    def __init__(self, tools: Dict[str, str], count_tokens: Callable[[str], int],
+                 budget: int, sections: Optional[List[Dict[str, Any]]] = None, dynamic: bool = True):
+        """``tools`` is ``ToolRegistry.list_tools()``; ``count_tokens`` counts
+        tokens with the model's tokenizer, without a BOS token."""
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.dynamic = dynamic
+        self.core = CORE_PROMPT.format(tool_names=", ".join(tools))
+
+        # Tools without a written guide (plugins) get one from their description
+        known = {section["tool"]: section for section in (sections or DEFAULT_SECTIONS)}
+        self.sections = []
+        for name, description in tools.items():
+            section = known.get(name) or {
+                "tool": name,
+                "keywords": sorted(keywords(f"{name.replace('_', ' ')} {description}")),
+                "text": f"- {name}: {description}"
+            }
+            self.sections.append({**section, "keywords": keywords(" ".join(section["keywords"]))})
+
+        self._token_counts: Dict[str, int] = {}
+
+    def tokens(self, text: str) -> int:
+        """Token count of ``text``, memoized for the fixed pieces."""
+        count = self._token_counts.get(text)
+        if count is None:
+            count = self._token_counts[text] = self.count_tokens(text)
+        return count
+
+    def select(self, request: str) -> List[Dict[str, Any]]:
+        """Guide sections for ``request``, most relevant first."""
+        if not self.dynamic:
+            return list(self.sections)
+
+        words = keywords(request)
+        scored = []
+        for position, section in enumerate(self.sections):
+            score = len(words & section["keywords"])
+            if section.get("always") or score:
+                scored.append((not section.get("always"), -score, position, section))
+        scored.sort(key=lambda item: item[:3])
+        return [section for *_, section in scored]
+
+    def assemble(self, prefix: str, tail: str, request: str) -> Tuple[str, Dict[str, Any]]:
+        """Join ``prefix``, the selected guides and ``tail`` within the budget.
+
+        Returns the prompt and ``{"tokens", "budget", "tools"}``, where
+        ``tokens`` is the exact count for the whole prompt. The prefix and
+        tail are always sent, even if they alone exceed the budget.
+        """
+        # Piece counts are summed (plus BOS) to choose sections; joins can
+        # shift a token or two, which the final count below picks up
+        used = 1 + self.tokens(prefix) + self.count_tokens(tail) + self.tokens(GUIDE_HEADER)
+        chosen = []
+        for section in self.select(request):
+            cost = self.tokens(section["text"] + "\n")
+            if used + cost > self.budget:
+                continue
+            chosen.append(section)
+            used += cost
+
+        # Registry order keeps the start of the guide stable between requests,
+        # so more of it is reused from the KV cache
+        chosen.sort(key=self.sections.index)
+        guide = "".join(section["text"] + "\n" for section in chosen)
+        prompt = prefix + (GUIDE_HEADER + guide + "\n" if guide else "") + tail
+        return prompt, {
+            "tokens": 1 + self.count_tokens(prompt),
+            "budget": self.budget,
+            "tools": [section["tool"] for section in chosen]
+        }
@@ -0,0 +1,149 @@
+"""
+Tiered model routing for the CognOS agent.
+
+Requests go to the smallest model first. Its answer is kept unless it fails
+the response check (invalid JSON, unknown tool) or its mean token
+log-probability is below the tier's ``min_avg_logprob``, in which case the
+next, larger tier answers. The last tier's answer is always kept. Per-tier
+hit rates, escalation reasons and latencies are recorded for tuning.
+
+ModelRouter has the LlamaClient interface the agent uses, so it can stand in
+for a single client.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional
+
+ESCALATION_REASONS = ("schema", "unknown_tool", "low_confidence")
+
+
+class Tier:
+    """One model in the routing order with its escalation threshold."""
+
+    def __init__(self, name: str, client, min_avg_logprob: Optional[float] = None):
+        self.name = name
+        self.client = client
+        self.min_avg_logprob = min_avg_logprob
+        self.requests = 0
+        self.accepted = 0
+        self.escalations = {reason: 0 for reason in ESCALATION_REASONS}
+        self.latencies_ms = deque(maxlen=500)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "requests": self.requests,
+            "accepted": self.accepted,
+            "hit_rate": round(self.accepted / self.requests, 3) if self.requests else None,
+            "escalations": dict(self.escalations),
+            "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None
+        }
+
+
+class ModelRouter:
+    """Generates with the first tier whose answer passes its checks."""
+
+    def __init__(self, tiers: List[Tier], check: Callable[[str], Optional[str]], logger,
+                 escalate_on=ESCALATION_REASONS):
+        """``check`` returns "schema" or "unknown_tool" for an unusable answer, else None."""
+        if not tiers:
+            raise ValueError("ModelRouter needs at least one tier")
+        self.tiers = tiers
+        self.check = check
+        self.logger = logger
+        self.escalate_on = set(escalate_on)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def grammar(self):
+        return self.tiers[-1].client.grammar
+
+    @property
+    def n_ctx(self) -> int:
+        return min(tier.client.n_ctx for tier in self.tiers)
+
+    @property
+    def last_usage(self) -> Dict[str, int]:
+        """Token counts of this thread's last generation, summed over the tiers it tried."""
+        total = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        for tier in self.tiers[:getattr(self._local, "tried", 0)]:
+            for field, count in tier.client.last_usage.items():
+                total[field] = total.get(field, 0) + count
+        return total
+
+    @last_usage.setter
+    def last_usage(self, usage: Dict[str, int]):
+        self._local.tried = 0
+
+    @property
+    def last_tier(self) -> Optional[str]:
+        """Tier that answered this thread's last generation."""
+        return getattr(self._local, "tier", None)
+
+    def set_grammar(self, gbnf: Optional[str]):
+        for tier in self.tiers:
+            tier.client.set_grammar(gbnf)
+
+    def prepare_prefix(self, prefix: str):
+        for tier in self.tiers:
+            tier.client.prepare_prefix(prefix)
+
+    def count_tokens(self, text: str) -> int:
+        # The last tier is the one every prompt must fit
+        return self.tiers[-1].client.count_tokens(text)
+
+    def _escalation_reason(self, tier: Tier, text: str) -> Optional[str]:
+        reason = self.check(text)
+        if reason is None and tier.min_avg_logprob is not None:
+            avg_logprob = tier.client.last_avg_logprob
+            if avg_logprob is not None and avg_logprob < tier.min_avg_logprob:
+                reason = "low_confidence"
+        return reason if reason in self.escalate_on else None
+
+    def generate(self, prompt: str, on_message: Optional[Callable[[str], None]] = None,
+                 deadline: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> str:
+        """Generate with each tier in turn until one answer is accepted.
+
+        Message text from a tier that may still be overruled is held back
+        and passed to ``on_message`` only once its answer is accepted.
+        ``deadline`` and ``cancel_event`` cover all tiers together.
+        """
+        self._local.tried = 0
+        for index, tier in enumerate(self.tiers):
+            last = index == len(self.tiers) - 1
+            held = []
+            start = time.perf_counter()
+            text = tier.client.generate(prompt, on_message=on_message if last else held.append,
+                                        deadline=deadline, cancel_event=cancel_event)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._local.tried = index + 1
+
+            reason = None if last else self._escalation_reason(tier, text)
+            with self._lock:
+                tier.requests += 1
+                tier.latencies_ms.append(elapsed_ms)
+                if reason is None:
+                    tier.accepted += 1
+                else:
+                    tier.escalations[reason] += 1
+
+            if reason is None:
+                self._local.tier = tier.name
+                if on_message and not last:
+                    for delta in held:
+                        on_message(delta)
+                self.logger.info(f"Answered by model tier {tier.name} in {elapsed_ms:.0f} ms")
+                return text
+
+            self.logger.info(
+                f"Escalating from model tier {tier.name} after {elapsed_ms:.0f} ms: {reason}"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {tier.name: tier.stats() for tier in self.tiers}
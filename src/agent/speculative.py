@@ -0,0 +1,124 @@
+"""
+Speculative decoding support for LlamaClient.
+
+llama_cpp.Llama accepts a ``draft_model``: a callable that, given the tokens
+so far, proposes the next few. The target model verifies all of them in one
+batched eval and keeps the prefix it agrees with, so every accepted draft
+token is a decode step saved. Two drafters are supported:
+
+- ``prompt_lookup``: llama_cpp's LlamaPromptLookupDecoding, which copies the
+  continuation of the latest n-gram match in the prompt. It needs no extra
+  model and suits commands that repeat file and directory names from the
+  request.
+- ``draft_model``: a small GGUF (e.g. TinyLlama) run greedily. It must use
+  the same tokenizer as the main model.
+
+llama_cpp does not report how many draft tokens were accepted. DraftStats
+counts the proposals instead. Each verify round yields the accepted drafts
+plus one token from the target model, so ``accepted = generated - rounds``.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+
+class DraftStats:
+    """Wraps a drafter and counts verify rounds and proposed tokens."""
+
+    def __init__(self, drafter):
+        self.drafter = drafter
+        self.rounds = 0
+        self.proposed = 0
+
+    def __call__(self, input_ids, **kwargs):
+        draft = self.drafter(input_ids, **kwargs)
+        self.rounds += 1
+        self.proposed += len(draft)
+        return draft
+
+    def snapshot(self) -> Tuple[int, int]:
+        return self.rounds, self.proposed
+
+
+def acceptance(generated: int, rounds: int, proposed: int) -> Dict[str, Any]:
+    """Accepted draft tokens and acceptance rate for one generation.
+
+    ``rounds`` and ``proposed`` are the DraftStats deltas for it. Drafts from
+    the final round, cut off by a stop condition, count as rejected.
+    """
+    accepted = min(max(generated - rounds, 0), proposed)
+    return {
+        "proposed": proposed,
+        "accepted": accepted,
+        "rate": accepted / proposed if proposed else None
+    }
+
+
+class DraftModel:
+    """Greedy drafter backed by a second, smaller llama_cpp model."""
+
+    def __init__(self, model_path: str, num_pred_tokens: int = 4, **llama_kwargs):
+        from llama_cpp import Llama
+
+        self.model = Llama(model_path=model_path, verbose=False, **llama_kwargs)
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids, **kwargs):
+        import numpy as np
+
+        # Rewind to the longest prefix already in the draft KV cache; only
+        # the tokens the target accepted since last round are evaluated
+        model = self.model
+        common = 0
+        for cached, token in zip(model.input_ids[:model.n_tokens], input_ids):
+            if cached != token:
+                break
+            common += 1
+        model.n_tokens = min(common, len(input_ids) - 1)
+        model.eval(list(input_ids[model.n_tokens:]))
+
+        draft = []
+        for _ in range(self.num_pred_tokens):
+            if model.n_tokens >= model.n_ctx():
+                break
+            token = model.sample(top_k=1, temp=0.0)
+            if token == model.token_eos():
+                break
+            draft.append(token)
+            model.eval([token])
+        return np.array(draft, dtype=np.intc)
+
+
+def create_drafter(config, logger, n_ctx: int, n_threads: int) -> Optional[DraftStats]:
+    """Drafter configured under ``agent.speculative``, or None when disabled."""
+    if not config.get("agent.speculative.enabled", False):
+        return None
+
+    method = config.get("agent.speculative.method", "prompt_lookup")
+    num_pred_tokens = config.get("agent.speculative.num_pred_tokens", 10)
+    try:
+        # Also a version check: llama-cpp-python gained draft_model support
+        # together with this module
+        from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+        if method == "prompt_lookup":
+            drafter = LlamaPromptLookupDecoding(
+                max_ngram_size=config.get("agent.speculative.max_ngram_size", 2),
+                num_pred_tokens=num_pred_tokens
+            )
+        elif method == "draft_model":
+            drafter = DraftModel(
+                config.get("agent.speculative.draft_model_path"),
+                num_pred_tokens=num_pred_tokens,
+                n_ctx=n_ctx,
+                n_threads=n_threads
+            )
+        else:
+            logger.warning(f"Unknown speculative decoding method '{method}', decoding normally")
+            return None
+    except Exception as e:
+        # Speculation is an optimization only
+        logger.warning(f"Speculative decoding unavailable ({method}): {e}")
+        return None
+
+    logger.info(f"Speculative decoding enabled: {method}, up to {num_pred_tokens} draft tokens per round")
+    return DraftStats(drafter)
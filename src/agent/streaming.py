@@ -0,0 +1,122 @@
+"""
+Incremental JSON scanning for streamed model output.
+"""
+
+_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'
+}
+
+
+class JsonStreamScanner:
+    """Tracks a streamed JSON object one chunk at a time.
+
+    ``complete`` becomes True as soon as the top-level object closes, so the
+    caller can stop decoding instead of waiting for a stop sequence. The
+    decoded value of one top-level string field (``message`` by default) is
+    returned from ``feed`` as it arrives, for progressive display.
+    """
+
+    def __init__(self, field: str = "message"):
+        self.field = field
+        self.complete = False
+        self._chunks = []
+        self._length = 0
+        self._start = None
+        self._end = None
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._unicode = None
+        self._is_key = False
+        self._key_chars = []
+        self._last_key = None
+        self._expect_value = False
+        self._in_field = False
+
+    @property
+    def text(self) -> str:
+        """The JSON object text, or everything seen if no object closed."""
+        text = "".join(self._chunks)
+        if self._start is None:
+            return text
+        return text[self._start:self._end]
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk; return newly decoded characters of the watched field."""
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+
+        if self.complete:
+            return ""
+
+        decoded = []
+        for index, ch in enumerate(chunk):
+            if self._start is None:
+                if ch == '{':
+                    self._start = offset + index
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._scan_string_char(ch, decoded)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._is_key = self._depth == 1 and not self._expect_value
+                self._key_chars = []
+                self._in_field = (
+                    self._depth == 1 and self._expect_value and self._last_key == self.field
+                )
+            elif ch == ':' and self._depth == 1:
+                self._expect_value = True
+            elif ch == ',' and self._depth == 1:
+                self._expect_value = False
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+                    self._end = offset + index + 1
+                    break
+
+        return "".join(decoded)
+
+    def _scan_string_char(self, ch: str, decoded: list):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                if self._in_field:
+                    try:
+                        decoded.append(chr(int(self._unicode, 16)))
+                    except ValueError:
+                        pass
+                self._unicode = None
+            return
+
+        if self._escape:
+            self._escape = False
+            if ch == 'u':
+                self._unicode = ""
+            elif self._in_field:
+                decoded.append(_ESCAPES.get(ch, ch))
+            elif self._is_key:
+                self._key_chars.append(_ESCAPES.get(ch, ch))
+            return
+
+        if ch == '\\':
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            self._in_field = False
+            if self._is_key:
+                self._last_key = "".join(self._key_chars)
+        elif self._in_field:
+            decoded.append(ch)
+        elif self._is_key:
+            self._key_chars.append(ch)
+
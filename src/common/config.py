@@ -1,18 +1,36 @@
 """
 Configuration management for CognOS.
+
+get_config() returns one Config per file for the whole process. Lookups are
+cached per key path, and the file's mtime is checked at most once per
+``CHECK_INTERVAL`` so edits are picked up without a restart.
 """
 
 import json
 import os
+import threading
+import time
 from typing import Dict, Any, Optional
 
 
+_MISSING = object()
+
+
 class Config:
     """Configuration manager for CognOS."""
     
+    # Seconds between checks of the config file's mtime
+    CHECK_INTERVAL = 1.0
+    
     def __init__(self, config_path: Optional[str] = None):
         self.config_path = config_path or self._get_default_config_path()
+        self._lock = threading.RLock()
+        self._values: Dict[str, Any] = {}
+        self._mtime = None
+        self._next_check = 0.0
         self.config = self._load_config()
+        self._mtime = self._file_mtime()
+        self._next_check = time.monotonic() + self.CHECK_INTERVAL
     
     def _get_default_config_path(self) -> str:
         """Get the default configuration file path."""
@@ -30,12 +48,84 @@ class Config:
                 "model_path": "/opt/cognos/models/mistral-7b-q4.gguf",
                 "context_length": 4096,
                 "temperature": 0.7,
-                "max_tokens": 512
+                "max_tokens": 512,
+                "timeout_ms": 0,
+                "grammar": {
+                    "enabled": True
+                },
+                "prompt": {
+                    "dynamic": True,
+                    "budget_tokens": 1024
+                },
+                "routing": {
+                    "enabled": False,
+                    "escalate_on": ["schema", "unknown_tool", "low_confidence"],
+                    "tiers": [
+                        {
+                            "name": "small",
+                            "model_path": "/opt/cognos/models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf",
+                            "min_avg_logprob": -0.6
+                        },
+                        {
+                            "name": "large",
+                            "model_path": "/opt/cognos/models/mistral-7b-q4.gguf"
+                        }
+                    ]
+                },
+                "speculative": {
+                    "enabled": False,
+                    "method": "prompt_lookup",
+                    "num_pred_tokens": 10,
+                    "max_ngram_size": 2,
+                    "draft_model_path": None
+                },
+                "intents": {
+                    "enabled": True,
+                    "include_defaults": True,
+                    "rules": []
+                },
+                "response_cache": {
+                    "enabled": True,
+                    "path": "~/.cache/cognos/responses.db",
+                    "max_entries": 500,
+                    "ttl_seconds": 604800
+                },
+                "prompt_cache": {
+                    "enabled": True,
+                    "dir": "~/.cache/cognos/prompt-cache"
+                },
+                "daemon": {
+                    "socket_path": "~/.local/share/cognos/agentd.sock",
+                    "connect_timeout": 0.5
+                },
+                "batch": {
+                    "parallel": 1
+                },
+                "autotune": {
+                    "enabled": True,
+                    "path": "~/.cache/cognos/tuning.json"
+                },
+                "memory": {
+                    "enabled": True,
+                    "select_model": True,
+                    "models_dir": None,
+                    "budget_mb": None,
+                    "reserve_mb": 256,
+                    "overhead_mb": 128
+                }
             },
             "shell": {
                 "confirmation_required": True,
                 "log_commands": True,
-                "safe_mode": True
+                "safe_mode": True,
+                "stream_output": True,
+                "backend": "persistent",
+                "backend_shell": "/bin/bash",
+                "frecency": {
+                    "enabled": True,
+                    "path": "~/.local/share/cognos/frecency.db",
+                    "max_total_rank": 10000
+                }
             },
             "ui": {
                 "theme": "dark",
@@ -43,13 +133,42 @@ class Config:
                 "window_size": [600, 400]
             },
             "tools": {
-                "search_folder": {"enabled": True, "max_results": 10},
+                "executor": {"max_workers": 4, "default_timeout": 10},
+                "search_folder": {
+                    "enabled": True,
+                    "max_results": 10,
+                    "timeout": 5,
+                    "index": {
+                        "enabled": True,
+                        "path": "~/.cache/cognos/dirindex.db",
+                        "root": "~",
+                        "max_depth": 8,
+                        "refresh_interval": 300,
+                        "exclude": [".git", "node_modules", "__pycache__", ".cache", ".venv", "venv"]
+                    },
+                    "walker": {
+                        "max_depth": 6,
+                        "time_budget_ms": 2000,
+                        "workers": 4,
+                        "exclude": [".git", "node_modules", "__pycache__", "/proc", "/sys", "/dev"]
+                    }
+                },
                 "run_command": {"enabled": True, "timeout": 30},
-                "create_env": {"enabled": True, "default_python": "python3"}
+                "output_cache": {"enabled": True, "max_bytes": 4194304, "ttl_seconds": 30},
+                "create_env": {"enabled": True, "default_python": "python3", "timeout": 30}
+            },
+            "tracing": {
+                "enabled": False,
+                "file": "~/.local/share/cognos/traces.jsonl"
             },
             "logging": {
                 "level": "INFO",
+                "mode": "async",
                 "file": "~/.local/share/cognos/cognos.log",
+                "jsonl_file": "~/.local/share/cognos/cognos.jsonl",
+                "queue_size": 1000,
+                "flush_interval": 1.0,
+                "fsync": True,
                 "max_size": "10MB",
                 "backup_count": 5
             }
@@ -82,39 +201,102 @@ class Config:
         return result
     
     def _save_config(self, config: Dict[str, Any]):
-        """Save configuration to file."""
+        """Save configuration to file atomically (write, then rename)."""
+        # Only writes need tempfile; importing it up front slows every startup
+        import tempfile
+        
         try:
-            with open(self.config_path, 'w') as f:
-                json.dump(config, f, indent=2)
+            config_dir = os.path.dirname(os.path.abspath(self.config_path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=config_dir)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=2)
+                os.replace(tmp_path, self.config_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            # Our own write is not an external change to reload
+            self._mtime = self._file_mtime()
         except Exception as e:
             print(f"Error saving config: {e}")
     
+    def _file_mtime(self) -> Optional[tuple]:
+        # Size as well as mtime: coarse timestamps can miss quick successive edits
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _check_for_changes(self):
+        """Reload if the file changed since it was last read."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.CHECK_INTERVAL
+        
+        mtime = self._file_mtime()
+        if mtime is not None and mtime != self._mtime:
+            self.reload()
+    
     def get(self, key_path: str, default: Any = None) -> Any:
         """Get a configuration value using dot notation."""
-        keys = key_path.split('.')
+        self._check_for_changes()
+        
+        value = self._values.get(key_path, _MISSING)
+        if value is _MISSING:
+            value = self._lookup(key_path)
+            self._values[key_path] = value
+        
+        return default if value is _MISSING else value
+    
+    def _lookup(self, key_path: str) -> Any:
         value = self.config
         
-        for key in keys:
+        for key in key_path.split('.'):
             if isinstance(value, dict) and key in value:
                 value = value[key]
             else:
-                return default
+                return _MISSING
         
         return value
     
     def set(self, key_path: str, value: Any):
         """Set a configuration value using dot notation."""
-        keys = key_path.split('.')
-        config = self.config
-        
-        for key in keys[:-1]:
-            if key not in config:
-                config[key] = {}
-            config = config[key]
-        
-        config[keys[-1]] = value
-        self._save_config(self.config)
+        with self._lock:
+            keys = key_path.split('.')
+            config = self.config
+            
+            for key in keys[:-1]:
+                if key not in config:
+                    config[key] = {}
+                config = config[key]
+            
+            config[keys[-1]] = value
+            self._values = {}
+            self._save_config(self.config)
     
     def reload(self):
         """Reload configuration from file."""
-        self.config = self._load_config()
\ No newline at end of file
+        with self._lock:
+            mtime = self._file_mtime()
+            config = self._load_config()
+            # Readers see either the old or the new settings, never a mix
+            self.config, self._values = config, {}
+            self._mtime = mtime if mtime is not None else self._file_mtime()
+
+
+_configs: Dict[str, Config] = {}
+_configs_lock = threading.Lock()
+
+
+def get_config(config_path: Optional[str] = None) -> Config:
+    """Process-wide shared Config for ``config_path`` (default: the user config)."""
+    key = os.path.abspath(os.path.expanduser(config_path)) if config_path else None
+    config = _configs.get(key)
+    if config is None:
+        with _configs_lock:
+            config = _configs.get(key)
+            if config is None:
+                config = _configs[key] = Config(key)
+    return config
@@ -1,11 +1,186 @@
 """
 Logging utilities for CognOS.
+
+In the default "async" mode, file records are handed to a bounded in-memory
+queue and written as JSONL by a background thread that batches writes and
+fsyncs at intervals, so a slow SD card never stalls the interactive path.
 """
 
+import collections
+import json
 import logging
 import os
-from typing import Optional
-from logging.handlers import RotatingFileHandler
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Handle both relative and absolute imports
+try:
+    from .config import get_config
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from src.common.config import get_config
+
+
+class AsyncJsonlHandler(logging.Handler):
+    """Queues records and writes them as JSONL from a background thread.
+    
+    When the queue is full, the lowest-severity record is dropped: an incoming
+    DEBUG record is discarded outright, otherwise the oldest queued record of
+    a lower level makes room. Records are only dropped when nothing less
+    important is queued. Drop counts are written as a "dropped" record.
+    """
+    
+    def __init__(self, path: str, queue_size: int = 1000, flush_interval: float = 1.0,
+                 fsync: bool = True, max_bytes: int = 0, backup_count: int = 0):
+        super().__init__()
+        self.path = os.path.expanduser(path)
+        self.queue_size = max(1, queue_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        
+        self.dropped: Dict[str, int] = collections.Counter()
+        self._queue: collections.deque = collections.deque()
+        self._ready = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self._file = None
+        self._writer = threading.Thread(target=self._run, name="cognos-log-writer", daemon=True)
+        self._writer.start()
+    
+    def emit(self, record: logging.LogRecord):
+        # Runs on the caller's thread: capture fields, never touch the disk
+        try:
+            entry = {
+                "ts": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage()
+            }
+            audit = getattr(record, "audit", None)
+            if audit:
+                entry.update(audit)
+            if record.exc_info:
+                entry["exception"] = logging.Formatter().formatException(record.exc_info)
+        except Exception:
+            self.handleError(record)
+            return
+        
+        with self._ready:
+            if self._closed:
+                return
+            if len(self._queue) >= self.queue_size and not self._make_room(record.levelno):
+                self.dropped[record.levelname] += 1
+                return
+            self._queue.append((record.levelno, entry))
+            self._pending += 1
+            self._ready.notify()
+    
+    def _make_room(self, levelno: int) -> bool:
+        """Drop the oldest queued record less severe than ``levelno``, if any."""
+        if levelno <= logging.DEBUG:
+            return False
+        
+        lowest = min(queued_level for queued_level, _ in self._queue)
+        if lowest >= levelno:
+            return False
+        
+        for index, (queued_level, entry) in enumerate(self._queue):
+            if queued_level == lowest:
+                del self._queue[index]
+                self._pending -= 1
+                self.dropped[entry["level"]] += 1
+                return True
+        return False
+    
+    def _run(self):
+        last_sync = time.monotonic()
+        while True:
+            with self._ready:
+                if not self._queue and not self._closed:
+                    self._ready.wait(self.flush_interval)
+                batch = [entry for _, entry in self._queue]
+                self._queue.clear()
+                closed = self._closed
+                dropped = dict(self.dropped)
+                self.dropped.clear()
+            
+            if dropped:
+                batch.append({"ts": time.time(), "level": "WARNING", "logger": "cognos.log",
+                              "event": "dropped", "dropped": dropped})
+            if batch:
+                self._write(batch)
+            
+            now = time.monotonic()
+            if self._file and (closed or now - last_sync >= self.flush_interval):
+                self._sync()
+                last_sync = now
+            
+            with self._ready:
+                self._pending -= len(batch) - (1 if dropped else 0)
+                self._ready.notify_all()
+            
+            if closed:
+                break
+        
+        if self._file:
+            self._file.close()
+            self._file = None
+    
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write("".join(json.dumps(entry, default=str) + "\n" for entry in batch))
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            # Nowhere left to report to; losing log lines beats crashing the shell
+            pass
+    
+    def _sync(self):
+        try:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError:
+            pass
+    
+    def _rotate(self):
+        """Shift path -> path.1 -> ... -> path.N, like RotatingFileHandler."""
+        self._sync()
+        self._file.close()
+        self._file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.truncate(self.path, 0)
+    
+    def flush(self, timeout: float = 2.0):
+        """Wait (up to ``timeout``) until every queued record is on disk."""
+        deadline = time.monotonic() + timeout
+        with self._ready:
+            self._ready.notify()
+            while self._pending > 0 and self._writer.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+    
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+        self._writer.join(timeout=2.0)
+        super().close()
 
 
 class Logger:
@@ -25,16 +200,12 @@ class Logger:
             return logger
         
         # Get configuration
-        if self.config:
-            log_level = self.config.get("logging.level", "INFO")
-            log_file = self.config.get("logging.file", "~/.local/share/cognos/cognos.log")
-            max_size = self.config.get("logging.max_size", "10MB")
-            backup_count = self.config.get("logging.backup_count", 5)
-        else:
-            log_level = "INFO"
-            log_file = "~/.local/share/cognos/cognos.log"
-            max_size = "10MB"
-            backup_count = 5
+        config = self.config or get_config()
+        log_level = config.get("logging.level", "INFO")
+        log_mode = config.get("logging.mode", "async")
+        log_file = config.get("logging.file", "~/.local/share/cognos/cognos.log")
+        max_size = config.get("logging.max_size", "10MB")
+        backup_count = config.get("logging.backup_count", 5)
         
         # Set log level
         logger.setLevel(getattr(logging, log_level.upper()))
@@ -58,13 +229,25 @@ class Logger:
         
         # File handler with rotation
         max_bytes = self._parse_size(max_size)
-        file_handler = RotatingFileHandler(
-            log_file,
-            maxBytes=max_bytes,
-            backupCount=backup_count
-        )
+        if log_mode == "async":
+            file_handler = AsyncJsonlHandler(
+                config.get("logging.jsonl_file", "~/.local/share/cognos/cognos.jsonl"),
+                queue_size=config.get("logging.queue_size", 1000),
+                flush_interval=config.get("logging.flush_interval", 1.0),
+                fsync=config.get("logging.fsync", True),
+                max_bytes=max_bytes,
+                backup_count=backup_count
+            )
+        else:
+            # logging.handlers pulls in socket, pickle and queue; only sync mode needs it
+            from logging.handlers import RotatingFileHandler
+            file_handler = RotatingFileHandler(
+                log_file,
+                maxBytes=max_bytes,
+                backupCount=backup_count
+            )
+            file_handler.setFormatter(formatter)
         file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
         
         return logger
@@ -102,10 +285,23 @@ class Logger:
         """Log critical message."""
         self.logger.critical(message, **kwargs)
     
-    def command(self, command: str, user: str = None, result: str = None):
-        """Log command execution."""
+    def command(self, command: str, user: str = None, result: str = None, **fields):
+        """Log command execution as an audit record.
+        
+        ``fields`` become typed JSONL fields in async mode (request, confirmed,
+        exit_code, latency_ms...); text mode keeps the one-line summary.
+        """
         user = user or os.getenv("USER", "unknown")
         log_msg = f"Command executed by {user}: {command}"
         if result:
             log_msg += f" | Result: {result}"
-        self.logger.info(log_msg)
\ No newline at end of file
+        
+        try:
+            cwd = os.getcwd()
+        except OSError:
+            cwd = None
+        audit = {"event": "command", "user": user, "cwd": cwd, "command": command}
+        if result:
+            audit["result"] = result
+        audit.update(fields)
+        self.logger.info(log_msg, extra={"audit": audit})
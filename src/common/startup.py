@@ -0,0 +1,153 @@
+"""
+Startup profiling for cognos-shell (``--profile-startup``).
+
+ImportTimer sits on sys.meta_path and times every module executed after it is
+installed; StartupProfile records named init steps. The report also shows how
+long the process ran before the profiler existed (interpreter start and the
+imports that loaded this module), read from /proc.
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+
+def process_age_ms() -> Optional[float]:
+    """Milliseconds since this process started, from /proc (Linux only)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks since boot; the command
+            # name in field 2 may contain spaces, so split after its ')'
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return (uptime - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _TimedLoader:
+    """Wraps a module loader so executing the module is timed."""
+
+    def __init__(self, timer: "ImportTimer", loader):
+        self._timer = timer
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self._timer._stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self._timer.modules.append((module.__name__, (elapsed - children) * 1000, elapsed * 1000))
+
+
+class ImportTimer:
+    """Meta path finder that records self and cumulative import time per module."""
+
+    def __init__(self):
+        self.modules: List[Tuple[str, float, float]] = []
+        # Per thread: the shell's agent loader imports in the background
+        self._local = threading.local()
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def find_spec(self, fullname, path=None, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+
+        # Let the real finders resolve the module, then wrap its loader
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(self, spec.loader)
+        return spec
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupProfile:
+    """Import and init-time breakdown up to the first prompt."""
+
+    def __init__(self, import_timer: Optional[ImportTimer] = None):
+        self.created_age_ms = process_age_ms()
+        self.start = time.perf_counter()
+        self.import_timer = import_timer
+        self.steps: List[Tuple[str, float]] = []
+        self._last = self.start
+
+    def mark(self, step: str):
+        """Record the time since the previous mark as ``step``."""
+        now = time.perf_counter()
+        self.steps.append((step, (now - self._last) * 1000))
+        self._last = now
+
+    def report(self, top: int = 15) -> str:
+        lines = ["Startup profile (ms)"]
+        if self.created_age_ms is not None:
+            lines.append(f"  {'interpreter + early imports':<40}{self.created_age_ms:>10.1f}")
+
+        if self.import_timer and self.import_timer.modules:
+            imports = sorted(self.import_timer.modules, key=lambda module: -module[1])
+            total = sum(self_ms for _, self_ms, _ in imports)
+            lines.append(f"  {'profiled imports':<40}{total:>10.1f}")
+            for name, self_ms, cumulative_ms in imports[:top]:
+                lines.append(f"    {name:<38}{self_ms:>10.1f}  (cumulative {cumulative_ms:.1f})")
+
+        for step, elapsed in self.steps:
+            lines.append(f"  {step:<40}{elapsed:>10.1f}")
+
+        since_profile = (time.perf_counter() - self.start) * 1000
+        total = since_profile + (self.created_age_ms or 0.0)
+        lines.append(f"  {'time to prompt':<40}{total:>10.1f}")
+        return "\n".join(lines)
+
+
+_profile: Optional[StartupProfile] = None
+
+
+def begin_profile() -> StartupProfile:
+    """Start the process-wide startup profile (import timing included)."""
+    global _profile
+    if _profile is None:
+        _profile = StartupProfile(ImportTimer().install())
+    return _profile
+
+
+def get_profile() -> Optional[StartupProfile]:
+    """The startup profile, if --profile-startup started one."""
+    return _profile
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Lightweight request tracing for CognOS.
+
+Spans are timed with perf_counter and appended to a JSONL file when they
+finish. When tracing is disabled, span() returns a shared no-op object, so
+instrumented code pays one attribute check per span.
+
+The cognos-trace command summarizes a trace file as per-stage percentiles.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+
+def _new_id(nbytes: int = 16) -> str:
+    # Random hex ids without importing uuid, which shows up in shell startup time
+    return os.urandom(nbytes).hex()
+
+
+class _NoopSpan:
+    """Stand-in returned when tracing is disabled."""
+
+    trace_id = None
+    span_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed operation; use as a context manager."""
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str,
+                 parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = None
+
+    def set(self, **attrs):
+        """Attach attributes (token counts, outcomes...) to the span."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.tracer._pop(self)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(
+            self.name, self.start, end,
+            trace_id=self.trace_id, parent_id=self.parent_id, span_id=self.span_id,
+            **self.attrs
+        )
+        return False
+
+
+class Tracer:
+    """Creates spans and writes finished ones to a JSONL file."""
+
+    def __init__(self, path: Optional[str] = None, enabled: bool = False):
+        self.enabled = enabled and bool(path)
+        self.path = os.path.expanduser(path) if path else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span: Span):
+        self._stack().append(span)
+
+    def _pop(self, span: Span):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+
+    def current(self) -> Optional[Span]:
+        """Innermost open span on this thread."""
+        stack = self._stack() if self.enabled else None
+        return stack[-1] if stack else None
+
+    def span(self, name: str, parent: Optional[Span] = None, trace_id: Optional[str] = None,
+             parent_id: Optional[str] = None, **attrs):
+        """Open a span under ``parent`` (default: the current span on this thread).
+
+        ``trace_id``/``parent_id`` continue a trace started in another process.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+
+        parent = parent or self.current()
+        if parent is not None and parent is not NOOP_SPAN:
+            trace_id = trace_id or parent.trace_id
+            parent_id = parent_id or parent.span_id
+
+        return Span(self, name, trace_id or _new_id(), parent_id, attrs)
+
+    def record(self, name: str, start: float, end: float, parent: Optional[Span] = None,
+               trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+               span_id: Optional[str] = None, **attrs):
+        """Write a span whose start and end (perf_counter values) are already known."""
+        if not self.enabled:
+            return
+
+        if parent is not None:
+            trace_id = trace_id or parent.trace_id
+            parent_id = parent_id or parent.span_id
+
+        entry = {
+            "trace_id": trace_id or _new_id(),
+            "span_id": span_id or _new_id(8),
+            "parent_id": parent_id,
+            "name": name,
+            # Wall-clock start, derived from the monotonic timings
+            "start": time.time() - (time.perf_counter() - start),
+            "duration_ms": round((end - start) * 1000, 3)
+        }
+        entry.update(attrs)
+        line = json.dumps(entry, default=str) + "\n"
+
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._file = open(self.path, "a", buffering=1)
+                self._file.write(line)
+            except OSError:
+                # Tracing must never break a request
+                self.enabled = False
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from the 'tracing' config section."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                # Handle both relative and absolute imports
+                try:
+                    from .config import get_config
+                except ImportError:
+                    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+                    from src.common.config import get_config
+
+                config = get_config()
+                _tracer = Tracer(
+                    config.get("tracing.file", "~/.local/share/cognos/traces.jsonl"),
+                    enabled=config.get("tracing.enabled", False)
+                )
+    return _tracer
+
+
+def summarize_traces(lines) -> Dict[str, Dict[str, float]]:
+    """Per-span-name latency percentiles from JSONL trace lines."""
+    durations: Dict[str, List[float]] = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        durations.setdefault(entry["name"], []).append(entry["duration_ms"])
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+
+        def percentile(fraction: float) -> float:
+            return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": percentile(0.50),
+            "p90_ms": percentile(0.90),
+            "p99_ms": percentile(0.99),
+            "max_ms": values[-1]
+        }
+    return summary
+
+
+def main():
+    """Main entry point for cognos-trace: print per-stage latency percentiles."""
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = get_tracer().path
+
+    if not path or not os.path.exists(path):
+        print(f"No trace file found at {path}. Enable tracing with \"tracing.enabled\": true")
+        return 1
+
+    with open(path) as f:
+        summary = summarize_traces(f)
+
+    print(f"{'stage':<28}{'count':>8}{'p50 ms':>12}{'p90 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]["p50_ms"]):
+        print(
+            f"{name:<28}{stats['count']:>8}{stats['p50_ms']:>12.1f}{stats['p90_ms']:>12.1f}"
+            f"{stats['p99_ms']:>12.1f}{stats['max_ms']:>12.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
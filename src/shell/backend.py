@@ -0,0 +1,215 @@
+"""
+Persistent shell backend for cognos-shell.
+
+One bash process per session runs on a pty, so commands skip the fork+exec of
+/bin/sh and state such as `source venv/bin/activate` lasts between commands.
+bash's PROMPT_COMMAND prints a sentinel carrying the exit status and working
+directory after every command; output up to the sentinel belongs to the
+command.
+"""
+
+import io
+import os
+import re
+import select
+import shlex
+import signal
+import sys
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+
+class ShellExited(Exception):
+    """The bash process went away (e.g. the command was `exit`)."""
+
+    def __init__(self, status: int):
+        super().__init__(f"shell exited with status {status}")
+        self.status = status
+
+
+class PersistentShell:
+    """bash over a pty with sentinel-delimited exit status capture."""
+
+    def __init__(self, shell: str = "/bin/bash"):
+        self.shell = shell
+        self.pid: Optional[int] = None
+        self.fd: Optional[int] = None
+        self.cwd: Optional[str] = None
+        self._prelude: List[str] = []
+        self._nonce = os.urandom(8).hex()
+        self._sentinel = re.compile(rb"\x1e" + self._nonce.encode() + rb":(\d+):([^\x1e]*)\x1e")
+
+    @property
+    def alive(self) -> bool:
+        return self.pid is not None
+
+    def start(self):
+        """Spawn bash and wait for its first prompt."""
+        import pty
+
+        pid, fd = pty.fork()
+        if pid == 0:
+            # Child: plain bash without readline, so the pty's own echo
+            # setting applies and can be switched off
+            os.execvp(self.shell, [self.shell, "--norc", "--noprofile", "--noediting", "-i"])
+
+        self.pid, self.fd = pid, fd
+        self.cwd = None
+        prompt = f'printf "\\036{self._nonce}:%d:%s\\036" "$?" "$PWD"'
+        self._send(
+            f"stty -echo; unset HISTFILE; PS1=''; PS2=''; PROMPT_COMMAND={shlex.quote(prompt)}\n"
+        )
+        self._read_until_sentinel(None)
+
+    def close(self):
+        if self.pid is None:
+            return
+        try:
+            os.kill(self.pid, signal.SIGHUP)
+            os.waitpid(self.pid, 0)
+        except OSError:
+            pass
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.pid = self.fd = None
+
+    def chdir(self, path: str):
+        """Make the next command run in ``path``."""
+        if path != self.cwd:
+            self._prelude.append(f"cd -- {shlex.quote(path)}")
+
+    def export(self, name: str, value: Optional[str]):
+        """Set (or with None, unset) an environment variable for later commands."""
+        if value is None:
+            self._prelude.append(f"unset {name}")
+        else:
+            self._prelude.append(f"export {name}={shlex.quote(value)}")
+
+    def run(self, command: str, output: Optional[BinaryIO] = None,
+            forward_input: bool = False) -> int:
+        """Run ``command`` and return its exit status.
+
+        Output goes to ``output`` (default: stdout). With ``forward_input``,
+        keystrokes from the terminal are passed through in raw mode, so
+        interactive programs and Ctrl+C behave as in a normal shell.
+        """
+        if not self.alive:
+            self.start()
+
+        while self._prelude:
+            self._send(self._prelude.pop(0) + "\n")
+            self._read_until_sentinel(None)
+
+        # eval keeps a syntax error (an unterminated quote, say) from leaving
+        # bash waiting for a continuation line
+        self._send(f"eval {shlex.quote(command)}\n")
+        if output is None:
+            output = sys.stdout.buffer
+        status, _ = self._read_until_sentinel(output, forward_input)
+        return status
+
+    def environment(self) -> Dict[str, str]:
+        """Exported variables of the bash process, read without running external programs."""
+        output = io.BytesIO()
+        self.run('for name in $(compgen -e); do printf "%s=%s\\0" "$name" "${!name}"; done', output=output)
+        environment = {}
+        for item in output.getvalue().split(b"\0"):
+            name, sep, value = item.decode(errors="replace").partition("=")
+            if sep:
+                environment[name] = value
+        return environment
+
+    def _send(self, text):
+        data = text.encode() if isinstance(text, str) else text
+        while data:
+            written = os.write(self.fd, data)
+            data = data[written:]
+
+    def _read_until_sentinel(self, output: Optional[BinaryIO],
+                             forward_input: bool = False) -> Tuple[int, str]:
+        stdin_fd = sys.stdin.fileno() if forward_input else None
+        saved_tty = self._enter_raw(stdin_fd) if forward_input else None
+        buffer = b""
+        try:
+            while True:
+                watched = [self.fd] + ([stdin_fd] if stdin_fd is not None else [])
+                readable, _, _ = select.select(watched, [], [])
+
+                if stdin_fd is not None and stdin_fd in readable:
+                    data = os.read(stdin_fd, 1024)
+                    if data:
+                        self._send(data)
+                    else:
+                        stdin_fd = None
+
+                if self.fd not in readable:
+                    continue
+
+                try:
+                    data = os.read(self.fd, 65536)
+                except OSError:
+                    data = b""
+                if not data:
+                    self._write(output, buffer)
+                    raise ShellExited(self._reap())
+
+                buffer += data
+                found = self._sentinel.search(buffer)
+                if found:
+                    self._write(output, buffer[:found.start()])
+                    self.cwd = found.group(2).decode(errors="replace")
+                    return int(found.group(1)), self.cwd
+
+                # Hold back anything that could be the start of a split sentinel
+                split = buffer.rfind(b"\x1e")
+                keep = len(buffer) - split if split >= 0 else 0
+                self._write(output, buffer[:len(buffer) - keep])
+                buffer = buffer[len(buffer) - keep:]
+        finally:
+            if saved_tty is not None:
+                import termios
+                termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, saved_tty)
+
+    def _enter_raw(self, stdin_fd: int):
+        """Put the terminal in raw mode and copy its size to the pty."""
+        if not os.isatty(stdin_fd):
+            return None
+
+        import fcntl
+        import termios
+        import tty
+
+        try:
+            size = fcntl.ioctl(stdin_fd, termios.TIOCGWINSZ, b"\0" * 8)
+            fcntl.ioctl(self.fd, termios.TIOCSWINSZ, size)
+        except OSError:
+            pass
+        saved = termios.tcgetattr(stdin_fd)
+        tty.setraw(stdin_fd)
+        return saved
+
+    @staticmethod
+    def _write(output: Optional[BinaryIO], data: bytes):
+        if output is not None and data:
+            output.write(data)
+            output.flush()
+
+    def _reap(self) -> int:
+        """Collect the exited bash process and return its exit status."""
+        status = 1
+        try:
+            _, wait_status = os.waitpid(self.pid, 0)
+            if os.WIFEXITED(wait_status):
+                status = os.WEXITSTATUS(wait_status)
+            elif os.WIFSIGNALED(wait_status):
+                status = 128 + os.WTERMSIG(wait_status)
+        except OSError:
+            pass
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.pid = self.fd = None
+        return status
+
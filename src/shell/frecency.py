@@ -0,0 +1,131 @@
+"""
+Frecency database of visited directories for "go to X" requests.
+
+Every directory the shell enters gains one point of rank. Lookups score
+rank by how recently the directory was visited, the way zoxide does, and
+use the index on the lowercase directory name, so resolving a request costs
+a B-tree search rather than a filesystem walk. When the total rank passes
+``max_total_rank`` every rank is scaled down and directories that fall below
+one point are forgotten, which keeps the database small over years of use.
+"""
+
+import os
+import re
+import time
+from typing import List, Optional
+
+
+# Requests that mean "change to the directory called X". Only verbs that
+# cannot mean anything else: "switch to myenv" is an environment switch and
+# "move to staging" may be a file move, both for the agent to decide
+_JUMP_PATTERN = re.compile(
+    r"^(?:please\s+)?(?:go|take me|navigate|change directory|cd)\s+(?:in)?to\s+"
+    r"(?:the\s+|my\s+)?(?P<target>.+?)"
+    r"(?:\s+(?:folder|directory|dir))?(?:\s+please)?[\s.!?]*$",
+    re.IGNORECASE
+)
+
+
+def jump_target(request: str) -> Optional[str]:
+    """Directory name from a "go to X" request, or None."""
+    found = _JUMP_PATTERN.match(request.strip())
+    if not found:
+        return None
+    target = found.group("target").strip()
+    # "go to foo bar baz" is more likely a sentence than a directory name
+    return target if target and len(target.split()) <= 2 else None
+
+
+def recency_weight(age: float) -> float:
+    """Multiplier for a visit ``age`` seconds ago."""
+    if age < 3600:
+        return 4.0
+    if age < 86400:
+        return 2.0
+    if age < 604800:
+        return 0.5
+    return 0.25
+
+
+class FrecencyDB:
+    """SQLite-backed frecency ranking of visited directories."""
+
+    def __init__(self, path: str, max_total_rank: float = 10000.0):
+        self.path = os.path.expanduser(path)
+        self.max_total_rank = max_total_rank
+
+        # Imported here so that importing jump_target() stays cheap at shell startup
+        import sqlite3
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                rank REAL NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS dirs_name ON dirs (name);
+        """)
+
+    def add(self, path: str, now: Optional[float] = None):
+        """Record a visit to ``path``."""
+        path = os.path.abspath(os.path.expanduser(path))
+        if path == os.path.expanduser("~"):
+            return
+        now = now if now is not None else time.time()
+        name = (os.path.basename(path) or path).lower()
+
+        with self.db:
+            self.db.execute(
+                "INSERT INTO dirs (path, name, rank, last_access) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (path) DO UPDATE SET rank = rank + 1, last_access = excluded.last_access",
+                (path, name, now)
+            )
+            total = self.db.execute("SELECT SUM(rank) FROM dirs").fetchone()[0] or 0
+            if total > self.max_total_rank:
+                self._age(total)
+
+    def _age(self, total: float):
+        """Scale ranks back under the limit and forget rarely used directories."""
+        factor = 0.9 * self.max_total_rank / total
+        self.db.execute("UPDATE dirs SET rank = rank * ?", (factor,))
+        self.db.execute("DELETE FROM dirs WHERE rank < 1")
+
+    def remove(self, path: str):
+        with self.db:
+            self.db.execute("DELETE FROM dirs WHERE path = ?", (path,))
+
+    def query(self, name: str, now: Optional[float] = None) -> List[str]:
+        """Existing directories named ``name`` (or starting with it), best first.
+
+        Exact names beat prefixes; within each group the frecency score
+        decides. Directories that no longer exist are pruned on the way.
+        """
+        name = name.lower().rstrip(os.sep)
+        now = now if now is not None else time.time()
+
+        # Both lookups are range scans on the name index
+        rows = self.db.execute(
+            "SELECT path, name, rank, last_access FROM dirs WHERE name >= ? AND name < ?",
+            (name, name + "\U0010ffff")
+        ).fetchall()
+
+        scored = []
+        for path, dir_name, rank, last_access in rows:
+            if not os.path.isdir(path):
+                self.remove(path)
+                continue
+            score = rank * recency_weight(now - last_access)
+            scored.append((dir_name != name, -score, path))
+
+        scored.sort()
+        return [path for _, _, path in scored]
+
+    def best(self, name: str) -> Optional[str]:
+        matches = self.query(name)
+        return matches[0] if matches else None
+
+    def close(self):
+        self.db.close()
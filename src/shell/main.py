@@ -9,44 +9,111 @@ command interpretation through the AI agent.
 
 import sys
 import os
-import subprocess
+import shlex
 import signal
+import time
 from typing import Optional
 
+# --profile-startup has to start timing before the remaining imports run
+if "--profile-startup" in sys.argv[1:]:
+    try:
+        from ..common.startup import begin_profile
+    except ImportError:
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+        from src.common.startup import begin_profile
+    begin_profile()
+
 # Handle both relative and absolute imports
 try:
     from ..agent.client import AgentClient
-    from ..common.config import Config
+    from ..common.config import get_config
     from ..common.logger import Logger
+    from ..common.tracing import get_tracer
+    from ..common.startup import get_profile
+    from .frecency import FrecencyDB, jump_target
+    from .backend import PersistentShell, ShellExited
 except ImportError:
     # Add parent directory to path for direct execution
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
     from src.agent.client import AgentClient
-    from src.common.config import Config
+    from src.common.config import get_config
     from src.common.logger import Logger
+    from src.common.tracing import get_tracer
+    from src.common.startup import get_profile
+    from src.shell.frecency import FrecencyDB, jump_target
+    from src.shell.backend import PersistentShell, ShellExited
 
 
 class CognosShell:
     """Main shell class that handles command interpretation and execution."""
     
     def __init__(self):
-        self.config = Config()
+        self.start_time = time.perf_counter()
+        self.profile = get_profile()
+        self._mark("modules imported")
+        self.config = get_config()
+        self._mark("config")
         self.logger = Logger()
-        self.agent = AgentClient()
+        self._mark("logger")
+        self.tracer = get_tracer()
+        self._mark("tracer")
+        # Load the model in the background so the prompt appears immediately;
+        # direct shell commands never have to wait for it
+        self.agent = AgentClient(background=True)
+        self._mark("agent client (loader started)")
+        self._frecency = None
+        self._frecency_opened = False
+        self.previous_dir = None
+        self.dir_stack = []
+        self._backend = None
+        self._backend_failed = False
+        self._agent_busy = False
         self.running = True
         
         # Set up signal handlers
         signal.signal(signal.SIGINT, self._handle_interrupt)
         signal.signal(signal.SIGTERM, self._handle_terminate)
     
+    def _mark(self, step: str):
+        """Record an init step for --profile-startup."""
+        if self.profile:
+            self.profile.mark(step)
+    
     def _handle_interrupt(self, signum, frame):
-        """Handle Ctrl+C interrupt."""
+        """Handle Ctrl+C interrupt: cancel a running AI request, otherwise remind how to quit."""
+        if self._agent_busy:
+            # Decoding stops after the current token; process_natural_language
+            # reports the cancellation when the agent returns
+            self.agent.cancel()
+            return
         print("\nUse 'exit' to quit cognos-shell")
     
     def _handle_terminate(self, signum, frame):
         """Handle termination signal."""
         self.running = False
     
+    @property
+    def frecency(self) -> Optional[FrecencyDB]:
+        """Visited-directory database, opened on first use to keep startup short."""
+        if not self._frecency_opened:
+            self._frecency_opened = True
+            self._frecency = self._create_frecency()
+        return self._frecency
+    
+    def _create_frecency(self) -> Optional[FrecencyDB]:
+        """Open the visited-directory database if it is enabled."""
+        if not self.config.get("shell.frecency.enabled", True):
+            return None
+        
+        try:
+            return FrecencyDB(
+                self.config.get("shell.frecency.path", "~/.local/share/cognos/frecency.db"),
+                max_total_rank=self.config.get("shell.frecency.max_total_rank", 10000)
+            )
+        except Exception as e:
+            self.logger.warning(f"Frecency database unavailable: {e}")
+            return None
+    
     def is_safe_command(self, command: str) -> bool:
         """Check if a command is safe to execute without confirmation."""
         safe_commands = [
@@ -95,15 +162,293 @@ class CognosShell:
         # Default to natural language for complex sentences
         return len(command.split()) > 3
     
+    def change_directory(self, target: Optional[str] = None) -> int:
+        """Change the shell's own working directory, like the cd builtin."""
+        if not target or target == "~":
+            target = os.path.expanduser("~")
+        elif target == "-":
+            if not self.previous_dir:
+                print("cd: OLDPWD not set")
+                return 1
+            target = self.previous_dir
+            print(target)
+        
+        path = os.path.abspath(os.path.expanduser(target))
+        try:
+            current = os.getcwd()
+        except OSError:
+            current = None
+        
+        try:
+            os.chdir(path)
+        except OSError as e:
+            print(f"cd: {target}: {e.strerror}")
+            return 1
+        
+        self._entered_directory(current, path)
+        return 0
+    
+    def _entered_directory(self, previous: Optional[str], path: str):
+        """Bookkeeping after the working directory changed to ``path``."""
+        self.previous_dir = previous
+        if self.frecency:
+            try:
+                self.frecency.add(path)
+            except Exception as e:
+                self.logger.warning(f"Could not record directory visit: {e}")
+    
+    def push_directory(self, target: Optional[str] = None) -> int:
+        """pushd: change to ``target`` and remember the current directory."""
+        current = os.getcwd()
+        if target is None:
+            if not self.dir_stack:
+                print("pushd: no other directory")
+                return 1
+            target = self.dir_stack.pop(0)
+        
+        result = self.change_directory(target)
+        if result == 0:
+            self.dir_stack.insert(0, current)
+            self._print_dir_stack()
+        return result
+    
+    def pop_directory(self) -> int:
+        """popd: return to the most recently pushed directory."""
+        if not self.dir_stack:
+            print("popd: directory stack empty")
+            return 1
+        
+        result = self.change_directory(self.dir_stack[0])
+        if result == 0:
+            self.dir_stack.pop(0)
+            self._print_dir_stack()
+        return result
+    
+    def _print_dir_stack(self):
+        home = os.path.expanduser("~")
+        
+        def short(path):
+            return "~" + path[len(home):] if path == home or path.startswith(home + os.sep) else path
+        
+        print(" ".join(short(path) for path in [os.getcwd()] + self.dir_stack))
+    
+    def export_variables(self, assignments: list) -> int:
+        """export: set variables in this process and in the persistent shell."""
+        for assignment in assignments:
+            name, sep, value = assignment.partition("=")
+            if not name.isidentifier():
+                print(f"export: `{assignment}': not a valid identifier")
+                return 1
+            if not sep:
+                continue
+            
+            value = os.path.expandvars(os.path.expanduser(value) if value.startswith("~") else value)
+            os.environ[name] = value
+            if self._backend:
+                self._backend.export(name, value)
+        return 0
+    
+    def _parse_builtin(self, command: str) -> Optional[list]:
+        """Words of a plain cd/pushd/popd/export command, or None for anything else."""
+        if any(operator in command for operator in (";", "&", "|", "`", "$(", "<", ">")):
+            return None
+        try:
+            parts = shlex.split(command)
+        except ValueError:
+            return None
+        if not parts or parts[0] not in ("cd", "pushd", "popd", "export"):
+            return None
+        if parts[0] in ("cd", "pushd") and len(parts) > 2:
+            return None
+        if parts[0] == "export" and (len(parts) == 1 or any(part.startswith("-") for part in parts)):
+            # `export` / `export -p` print the environment: leave that to bash
+            return None
+        return parts
+    
+    def _run_builtin(self, parts: list) -> int:
+        """Run a builtin in-process so the prompt's cwd and env stay correct."""
+        name, args = parts[0], parts[1:]
+        if name == "cd":
+            return self.change_directory(args[0] if args else None)
+        elif name == "pushd":
+            return self.push_directory(args[0] if args else None)
+        elif name == "popd":
+            return self.pop_directory()
+        return self.export_variables(args)
+    
+    @property
+    def backend(self) -> Optional[PersistentShell]:
+        """The session's bash coprocess, or None to run commands with subprocess."""
+        if self._backend is None and not self._backend_failed:
+            shell = self.config.get("shell.backend_shell", "/bin/bash")
+            if self.config.get("shell.backend", "persistent") == "persistent" and os.path.exists(shell):
+                self._backend = PersistentShell(shell)
+            else:
+                self._backend_failed = True
+        return self._backend
+    
+    def jump_to(self, target: str) -> Optional[int]:
+        """Change to the directory a "go to X" request names, if it can be resolved.
+        
+        Tries a literal path, then the frecency database, then a folder
+        search; returns None so the request can fall back to the agent.
+        """
+        with self.tracer.span("jump") as span:
+            path = None
+            source = None
+            
+            literal = os.path.expanduser(target)
+            if os.sep in target and os.path.isdir(literal):
+                path, source = literal, "path"
+            
+            if path is None and self.frecency:
+                path = self.frecency.best(target)
+                source = "frecency" if path else None
+            
+            if path is None:
+                path = self._search_directory(target)
+                source = "search" if path else None
+            
+            span.set(source=source)
+            if path is None:
+                return None
+            
+            self.logger.info(f"Resolved '{target}' to {path} ({source})")
+            print(f"→ cd {shlex.quote(path)}")
+            return self.change_directory(path)
+    
+    def _search_directory(self, target: str) -> Optional[str]:
+        """Best directory named exactly ``target`` under the home directory."""
+        try:
+            # Imported lazily: the search tool opens the directory index
+            try:
+                from ..tools.filesystem import SearchFolderTool
+            except ImportError:
+                from src.tools.filesystem import SearchFolderTool
+            
+            results = SearchFolderTool().execute(pattern=target, path="~").get("results", [])
+        except Exception as e:
+            self.logger.warning(f"Directory search failed: {e}")
+            return None
+        
+        # Only an existing directory with the exact name is a safe guess;
+        # anything vaguer goes to the agent
+        for result in results:
+            if os.path.basename(result).lower() == target.lower() and os.path.isdir(result):
+                return result
+        return None
+    
     def execute_shell_command(self, command: str) -> int:
         """Execute a direct shell command."""
+        builtin = self._parse_builtin(command)
+        if builtin is not None:
+            return self._run_builtin(builtin)
+        
         try:
-            result = subprocess.run(command, shell=True, capture_output=False)
-            return result.returncode
+            with self.tracer.span("execute") as span:
+                backend = self.backend
+                if backend is not None:
+                    exit_code = self._run_in_backend(backend, command)
+                    span.set(backend="persistent")
+                else:
+                    exit_code = self._run_subprocess(command)
+                    span.set(backend="subprocess")
+                span.set(exit_code=exit_code)
+            return exit_code
         except Exception as e:
             self.logger.error(f"Error executing command: {e}")
             return 1
     
+    def _run_cached(self, command: str) -> Optional[int]:
+        """Run a read-only agent command through the output cache.
+        
+        The agent often proposes the same ``ls``/``cat``/``grep`` again while
+        nothing changed; those are answered without a fork. Returns None for
+        commands the cache does not handle, which then run normally.
+        """
+        # Imported on first use: the cache pulls in subprocess and glob
+        try:
+            from ..tools.output_cache import command_paths, get_output_cache
+        except ImportError:
+            from src.tools.output_cache import command_paths, get_output_cache
+        cache = get_output_cache(self.config)
+        try:
+            cwd = os.getcwd()
+        except OSError:
+            return None
+        # Streaming, stdin-reading and tty-formatted commands are not cached
+        terminal = sys.stdout.isatty()
+        if cache is None or command_paths(command, cwd, terminal) is None:
+            return None
+        
+        import subprocess
+        try:
+            with self.tracer.span("execute") as span:
+                result = cache.run(command, cwd=cwd, terminal=terminal,
+                                   timeout=self.config.get("tools.run_command.timeout", 30))
+                span.set(backend="output_cache", cached=result["cached"], exit_code=result["returncode"])
+        except subprocess.TimeoutExpired:
+            print(f"Error: {command} timed out", file=sys.stderr)
+            return 124
+        except Exception as e:
+            self.logger.warning(f"Output cache unavailable, running directly: {e}")
+            return None
+        
+        sys.stdout.write(result["stdout"])
+        sys.stderr.write(result["stderr"])
+        sys.stdout.flush()
+        return result["returncode"]
+    
+    def _run_subprocess(self, command: str) -> int:
+        """One /bin/sh per command: the fallback when bash is unavailable."""
+        # Imported on first use; the persistent backend does not need it
+        import subprocess
+        return subprocess.run(command, shell=True, capture_output=False).returncode
+    
+    def _run_in_backend(self, backend: PersistentShell, command: str) -> int:
+        """Run a command in the bash coprocess and pick up its cwd/env changes."""
+        try:
+            current = os.getcwd()
+        except OSError:
+            current = None
+        
+        try:
+            if current:
+                backend.chdir(current)
+            sys.stdout.flush()
+            exit_code = backend.run(command, forward_input=sys.stdin.isatty())
+        except ShellExited as e:
+            # e.g. `exit 3`; a fresh bash is started for the next command
+            self.logger.info(f"Shell backend exited with status {e.status}")
+            return e.status
+        except OSError as e:
+            self.logger.warning(f"Shell backend unavailable, using subprocess: {e}")
+            backend.close()
+            self._backend = None
+            self._backend_failed = True
+            return self._run_subprocess(command)
+        
+        # A cd inside a compound command or a sourced script moved bash
+        if backend.cwd and backend.cwd != current and os.path.isdir(backend.cwd):
+            os.chdir(backend.cwd)
+            self._entered_directory(current, backend.cwd)
+        
+        # Sourced scripts (venv activate, ...) change the environment
+        first_word = command.split()[0] if command.split() else ""
+        if first_word in ("source", ".", "deactivate", "conda"):
+            environment = backend.environment()
+            for name in set(os.environ) - set(environment):
+                del os.environ[name]
+            os.environ.update(environment)
+        
+        return exit_code
+    
+    def _audit(self, command: str, start: float, **fields):
+        """Write an audit record for a command; queued, so it costs no I/O here."""
+        if self.config.get("shell.log_commands", True):
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.logger.command(command, latency_ms=latency_ms, **fields)
+    
     def get_confirmation_message(self, command: str) -> str:
         """Generate a context-aware confirmation message using the AI agent."""
         # For smaller models like TinyLlama, use fallback explanations directly
@@ -209,43 +554,115 @@ class CognosShell:
             
             return fallback_explanations.get(first_word, f"This will execute: {command}")
     
+    def get_status_indicator(self) -> str:
+        """Short prompt prefix describing the AI agent state."""
+        if self.agent.status == "loading":
+            return "[ai:loading] "
+        elif self.agent.status == "failed":
+            return "[ai:failed] "
+        return ""
+    
+    def show_status(self):
+        """Show the AI agent status."""
+        if self.agent.status == "ready":
+            print(f"AI agent: ready ({self.agent.mode}, loaded in {self.agent.load_time:.1f}s)")
+        elif self.agent.status == "failed":
+            print(f"AI agent: failed ({self.agent.error})")
+        else:
+            print("AI agent: loading")
+    
     def process_natural_language(self, command: str) -> int:
         """Process natural language command through AI agent."""
-        try:
-            response = self.agent.process_command(command)
-            
-            if response.get("action") == "execute":
-                shell_command = response.get("command")
-                if shell_command:
-                    # Check if it's a safe command that doesn't need confirmation
-                    if self.is_safe_command(shell_command):
-                        print(f"→ {shell_command}")
-                        return self.execute_shell_command(shell_command)
-                    else:
-                        # Use context-aware confirmation message
-                        confirmation_msg = self.get_confirmation_message(shell_command)
-                        user_input = input(confirmation_msg).lower()
-                        
-                        # Handle different confirmation responses
-                        if user_input in ['y', 'yes']:
-                            return self.execute_shell_command(shell_command)
-                        else:
-                            print("Command cancelled.")
-                            return 0
-            else:
-                print(response.get("message", "Command processed."))
-                return 0
+        start = time.perf_counter()
+        with self.tracer.span("request") as request_span:
+            try:
+                target = jump_target(command)
+                if target:
+                    result = self.jump_to(target)
+                    if result is not None:
+                        request_span.set(action="jump")
+                        jumped = f"cd {shlex.quote(os.getcwd())}" if result == 0 else f"cd {target}"
+                        self._audit(jumped, start, request=command, source="jump", exit_code=result)
+                        return result
                 
-        except Exception as e:
-            self.logger.error(f"Error processing natural language: {e}")
-            print(f"Error: {e}")
-            return 1
+                if self.agent.status == "loading":
+                    print("Waiting for the AI model to finish loading...")
+                
+                # Show the model's message as it is generated
+                streamed = []
+                
+                def show_partial(text):
+                    streamed.append(text)
+                    print(text, end="", flush=True)
+                
+                on_message = show_partial if self.config.get("shell.stream_output", True) else None
+                with self.tracer.span("agent", mode=self.agent.mode):
+                    self._agent_busy = True
+                    try:
+                        response = self.agent.process_command(command, on_message=on_message)
+                    finally:
+                        self._agent_busy = False
+                request_span.set(action=response.get("action"))
+                if streamed:
+                    print()
+                
+                if response.get("cancelled"):
+                    # Exit codes as for SIGINT and timeout(1)
+                    exit_code = 130 if response["cancelled"] == "cancelled" else 124
+                    request_span.set(cancelled=response["cancelled"])
+                    print(response.get("message", "Cancelled."))
+                    self._audit(command, start, source="agent", cancelled=response["cancelled"],
+                                exit_code=exit_code)
+                    return exit_code
+                
+                if response.get("action") == "execute":
+                    shell_command = response.get("command")
+                    if shell_command:
+                        # Check if it's a safe command that doesn't need confirmation
+                        if self.is_safe_command(shell_command):
+                            print(f"→ {shell_command}")
+                            exit_code = self._run_cached(shell_command)
+                            if exit_code is None:
+                                exit_code = self.execute_shell_command(shell_command)
+                            self._audit(shell_command, start, request=command, source="agent",
+                                        confirmed=True, exit_code=exit_code)
+                            return exit_code
+                        else:
+                            # Use context-aware confirmation message
+                            confirmation_msg = self.get_confirmation_message(shell_command)
+                            with self.tracer.span("confirm_wait") as span:
+                                user_input = input(confirmation_msg).lower()
+                                span.set(confirmed=user_input in ['y', 'yes'])
+                            
+                            # Handle different confirmation responses
+                            if user_input in ['y', 'yes']:
+                                exit_code = self.execute_shell_command(shell_command)
+                                self._audit(shell_command, start, request=command, source="agent",
+                                            confirmed=True, exit_code=exit_code)
+                                return exit_code
+                            else:
+                                print("Command cancelled.")
+                                self._audit(shell_command, start, request=command, source="agent",
+                                            confirmed=False, exit_code=None)
+                                return 0
+                else:
+                    message = response.get("message", "Command processed.")
+                    if message != "".join(streamed):
+                        print(message)
+                    return 0
+                    
+            except Exception as e:
+                self.logger.error(f"Error processing natural language: {e}")
+                print(f"Error: {e}")
+                return 1
     
     def run(self):
         """Main shell loop."""
         print("CognOS Shell - AI-Enhanced Command Line")
         print("Type 'help' for assistance or 'exit' to quit")
         
+        prompt_shown = False
+        
         while self.running:
             try:
                 # Get current directory for prompt
@@ -254,7 +671,14 @@ class CognosShell:
                 hostname = os.getenv("HOSTNAME", "cognos")
                 
                 # Display prompt
-                prompt = f"{username}@{hostname}:{cwd}$ "
+                prompt = f"{self.get_status_indicator()}{username}@{hostname}:{cwd}$ "
+                if not prompt_shown:
+                    prompt_shown = True
+                    startup_ms = (time.perf_counter() - self.start_time) * 1000
+                    self.logger.info(f"Interactive prompt ready in {startup_ms:.0f} ms")
+                    if self.profile:
+                        self._mark("first prompt")
+                        print(self.profile.report(), file=sys.stderr)
                 command = input(prompt).strip()
                 
                 if not command:
@@ -266,12 +690,17 @@ class CognosShell:
                 elif command.lower() == 'help':
                     self.show_help()
                     continue
+                elif command.lower() == 'status':
+                    self.show_status()
+                    continue
                 
                 # Determine if natural language or direct command
                 if self.is_natural_language(command):
                     self.process_natural_language(command)
                 else:
-                    self.execute_shell_command(command)
+                    start = time.perf_counter()
+                    exit_code = self.execute_shell_command(command)
+                    self._audit(command, start, source="direct", exit_code=exit_code)
                     
             except EOFError:
                 # Handle Ctrl+D
@@ -284,6 +713,8 @@ class CognosShell:
                 self.logger.error(f"Unexpected error: {e}")
                 print(f"Error: {e}")
         
+        if self._backend:
+            self._backend.close()
         print("Goodbye!")
     
     def show_help(self):
@@ -294,6 +725,7 @@ CognOS Shell Help:
 - Use direct commands: "ls -la"
 - Type 'exit' to quit
 - Type 'help' for this message
+- Type 'status' to see whether the AI model is loaded
 
 Natural language examples:
 - "show me files in the current directory"
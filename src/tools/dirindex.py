@@ -0,0 +1,243 @@
+"""
+Persistent directory index for fast folder search at any depth.
+
+Directory names are stored in SQLite together with their trigrams, so a
+substring query intersects a few small posting lists instead of walking the
+filesystem. The index is kept current by mtime scanning: a directory's mtime
+changes whenever entries are added to or removed from it, so a refresh only
+re-lists directories whose mtime moved.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Set
+
+
+DEFAULT_EXCLUDES = (".git", "node_modules", "__pycache__", ".cache", ".venv", "venv")
+
+
+def trigrams(name: str) -> Set[str]:
+    """Distinct lowercase trigrams of a name."""
+    name = name.lower()
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+class DirectoryIndex:
+    """SQLite-backed index of every directory under ``root``."""
+
+    def __init__(self, path: str, root: str, max_depth: int = 8,
+                 exclude: Iterable[str] = DEFAULT_EXCLUDES):
+        self.path = os.path.expanduser(path)
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_depth = max_depth
+        self.exclude = set(exclude)
+        self._refresh_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS dirs (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    parent TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    depth INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+                CREATE INDEX IF NOT EXISTS dirs_name ON dirs (name);
+                CREATE TABLE IF NOT EXISTS trigrams (
+                    trigram TEXT NOT NULL,
+                    dir_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS trigrams_trigram ON trigrams (trigram, dir_id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per operation keeps background refreshes
+        # and queries on different threads independent; WAL lets them overlap
+        db = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    def _get_meta(self, db: sqlite3.Connection, key: str) -> Optional[str]:
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, db: sqlite3.Connection, key: str, value: str):
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def last_refresh(self) -> Optional[float]:
+        """Time of the last completed build or refresh, if any."""
+        with self._connect() as db:
+            if self._get_meta(db, "root") != self.root:
+                return None
+            value = self._get_meta(db, "last_refresh")
+        return float(value) if value else None
+
+    def is_built(self) -> bool:
+        return self.last_refresh is not None
+
+    def covers(self, path: str) -> bool:
+        """Whether ``path`` lies inside the indexed tree."""
+        path = os.path.abspath(path)
+        return path == self.root or path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def _depth(self, path: str) -> int:
+        if path == self.root:
+            return 0
+        return os.path.relpath(path, self.root).count(os.sep) + 1
+
+    def _add(self, db: sqlite3.Connection, path: str, mtime: float):
+        name = os.path.basename(path) or path
+        cursor = db.execute(
+            "INSERT OR REPLACE INTO dirs (path, parent, name, depth, mtime) VALUES (?, ?, ?, ?, ?)",
+            (path, os.path.dirname(path), name.lower(), self._depth(path), mtime)
+        )
+        db.executemany(
+            "INSERT INTO trigrams (trigram, dir_id) VALUES (?, ?)",
+            [(trigram, cursor.lastrowid) for trigram in trigrams(name)]
+        )
+
+    def _remove_tree(self, db: sqlite3.Connection, path: str):
+        prefix = path.rstrip(os.sep) + os.sep
+        where = "path = ? OR substr(path, 1, ?) = ?"
+        params = (path, len(prefix), prefix)
+        db.execute(f"DELETE FROM trigrams WHERE dir_id IN (SELECT id FROM dirs WHERE {where})", params)
+        db.execute(f"DELETE FROM dirs WHERE {where}", params)
+
+    def _list_subdirs(self, path: str) -> List[os.DirEntry]:
+        try:
+            with os.scandir(path) as entries:
+                return [
+                    entry for entry in entries
+                    if entry.name not in self.exclude and entry.is_dir(follow_symlinks=False)
+                ]
+        except OSError:
+            return []
+
+    def _index_tree(self, db: sqlite3.Connection, start: str):
+        """Index ``start`` and everything below it, breadth first."""
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            try:
+                mtime = os.stat(current).st_mtime
+            except OSError:
+                continue
+            self._add(db, current, mtime)
+            if self._depth(current) < self.max_depth:
+                queue.extend(entry.path for entry in self._list_subdirs(current))
+
+    def build(self):
+        """(Re)build the whole index from scratch."""
+        with self._refresh_lock, self._connect() as db:
+            db.execute("DELETE FROM trigrams")
+            db.execute("DELETE FROM dirs")
+            self._index_tree(db, self.root)
+            self._set_meta(db, "root", self.root)
+            self._set_meta(db, "last_refresh", str(time.time()))
+
+    def refresh(self):
+        """Bring the index up to date by re-listing directories whose mtime changed."""
+        if not self.is_built():
+            self.build()
+            return
+
+        with self._refresh_lock, self._connect() as db:
+            indexed = db.execute("SELECT path, mtime, depth FROM dirs ORDER BY depth").fetchall()
+            for path, mtime, depth in indexed:
+                try:
+                    current_mtime = os.stat(path).st_mtime
+                except OSError:
+                    self._remove_tree(db, path)
+                    continue
+
+                if current_mtime == mtime:
+                    continue
+
+                db.execute("UPDATE dirs SET mtime = ? WHERE path = ?", (current_mtime, path))
+                if depth >= self.max_depth:
+                    continue
+
+                known = {row[0] for row in db.execute("SELECT path FROM dirs WHERE parent = ?", (path,))}
+                present = {entry.path for entry in self._list_subdirs(path)}
+                for removed in known - present:
+                    self._remove_tree(db, removed)
+                for added in present - known:
+                    self._index_tree(db, added)
+
+            self._set_meta(db, "last_refresh", str(time.time()))
+
+    def refresh_in_background(self, max_age: float) -> bool:
+        """Start a background refresh if the index is older than ``max_age`` seconds."""
+        last_refresh = self.last_refresh
+        if last_refresh is not None and time.time() - last_refresh < max_age:
+            return False
+        if self._refresh_lock.locked():
+            return False
+
+        threading.Thread(target=self._safe_refresh, name="cognos-dirindex", daemon=True).start()
+        return True
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except (OSError, sqlite3.Error):
+            # A failed refresh leaves the previous index in place
+            pass
+
+    def search(self, pattern: str, under: Optional[str] = None, limit: int = 10) -> List[str]:
+        """Directories whose name contains ``pattern``, best matches first.
+
+        Exact names rank above prefixes, prefixes above other substrings,
+        and shallower paths above deeper ones. Directories removed since the
+        last refresh are dropped from the index rather than returned.
+        """
+        pattern = pattern.lower()
+        clauses = ["instr(name, ?) > 0"]
+        params: list = [pattern]
+
+        grams = sorted(trigrams(pattern))
+        if grams:
+            clauses.append(
+                "id IN (SELECT dir_id FROM trigrams WHERE trigram IN ({}) "
+                "GROUP BY dir_id HAVING COUNT(DISTINCT trigram) = ?)".format(",".join("?" * len(grams)))
+            )
+            params.extend(grams)
+            params.append(len(grams))
+
+        if under:
+            prefix = os.path.abspath(under).rstrip(os.sep) + os.sep
+            clauses.append("substr(path, 1, ?) = ?")
+            params.extend([len(prefix), prefix])
+
+        query = (
+            "SELECT path FROM dirs WHERE {} "
+            "ORDER BY name = ? DESC, substr(name, 1, ?) = ? DESC, depth, path LIMIT ?"
+        ).format(" AND ".join(clauses))
+        params.extend([pattern, len(pattern), pattern, limit])
+
+        with self._connect() as db:
+            while True:
+                paths = [row[0] for row in db.execute(query, params)]
+                stale = [path for path in paths if not os.path.isdir(path)]
+                if not stale:
+                    return paths
+                # Deleting them lets the next query fill their places
+                for path in stale:
+                    self._remove_tree(db, path)
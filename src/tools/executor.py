@@ -0,0 +1,114 @@
+"""
+Concurrent tool call execution for CognOS agent.
+
+The tool calls in one agent response do not depend on each other, so they run
+side by side on a bounded thread pool. Each call gets the timeout configured
+for its tool (``tools.<name>.timeout``); results come back in request order,
+and a call that times out is reported as such while the others still return.
+"""
+
+import os
+import sys
+import time
+from concurrent import futures as cf
+from typing import Dict, Any, List, Optional, Tuple
+
+# Handle both relative and absolute imports
+try:
+    from ..common.config import get_config
+except ImportError:
+    # Add parent directory to path for direct execution
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from src.common.config import get_config
+
+
+class ToolExecutor:
+    """Runs a response's tool calls on a shared, bounded thread pool."""
+
+    def __init__(self, tool_registry, max_workers: Optional[int] = None, tracer=None):
+        self.tool_registry = tool_registry
+        self.config = get_config()
+        self.tracer = tracer
+        self.max_workers = max_workers or self.config.get("tools.executor.max_workers", 4)
+        self._pool = None
+
+    @property
+    def pool(self) -> cf.ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = cf.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="cognos-tool"
+            )
+        return self._pool
+
+    def timeout_for(self, tool_name: str) -> float:
+        """Seconds a call to ``tool_name`` may take."""
+        return self.config.get(
+            f"tools.{tool_name}.timeout",
+            self.config.get("tools.executor.default_timeout", 10)
+        )
+
+    def _call(self, tool_name: str, tool_args: Dict[str, Any], parent) -> Tuple[Dict[str, Any], float]:
+        start = time.perf_counter()
+        if self.tracer is None:
+            result = self.tool_registry.call_tool(tool_name, **tool_args)
+        else:
+            # Runs on a pool thread, so the caller's span is passed in explicitly
+            with self.tracer.span(f"tool:{tool_name}", parent=parent):
+                result = self.tool_registry.call_tool(tool_name, **tool_args)
+        return result, round((time.perf_counter() - start) * 1000, 3)
+
+    def run(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute ``tool_calls`` concurrently; one outcome per call, in order.
+
+        Each outcome has ``tool``, ``status`` ("ok", "error", "timeout" or
+        "unknown_tool"), ``duration_ms`` and either ``result`` or ``error``;
+        for failed calls ``duration_ms`` is the time waited.
+        A timed-out call keeps its pool thread until it finishes, since
+        Python threads cannot be interrupted.
+        """
+        parent = self.tracer.current() if self.tracer else None
+        start = time.perf_counter()
+        pending = []
+
+        for tool_call in tool_calls:
+            tool_name = tool_call.get("tool")
+            tool_args = tool_call.get("args") or {}
+            if tool_name not in self.tool_registry.tools:
+                pending.append((tool_name, None, 0.0))
+                continue
+
+            future = self.pool.submit(self._call, tool_name, tool_args, parent)
+            pending.append((tool_name, future, self.timeout_for(tool_name)))
+
+        outcomes = []
+        for tool_name, future, timeout in pending:
+            if future is None:
+                outcomes.append({
+                    "tool": tool_name,
+                    "status": "unknown_tool",
+                    "error": f"Unknown tool: {tool_name}",
+                    "duration_ms": 0.0
+                })
+                continue
+
+            # Timeouts count from submission, so waiting on an earlier call
+            # does not extend a later one's budget
+            remaining = max(0.0, start + timeout - time.perf_counter())
+            try:
+                result, duration_ms = future.result(timeout=remaining)
+                outcome = {"tool": tool_name, "status": "ok", "result": result, "duration_ms": duration_ms}
+            except cf.TimeoutError:
+                future.cancel()
+                outcome = {"tool": tool_name, "status": "timeout",
+                           "error": f"{tool_name} timed out after {timeout:g}s"}
+            except Exception as e:
+                outcome = {"tool": tool_name, "status": "error", "error": str(e)}
+            outcome.setdefault("duration_ms", round((time.perf_counter() - start) * 1000, 3))
+            outcomes.append(outcome)
+
+        return outcomes
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
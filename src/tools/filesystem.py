@@ -3,8 +3,21 @@ Filesystem tools for CognOS agent.
 """
 
 import os
-import glob
-from typing import Dict, Any, List
+import inspect
+from typing import Dict, Any, List, Optional
+
+# Handle both relative and absolute imports
+try:
+    from .dirindex import DirectoryIndex, DEFAULT_EXCLUDES
+    from .walker import DirectoryWalker, DEFAULT_EXCLUDES as WALK_EXCLUDES
+    from ..common.config import get_config
+except ImportError:
+    # Add parent directory to path for direct execution
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from src.tools.dirindex import DirectoryIndex, DEFAULT_EXCLUDES
+    from src.tools.walker import DirectoryWalker, DEFAULT_EXCLUDES as WALK_EXCLUDES
+    from src.common.config import get_config
 
 
 class BaseTool:
@@ -16,6 +29,19 @@ class BaseTool:
     def execute(self, **kwargs) -> Dict[str, Any]:
         """Execute the tool with given arguments."""
         raise NotImplementedError
+    
+    def parameters(self) -> List[Dict[str, Any]]:
+        """Describe the named arguments accepted by execute(), in order."""
+        params = []
+        for param in inspect.signature(self.execute).parameters.values():
+            if param.kind in (param.VAR_KEYWORD, param.VAR_POSITIONAL):
+                continue
+            params.append({
+                "name": param.name,
+                "type": param.annotation if param.annotation is not param.empty else str,
+                "required": param.default is param.empty
+            })
+        return params
 
 
 class SearchFolderTool(BaseTool):
@@ -24,32 +50,62 @@ class SearchFolderTool(BaseTool):
     def __init__(self):
         super().__init__()
         self.description = "Search for directories matching a pattern"
+        self.config = get_config()
+        self.index = self._create_index()
+        self.walker = DirectoryWalker(
+            max_depth=self.config.get("tools.search_folder.walker.max_depth", 6),
+            exclude=self.config.get("tools.search_folder.walker.exclude", list(WALK_EXCLUDES)),
+            time_budget=self.config.get("tools.search_folder.walker.time_budget_ms", 2000) / 1000,
+            workers=self.config.get("tools.search_folder.walker.workers", 4)
+        )
+    
+    def _create_index(self) -> Optional[DirectoryIndex]:
+        """Open the persistent directory index if it is enabled."""
+        if not self.config.get("tools.search_folder.index.enabled", True):
+            return None
+        
+        try:
+            return DirectoryIndex(
+                self.config.get("tools.search_folder.index.path", "~/.cache/cognos/dirindex.db"),
+                self.config.get("tools.search_folder.index.root", "~"),
+                max_depth=self.config.get("tools.search_folder.index.max_depth", 8),
+                exclude=self.config.get("tools.search_folder.index.exclude", list(DEFAULT_EXCLUDES))
+            )
+        except Exception:
+            # The index is an optimization; the walker still works without it
+            return None
+    
+    def _search_index(self, pattern: str, path: str, max_results: int) -> Optional[List[str]]:
+        """Query the index, or return None if it cannot answer for ``path``."""
+        if not self.index or not self.index.covers(path):
+            return None
+        
+        try:
+            # Builds the index on first use and keeps it fresh, off the request path
+            self.index.refresh_in_background(
+                self.config.get("tools.search_folder.index.refresh_interval", 300)
+            )
+            if not self.index.is_built():
+                return None
+            return self.index.search(pattern, under=path, limit=max_results)
+        except Exception:
+            return None
     
     def execute(self, pattern: str = "", path: str = ".", **kwargs) -> Dict[str, Any]:
         """Search for directories matching the pattern."""
         try:
-            # Search for directories
-            search_pattern = os.path.join(path, f"*{pattern}*")
-            matches = []
-            
-            for item in glob.glob(search_pattern):
-                if os.path.isdir(item):
-                    matches.append(os.path.abspath(item))
-            
-            # Also search subdirectories one level deep
-            deep_pattern = os.path.join(path, "*", f"*{pattern}*")
-            for item in glob.glob(deep_pattern):
-                if os.path.isdir(item):
-                    matches.append(os.path.abspath(item))
+            max_results = self.config.get("tools.search_folder.max_results", 10)
+            search_path = os.path.abspath(os.path.expanduser(path))
             
-            # Remove duplicates and sort
-            matches = sorted(list(set(matches)))
+            matches = self._search_index(pattern, search_path, max_results)
+            if matches is None:
+                matches = self.walker.search(search_path, pattern, max_results)
             
             if matches:
                 return {
                     "action": "info",
                     "message": f"Found {len(matches)} directories matching '{pattern}'",
-                    "results": matches[:10],  # Limit to first 10
+                    "results": matches[:max_results],
                     "command": None
                 }
             else:
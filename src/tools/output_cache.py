@@ -0,0 +1,314 @@
+"""
+Output cache for read-only commands run on the agent's behalf.
+
+The agent tends to issue the same `ls`, `cat` or `grep` several times while it
+gathers context. Results of successful read-only commands are kept in memory,
+keyed on the command line and working directory, and stored with a signature
+made of the mtime and size of every path the command names (plus the working
+directory). A lookup re-stats those paths and drops the entry when anything
+changed, so a hit costs a few stat calls instead of a fork+exec.
+
+Recursive commands (`find`, `grep -r`, `du`) can read below the paths they
+name, where a change does not touch the signature; ``ttl_seconds`` bounds how
+stale such an entry can get. `df` and `free` report system state rather than
+files and rely on the TTL alone.
+
+Results are captured, so commands whose output depends on running live are
+never cached: `tail -f` streams, `cat`/`grep`/`head`/`tail`/`wc` without a
+file read stdin, and plain `ls` lays out columns only on a terminal. Long listings (`ls -l`)
+show per-file sizes and times, so their signature covers every entry.
+"""
+
+import glob
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+# Handle both relative and absolute imports
+try:
+    from ..common.config import get_config
+except ImportError:
+    # Add parent directory to path for direct execution
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from src.common.config import get_config
+
+
+# Read-only commands from the shell's safe list whose output depends only on
+# the files they name (and, for the second set, on nothing but time)
+PATH_COMMANDS = {"ls", "cat", "head", "tail", "grep", "find", "wc", "stat", "file", "du", "tree"}
+VOLATILE_COMMANDS = {"df", "free"}
+
+# Commands that read stdin when no file is named
+STDIN_COMMANDS = {"cat", "head", "tail", "grep", "wc"}
+
+# Short options whose value is the next argument, e.g. `head -n 5`
+_OPTION_VALUES = {
+    "head": {"-n", "-c"},
+    "tail": {"-n", "-c", "-s"},
+    "grep": {"-e", "-f", "-m", "-A", "-B", "-C", "-d", "-D"},
+    "du": {"-d"},
+    "tree": {"-L", "-P", "-I"}
+}
+
+# `ls` flags that print per-entry sizes or times, so the listing changes when
+# a file inside the directory does
+_LS_DETAIL_FLAGS = {"l", "n", "g", "o", "s"}
+# Long listings of bigger directories are not worth a stat per entry
+MAX_LISTING_ENTRIES = 1000
+
+# Anything that makes the command line more than one plain program invocation
+_SHELL_SYNTAX = set(";&|<>$`(){}\n\\")
+
+
+def _short_flags(options: List[str]) -> set:
+    """Letters of the single-dash option clusters, e.g. {"l", "a"} for `-la`."""
+    return {flag for option in options if not option.startswith("--") for flag in option[1:]}
+
+
+def _split_args(program: str, args: List[str]) -> Tuple[List[str], List[str]]:
+    """Split ``args`` into options (without their values) and operands
+    (files, or grep's pattern)."""
+    if program == "find":
+        # Start points come first; the rest is the expression
+        operands = []
+        for arg in args:
+            if arg.startswith(("-", "(", "!")):
+                break
+            operands.append(arg)
+        return [], operands
+
+    options, operands = [], []
+    takes_value = _OPTION_VALUES.get(program, set())
+    args = iter(args)
+    for arg in args:
+        if arg == "--":
+            operands.extend(args)
+        elif arg.startswith("-") and arg != "-":
+            options.append(arg)
+            if arg in takes_value:
+                next(args, None)
+        else:
+            operands.append(arg)
+    return options, operands
+
+
+def command_paths(command: str, cwd: str, terminal: bool = False) -> Optional[List[str]]:
+    """Absolute paths a cacheable ``command`` reads, or None if it is not cacheable.
+
+    Commands that follow a file (`tail -f`) or read stdin (`cat` with no
+    file) are not cacheable. With ``terminal``, neither is an `ls` whose
+    layout depends on stdout being a tty (the column format).
+    """
+    if any(char in _SHELL_SYNTAX for char in command):
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    if not args or args[0] not in PATH_COMMANDS | VOLATILE_COMMANDS:
+        return None
+
+    paths = [cwd]
+    program = args[0]
+    if program in VOLATILE_COMMANDS:
+        return paths
+
+    options, operands = _split_args(program, args[1:])
+    flags = _short_flags(options)
+    if program == "grep" and not flags & {"e", "f"} and not any(
+            option.startswith(("--regexp", "--file")) for option in options):
+        operands = operands[1:]
+    if program == "tail" and (flags & {"f", "F"} or any(option.startswith("--follow") for option in options)):
+        return None
+    if program in STDIN_COMMANDS and "-" in operands:
+        return None
+    if program in STDIN_COMMANDS and not operands:
+        # grep -r without a file searches the working directory
+        if not (program == "grep" and flags & {"r", "R"}):
+            return None
+    if program == "ls" and terminal and not flags & {"1", "l", "n", "g", "o"} and not any(
+            option.startswith("--format=") for option in options):
+        return None
+
+    for arg in operands:
+        path = os.path.join(cwd, os.path.expanduser(arg))
+        if glob.has_magic(arg):
+            # The directory being globbed changes when a match appears
+            paths.append(os.path.dirname(path) or cwd)
+            paths.extend(glob.glob(path))
+        else:
+            paths.append(path)
+
+    if program == "ls" and (flags & _LS_DETAIL_FLAGS or "--format=long" in options
+                            or "--format=verbose" in options):
+        # A directory's mtime does not change when a file in it is edited
+        entries = _listing_entries(paths[1:] if operands else [cwd])
+        if entries is None:
+            return None
+        paths.extend(entries)
+    return paths
+
+
+def _listing_entries(paths: List[str]) -> Optional[List[str]]:
+    """Entries of the directories among ``paths``, or None if there are too many."""
+    entries = []
+    for path in paths:
+        try:
+            with os.scandir(path) as it:
+                entries.extend(entry.path for entry in it)
+        except OSError:
+            # Not a directory (listed itself) or unreadable (ls fails)
+            continue
+        if len(entries) > MAX_LISTING_ENTRIES:
+            return None
+    return entries
+
+
+def path_signature(paths: List[str]) -> Tuple:
+    """(mtime, size) of each path; a missing path counts via its parent."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            # Creating the file later changes the parent's mtime
+            try:
+                signature.append(("missing", os.stat(os.path.dirname(path) or ".").st_mtime_ns))
+            except OSError:
+                signature.append(("missing", None))
+    return tuple(signature)
+
+
+class OutputCache:
+    """Byte-bounded LRU of read-only command results with mtime invalidation."""
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, ttl_seconds: float = 30.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, command: str, cwd: str) -> Optional[Dict[str, Any]]:
+        """Cached result for ``command`` in ``cwd`` if nothing it reads has changed."""
+        key = (command, cwd)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        fresh = (time.monotonic() - entry["stored"] < self.ttl_seconds
+                 and path_signature(entry["paths"]) == entry["signature"])
+        with self._lock:
+            if not fresh:
+                self._drop(key)
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry["result"]
+
+    def put(self, command: str, cwd: str, result: Dict[str, Any], paths: List[str], signature: Tuple):
+        """Store ``result``; ``signature`` must be taken before the command ran."""
+        size = len(command) + len(result.get("stdout", "")) + len(result.get("stderr", ""))
+        if size > self.max_bytes:
+            return
+
+        key = (command, cwd)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "result": result,
+                "paths": paths,
+                "signature": signature,
+                "stored": time.monotonic(),
+                "size": size
+            }
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+
+    def run(self, command: str, cwd: Optional[str] = None, timeout: float = 30,
+            terminal: bool = False) -> Dict[str, Any]:
+        """Run ``command`` (shell syntax) unless a still-valid result is cached.
+
+        Returns ``returncode``, ``stdout``, ``stderr`` and ``cached``. Only
+        successful runs of cacheable commands are stored. Output is always
+        captured and stdin is closed; ``terminal`` is passed to command_paths()
+        when the output is shown on a tty.
+        """
+        cwd = os.path.abspath(cwd or os.getcwd())
+        paths = command_paths(command, cwd, terminal)
+        if paths is not None:
+            cached = self.get(command, cwd)
+            if cached is not None:
+                return dict(cached, cached=True)
+            # Taken before running, so a change during the run invalidates the entry
+            signature = path_signature(paths)
+
+        completed = subprocess.run(
+            command, shell=True, cwd=cwd, stdin=subprocess.DEVNULL, capture_output=True,
+            text=True, timeout=timeout
+        )
+        result = {
+            "returncode": completed.returncode,
+            "stdout": completed.stdout,
+            "stderr": completed.stderr
+        }
+        if paths is not None and completed.returncode == 0:
+            self.put(command, cwd, result, paths, signature)
+        return dict(result, cached=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+_cache: Optional[OutputCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_output_cache(config=None) -> Optional[OutputCache]:
+    """The process-wide output cache, or None when ``tools.output_cache`` is disabled."""
+    global _cache
+    config = config or get_config()
+    if not config.get("tools.output_cache.enabled", True):
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OutputCache(
+                    max_bytes=config.get("tools.output_cache.max_bytes", 4 * 1024 * 1024),
+                    ttl_seconds=config.get("tools.output_cache.ttl_seconds", 30)
+                )
+    return _cache
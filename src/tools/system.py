@@ -2,11 +2,19 @@
 System tools for CognOS agent.
 """
 
+import os
 import subprocess
 import shlex
+import sys
 from typing import Dict, Any
 
-from .filesystem import BaseTool
+# Handle both relative and absolute imports
+try:
+    from .filesystem import BaseTool
+except ImportError:
+    # Add parent directory to path for direct execution
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from src.tools.filesystem import BaseTool
 
 
 class RunCommandTool(BaseTool):
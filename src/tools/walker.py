@@ -0,0 +1,119 @@
+"""
+Parallel directory walker for folder searches that the index cannot answer.
+
+Directories are listed with os.scandir on a thread pool, one depth level at a
+time, and matches are streamed as soon as their parent has been listed. A
+search stops when its time budget runs out or once it has enough results.
+"""
+
+import os
+import time
+from concurrent import futures as cf
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+
+DEFAULT_EXCLUDES = (".git", "node_modules", "__pycache__", "/proc", "/sys", "/dev")
+
+# Mounts that are slow or unbounded to walk
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smbfs", "smb3", "afs", "9p", "fuse.sshfs", "fuse.rclone"}
+
+
+def network_mounts(mounts_file: str = "/proc/mounts") -> Set[str]:
+    """Mount points of network filesystems listed in ``mounts_file``."""
+    mounts = set()
+    try:
+        with open(mounts_file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[2] in NETWORK_FILESYSTEMS:
+                    # /proc/mounts escapes spaces in paths as \040
+                    mounts.add(fields[1].replace("\\040", " "))
+    except OSError:
+        pass
+    return mounts
+
+
+def match_rank(name: str, pattern: str, depth: int) -> Tuple[int, int, str]:
+    """Sort key: exact name, then prefix, then substring; shallower first."""
+    name = name.lower()
+    if name == pattern:
+        kind = 0
+    elif name.startswith(pattern):
+        kind = 1
+    else:
+        kind = 2
+    return kind, depth, name
+
+
+class DirectoryWalker:
+    """Breadth-first, thread-pooled directory search."""
+
+    def __init__(self, max_depth: int = 6, exclude: Iterable[str] = DEFAULT_EXCLUDES,
+                 time_budget: float = 2.0, workers: int = 4):
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.workers = max(1, workers)
+
+        exclude = set(exclude)
+        self.exclude_names = {item for item in exclude if not item.startswith(os.sep)}
+        self.exclude_paths = {item for item in exclude if item.startswith(os.sep)} | network_mounts()
+
+    def _scan(self, path: str) -> List[str]:
+        """Subdirectories of ``path`` that are not excluded."""
+        try:
+            with os.scandir(path) as entries:
+                return [
+                    entry.path for entry in entries
+                    if entry.name not in self.exclude_names
+                    and entry.path not in self.exclude_paths
+                    and entry.is_dir(follow_symlinks=False)
+                ]
+        except OSError:
+            return []
+
+    def iter_matches(self, root: str, pattern: str, max_results: Optional[int] = None,
+                     deadline: Optional[float] = None) -> Iterator[Tuple[str, int]]:
+        """Yield ``(path, depth)`` for directories whose name contains ``pattern``.
+
+        Matches come out level by level; within a level, in listing order.
+        With ``max_results``, the walk ends with the depth level in which that
+        many matches were reached, so every match at that depth can be ranked.
+        Closing the generator cancels any listings still queued.
+        """
+        pattern = pattern.lower()
+        if deadline is None:
+            deadline = time.monotonic() + self.time_budget
+
+        pool = cf.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cognos-walk")
+        futures = []
+        found = 0
+        try:
+            level = [os.path.abspath(root)]
+            depth = 0
+            while level and depth < self.max_depth:
+                if max_results is not None and found >= max_results:
+                    return
+                depth += 1
+                futures = [pool.submit(self._scan, path) for path in level]
+                level = []
+                for future in cf.as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                    for path in future.result():
+                        level.append(path)
+                        if pattern in os.path.basename(path).lower():
+                            found += 1
+                            yield path, depth
+                    if time.monotonic() >= deadline:
+                        return
+        except cf.TimeoutError:
+            return
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def search(self, root: str, pattern: str, max_results: int = 10) -> List[str]:
+        """Best ``max_results`` matches under ``root``, ranked by match_rank()."""
+        pattern = pattern.lower()
+        matches = list(self.iter_matches(root, pattern, max_results=max_results))
+        matches.sort(key=lambda match: match_rank(os.path.basename(match[0]), pattern, match[1]))
+        return [path for path, _ in matches[:max_results]]
@@ -64,6 +64,1057 @@ def test_tools():
         print(f"✗ Tool testing failed: {e}")
         return False
 
+def test_tool_grammar():
+    """Test the GBNF tool-call grammar against sample responses."""
+    print("\nTesting tool-call grammar...")
+    
+    try:
+        import json
+        import re
+        from typing import List
+        from src.agent.grammar import build_tool_call_grammar, ACTIONS
+        from src.tools.filesystem import BaseTool
+        from src.tools.registry import ToolRegistry
+        
+        class TagTool(BaseTool):
+            def execute(self, path: str, tags: List[str], depth: int = 1, force: bool = False, **kwargs):
+                return {}
+        
+        assert TagTool().parameters() == [
+            {"name": "path", "type": str, "required": True},
+            {"name": "tags", "type": List[str], "required": True},
+            {"name": "depth", "type": int, "required": False},
+            {"name": "force", "type": bool, "required": False}
+        ]
+        
+        registry = ToolRegistry()
+        registry.tools["tag"] = TagTool()
+        grammar = build_tool_call_grammar(registry)
+        rules = dict(line.split(" ::= ", 1) for line in grammar.splitlines())
+        
+        # One alternative, and one rule, per registered tool
+        calls = rules["call"].split(" | ")
+        assert calls == ["call-" + name.replace("_", "-") for name in registry.tools]
+        assert all(call in rules for call in calls)
+        assert rules["action"] == " | ".join('"\\"%s\\""' % action for action in ACTIONS)
+        
+        # The grammar only uses literals, classes, groups and ?/*, so it
+        # translates directly into a regular expression
+        def to_regex(name):
+            parts = []
+            for token in re.findall(r'"(?:\\.|[^"\\])*"|\[(?:\\.|[^\]\\])*\]|[a-z][a-z0-9-]*|[()|*?]', rules[name]):
+                if token.startswith('"'):
+                    parts.append(re.escape(json.loads(token)))
+                elif token.startswith("["):
+                    parts.append(token)
+                elif token == "(":
+                    parts.append("(?:")
+                elif token in ")|*?":
+                    parts.append(token)
+                else:
+                    parts.append(to_regex(token))
+            return "(?:" + "".join(parts) + ")"
+        
+        root = re.compile(to_regex("root"))
+        
+        def accepts(calls, action="execute", message="ok"):
+            response = {"action": action, "command": None, "message": message, "tool_calls": calls}
+            return root.fullmatch(json.dumps(response)) is not None
+        
+        assert accepts([])
+        assert accepts([{"tool": "create_env", "args": {"name": "web"}}])
+        assert accepts([{"tool": "create_env", "args": {"name": "web", "python_version": "3.11"}}])
+        assert accepts([{"tool": "tag", "args": {"path": "a", "tags": ["x", "y"], "force": True}},
+                        {"tool": "run_command", "args": {"command": "ls"}}])
+        assert accepts([{"tool": "tag", "args": {"path": "a", "tags": [], "depth": 2}}])
+        # Required arguments, argument types, tool names and actions are enforced
+        assert not accepts([{"tool": "create_env", "args": {"python_version": "3.11"}}])
+        assert not accepts([{"tool": "tag", "args": {"path": "a", "depth": 2}}])
+        assert not accepts([{"tool": "tag", "args": {"path": "a", "tags": "x"}}])
+        assert not accepts([{"tool": "create_env", "args": {"name": "web", "force": True}}])
+        assert not accepts([{"tool": "rm_everything", "args": {}}])
+        assert not accepts([], action="run")
+        
+        # Strings allow JSON escapes but not raw quotes or control characters
+        for message in ['say "hi"', "C:\\temp\\", "line\nbreak\ttab", "\u0001", "caf\u00e9"]:
+            assert accepts([], message=message)
+            assert root.fullmatch(json.dumps({"action": "info", "command": None, "message": message,
+                                              "tool_calls": []}, ensure_ascii=False))
+        string = re.compile(to_regex("string"))
+        assert not string.fullmatch('"say "hi""')
+        assert not string.fullmatch('"line\nbreak"')
+        assert not string.fullmatch('"bad \\q escape"')
+        
+        print("✓ Tool-call grammar works")
+        return True
+    except Exception as e:
+        print(f"✗ Tool-call grammar testing failed: {e}")
+        return False
+
+def test_config_reload():
+    """Test cached lookups, hot reload and atomic writes."""
+    print("\nTesting config reload...")
+    
+    try:
+        import json
+        import tempfile
+        from src.common.config import Config, get_config
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "config.json")
+            config = get_config(path)
+            assert get_config(path) is config
+            assert config.get("agent.temperature") == 0.7
+            assert config.get("agent.no_such_key", "fallback") == "fallback"
+            
+            with open(path, "w") as f:
+                json.dump({"agent": {"temperature": 0.2}}, f)
+            config._next_check = 0
+            assert config.get("agent.temperature") == 0.2
+            assert config.get("agent.max_tokens") == 512
+            
+            config.set("agent.max_tokens", 64)
+            assert os.listdir(tmp_dir) == ["config.json"]
+            assert Config(path).get("agent.max_tokens") == 64
+        
+        print("✓ Config reload works")
+        return True
+    except Exception as e:
+        print(f"✗ Config reload testing failed: {e}")
+        return False
+
+def test_async_logging():
+    """Test JSONL audit records and drop-debug-first overflow."""
+    print("\nTesting async logging...")
+    
+    try:
+        import json
+        import logging
+        import tempfile
+        from src.common.logger import AsyncJsonlHandler
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cognos.jsonl")
+            handler = AsyncJsonlHandler(path, queue_size=3, flush_interval=0.05)
+            logger = logging.getLogger("cognos.test_async")
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = False
+            logger.addHandler(handler)
+            
+            # Hold the writer off so the queue overflows
+            with handler._ready:
+                logger.debug("d1")
+                logger.info("i1")
+                logger.debug("d2")
+                logger.warning("w1")
+                logger.debug("d3")
+                logger.info("audit", extra={"audit": {"command": "ls", "exit_code": 0}})
+            
+            handler.flush()
+            logger.removeHandler(handler)
+            handler.close()
+            
+            with open(path) as f:
+                entries = [json.loads(line) for line in f]
+            assert [entry["message"] for entry in entries[:3]] == ["i1", "w1", "audit"]
+            assert entries[2]["exit_code"] == 0
+            assert entries[3]["dropped"] == {"DEBUG": 3}
+        
+        print("✓ Async logging works")
+        return True
+    except Exception as e:
+        print(f"✗ Async logging testing failed: {e}")
+        return False
+
+def test_tool_executor():
+    """Test concurrent tool calls, ordering, errors and timeouts."""
+    print("\nTesting tool executor...")
+    
+    try:
+        import time
+        from src.tools.executor import ToolExecutor
+        
+        class SleepTool:
+            def __init__(self, delay, message):
+                self.delay = delay
+                self.message = message
+            
+            def execute(self, **kwargs):
+                time.sleep(self.delay)
+                if self.message == "boom":
+                    raise RuntimeError("boom")
+                return {"message": self.message, "command": None}
+        
+        class Registry:
+            tools = {"slow": SleepTool(0.5, "slow"), "fast": SleepTool(0.05, "fast"),
+                     "broken": SleepTool(0, "boom")}
+            
+            def call_tool(self, name, **kwargs):
+                return self.tools[name].execute(**kwargs)
+        
+        executor = ToolExecutor(Registry(), max_workers=4)
+        executor.timeout_for = lambda name: 0.2
+        
+        start = time.perf_counter()
+        outcomes = executor.run([{"tool": "slow"}, {"tool": "fast"}, {"tool": "broken"}, {"tool": "missing"}])
+        elapsed = time.perf_counter() - start
+        
+        assert [outcome["tool"] for outcome in outcomes] == ["slow", "fast", "broken", "missing"]
+        assert [outcome["status"] for outcome in outcomes] == ["timeout", "ok", "error", "unknown_tool"]
+        assert outcomes[1]["result"]["message"] == "fast"
+        assert elapsed < 0.45
+        
+        # The agent reports a timed-out tool as missing, not as partial output
+        from types import SimpleNamespace
+        from src.agent.main import CognosAgent
+        from src.common.logger import Logger
+        agent = SimpleNamespace(tool_executor=executor, logger=Logger())
+        response = CognosAgent._process_tool_calls(agent, {"tool_calls": [{"tool": "slow"}, {"tool": "fast"}]})
+        assert response["message"] == "slow timed out after 0.2s; no result\nfast"
+        executor.shutdown()
+        
+        print("✓ Tool executor works")
+        return True
+    except Exception as e:
+        print(f"✗ Tool executor testing failed: {e}")
+        return False
+
+def test_tracing():
+    """Test span nesting, the disabled no-op path and trace percentiles."""
+    print("\nTesting tracing...")
+    
+    try:
+        import contextlib
+        import io
+        import json
+        import tempfile
+        import time
+        from src.common import tracing
+        from src.common.tracing import NOOP_SPAN, Tracer, summarize_traces
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "traces", "traces.jsonl")
+            tracer = Tracer(path, enabled=True)
+            with tracer.span("request", command="ls") as request:
+                with tracer.span("inference") as inference:
+                    inference.set(tokens=12)
+                try:
+                    with tracer.span("parse"):
+                        raise ValueError("bad json")
+                except ValueError:
+                    pass
+            tracer.span("other").__enter__().__exit__(None, None, None)
+            
+            with open(path) as f:
+                spans = {entry["name"]: entry for entry in map(json.loads, f)}
+            assert spans["request"]["parent_id"] is None and spans["request"]["command"] == "ls"
+            assert spans["inference"]["parent_id"] == request.span_id and spans["inference"]["tokens"] == 12
+            assert spans["parse"]["parent_id"] == request.span_id and spans["parse"]["error"] == "ValueError"
+            assert {spans[name]["trace_id"] for name in ("request", "inference", "parse")} == {request.trace_id}
+            assert spans["other"]["trace_id"] != request.trace_id
+            assert spans["request"]["duration_ms"] >= spans["inference"]["duration_ms"]
+            
+            # Disabled: the shared no-op span, nothing written, negligible cost
+            disabled = Tracer(os.path.join(tmp_dir, "off.jsonl"), enabled=False)
+            assert disabled.span("request") is NOOP_SPAN
+            start = time.perf_counter()
+            for _ in range(10000):
+                with disabled.span("request") as span:
+                    span.set(tokens=1)
+            assert time.perf_counter() - start < 0.1
+            assert not os.path.exists(os.path.join(tmp_dir, "off.jsonl"))
+            
+            # Durations 1..100 ms: nearest-rank percentiles
+            lines = [json.dumps({"name": "inference", "duration_ms": float(ms)}) for ms in range(100, 0, -1)]
+            summary = summarize_traces(lines + ["not json"])["inference"]
+            assert summary["count"] == 100
+            assert (summary["p50_ms"], summary["p90_ms"], summary["p99_ms"], summary["max_ms"]) == (51.0, 90.0, 99.0, 100.0)
+            
+            # cognos-trace prints one row per stage
+            output = io.StringIO()
+            argv = sys.argv
+            sys.argv = ["cognos-trace", path]
+            try:
+                with contextlib.redirect_stdout(output):
+                    assert tracing.main() == 0
+            finally:
+                sys.argv = argv
+            rows = output.getvalue().splitlines()
+            assert rows[0].split()[:2] == ["stage", "count"]
+            assert sorted(row.split()[0] for row in rows[1:]) == ["inference", "other", "parse", "request"]
+        
+        print("✓ Tracing works")
+        return True
+    except Exception as e:
+        print(f"✗ Tracing testing failed: {e}")
+        return False
+
+def test_output_cache():
+    """Test read-only command caching and mtime invalidation."""
+    print("\nTesting output cache...")
+    
+    try:
+        import tempfile
+        import time
+        from src.tools.output_cache import OutputCache, command_paths
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            notes = os.path.join(tmp_dir, "notes.txt")
+            with open(notes, "w") as f:
+                f.write("one\n")
+            
+            cache = OutputCache(max_bytes=1024, ttl_seconds=60)
+            assert command_paths("cat notes.txt | wc -l", tmp_dir) is None
+            assert command_paths("rm notes.txt", tmp_dir) is None
+            # Following, reading stdin, or a tty-dependent layout is never cached
+            assert command_paths("tail -f notes.txt", tmp_dir) is None
+            assert command_paths("tail -n 5 notes.txt", tmp_dir) == [tmp_dir, notes]
+            assert command_paths("cat", tmp_dir) is None
+            assert command_paths("grep one", tmp_dir) is None
+            assert command_paths("grep one notes.txt", tmp_dir) == [tmp_dir, notes]
+            assert command_paths("ls", tmp_dir, terminal=True) is None
+            assert command_paths("ls -1", tmp_dir, terminal=True) == [tmp_dir]
+            
+            first = cache.run("cat notes.txt", cwd=tmp_dir)
+            second = cache.run("cat notes.txt", cwd=tmp_dir)
+            assert first["stdout"] == "one\n" and not first["cached"]
+            assert second["cached"] and second["stdout"] == "one\n"
+            
+            # Rewriting the file invalidates the entry
+            time.sleep(0.01)
+            with open(notes, "w") as f:
+                f.write("two\n")
+            third = cache.run("cat notes.txt", cwd=tmp_dir)
+            assert not third["cached"] and third["stdout"] == "two\n"
+            
+            # A new file in the directory invalidates a listing
+            cache.run("ls", cwd=tmp_dir)
+            open(os.path.join(tmp_dir, "new.txt"), "w").close()
+            assert "new.txt" in cache.run("ls", cwd=tmp_dir)["stdout"]
+            
+            # Editing a listed file invalidates a long listing, not just a new entry
+            assert cache.run("ls -l", cwd=tmp_dir)["cached"] is False
+            assert cache.run("ls -l", cwd=tmp_dir)["cached"] is True
+            time.sleep(0.01)
+            with open(notes, "a") as f:
+                f.write("three\n")
+            assert cache.run("ls -l", cwd=tmp_dir)["cached"] is False
+            
+            # Failures are not cached, and the byte bound evicts the oldest entry
+            assert not cache.run("cat missing.txt", cwd=tmp_dir)["cached"]
+            with open(notes, "w") as f:
+                f.write("x" * 600)
+            cache.run("cat notes.txt", cwd=tmp_dir)
+            cache.run("head -c 600 notes.txt", cwd=tmp_dir)
+            assert cache.stats()["bytes"] <= 1024 and cache.stats()["evictions"] >= 1
+        
+        # The shell answers the agent's read-only commands from the cache
+        import contextlib
+        import io
+        import signal
+        from src.shell.main import CognosShell
+        from src.tools.output_cache import get_output_cache
+        
+        class Agent:
+            status = "ready"
+            mode = "local"
+            
+            def process_command(self, command, on_message=None):
+                return {"action": "execute", "command": "cat notes.txt", "message": ""}
+        
+        handler = signal.getsignal(signal.SIGINT)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            try:
+                shell = CognosShell()
+                shell.agent = Agent()
+                os.chdir(tmp_dir)
+                with open("notes.txt", "w") as f:
+                    f.write("one\n")
+                
+                shared = get_output_cache()
+                shared.clear()
+                hits = shared.stats()["hits"]
+                for _ in range(2):
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(output):
+                        assert shell.process_natural_language("print my notes") == 0
+                    assert "one" in output.getvalue()
+                assert shared.stats()["hits"] == hits + 1
+            finally:
+                os.chdir(cwd)
+                signal.signal(signal.SIGINT, handler)
+        
+        print("✓ Output cache works")
+        return True
+    except Exception as e:
+        print(f"✗ Output cache testing failed: {e}")
+        return False
+
+def test_batch_runner():
+    """Test JSONL batch processing order, errors and totals."""
+    print("\nTesting batch runner...")
+    
+    try:
+        import io
+        import json
+        import tempfile
+        import threading
+        import time
+        from src.agent.batch import BatchRunner
+        
+        class Client:
+            def __init__(self):
+                self._local = threading.local()
+            
+            @property
+            def last_usage(self):
+                return self._local.usage
+            
+            @last_usage.setter
+            def last_usage(self, usage):
+                self._local.usage = usage
+        
+        class Agent:
+            llama_client = Client()
+            
+            def process_command(self, command, context=None):
+                # Later requests finish first, so ordering is exercised
+                time.sleep(0.05 / len(command))
+                self.llama_client.last_usage = {"prompt_tokens": 10, "cached_tokens": 8,
+                                                "completion_tokens": len(command)}
+                return {"action": "info", "message": command.upper(), "command": None}
+        
+        lines = ['{"id": "first", "command": "a"}', '"bb"', "", "not json", '{"command": "cccc"}']
+        for parallel in (1, 3):
+            output = io.StringIO()
+            summary = BatchRunner(Agent(), parallel=parallel).run(lines, output)
+            results = [json.loads(line) for line in output.getvalue().splitlines()]
+            
+            assert [result["id"] for result in results] == ["first", 2, 4, 5]
+            assert [result["ok"] for result in results] == [True, True, False, True]
+            assert results[1]["response"]["message"] == "BB"
+            assert summary["requests"] == 4 and summary["errors"] == 1
+            assert summary["completion_tokens"] == 7 and summary["cached_tokens"] == 24
+            assert summary["requests_per_sec"] > 0
+        
+        # Context pwd is the request's cwd; failed responses count as errors
+        class DirectoryAgent(Agent):
+            def process_command(self, command, context=None):
+                time.sleep(0.01)
+                self.llama_client.last_usage = {}
+                if command == "fail":
+                    return {"action": "info", "message": "Error: boom", "command": None, "error": "boom"}
+                return {"action": "info", "message": os.getcwd(), "command": None}
+        
+        home = os.getcwd()
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            first, second = os.path.realpath(first), os.path.realpath(second)
+            lines = [json.dumps({"command": "pwd", "context": {"pwd": pwd}})
+                     for pwd in (first, second, first, None, second)]
+            lines.append('"fail"')
+            output = io.StringIO()
+            summary = BatchRunner(DirectoryAgent(), parallel=3).run(lines, output)
+            results = [json.loads(line) for line in output.getvalue().splitlines()]
+            
+            assert [result["response"]["message"] for result in results[:5]] == [first, second, first, home, second]
+            assert results[5]["ok"] is False and results[5]["error"] == "boom"
+            assert summary["errors"] == 1
+            assert os.getcwd() == home
+        
+        print("✓ Batch runner works")
+        return True
+    except Exception as e:
+        print(f"✗ Batch runner testing failed: {e}")
+        return False
+
+def test_prompt_assembler():
+    """Test relevance selection and the token budget of prompt assembly."""
+    print("\nTesting prompt assembler...")
+    
+    try:
+        from src.agent.prompt import PromptAssembler
+        from src.tools.registry import ToolRegistry
+        
+        tools = ToolRegistry().list_tools()
+        tools["weather"] = "Report the weather forecast"
+        count = lambda text: len(text.split())
+        assembler = PromptAssembler(tools, count, budget=1000)
+        
+        prompt, info = assembler.assemble("System: core\n\n", "User request: x", "create a python environment")
+        assert info["tools"] == ["run_command", "create_env"]
+        assert "search_folder: Find" not in prompt and "use create_env" in prompt
+        assert info["tokens"] == 1 + count(prompt)
+        
+        # Plugin tools are matched on their description
+        _, info = assembler.assemble("", "", "what is the weather forecast")
+        assert info["tools"] == ["run_command", "weather"]
+        
+        # Sections that do not fit are left out, but the request always goes in
+        tight = PromptAssembler(tools, count, budget=40)
+        prompt, info = tight.assemble("System: core\n\n", "User request: find my folder", "find my folder")
+        assert info["tools"] == ["search_folder"] and prompt.endswith("find my folder")
+        
+        everything = PromptAssembler(tools, count, budget=1000, dynamic=False)
+        assert len(everything.assemble("", "", "hi")[1]["tools"]) == len(tools)
+        
+        print("✓ Prompt assembler works")
+        return True
+    except Exception as e:
+        print(f"✗ Prompt assembler testing failed: {e}")
+        return False
+
+def test_speculative_stats():
+    """Test draft proposal counting and acceptance rate."""
+    print("\nTesting speculative decoding stats...")
+    
+    try:
+        from src.agent.speculative import DraftStats, acceptance
+        
+        stats = DraftStats(lambda input_ids: input_ids[-3:])
+        assert len(stats([1, 2, 3, 4])) == 3
+        stats([1, 2])
+        assert stats.snapshot() == (2, 5)
+        
+        # 2 rounds produced 6 tokens: 4 came from accepted drafts
+        assert acceptance(6, 2, 5) == {"proposed": 5, "accepted": 4, "rate": 0.8}
+        assert acceptance(1, 1, 0)["rate"] is None
+        assert acceptance(20, 2, 5)["accepted"] == 5
+        
+        print("✓ Speculative decoding stats work")
+        return True
+    except Exception as e:
+        print(f"✗ Speculative decoding stats testing failed: {e}")
+        return False
+
+def test_model_router():
+    """Test tier escalation and per-tier statistics."""
+    print("\nTesting model router...")
+    
+    try:
+        import json
+        from src.agent.router import ModelRouter, Tier
+        
+        class Client:
+            grammar = None
+            n_ctx = 2048
+            
+            def __init__(self, answer, avg_logprob=None):
+                self.answer = answer
+                self.last_avg_logprob = avg_logprob
+                self.last_usage = {"prompt_tokens": 10, "cached_tokens": 0, "completion_tokens": 5}
+            
+            def generate(self, prompt, on_message=None, deadline=None, cancel_event=None):
+                if on_message:
+                    on_message(self.answer[:4])
+                return self.answer
+        
+        def check(text):
+            try:
+                response = json.loads(text)
+            except json.JSONDecodeError:
+                return "schema"
+            return "unknown_tool" if response.get("tool") == "rm_everything" else None
+        
+        class Log:
+            def info(self, message):
+                pass
+        
+        good = '{"tool": "run_command"}'
+        def route(small_answer, avg_logprob=None):
+            small = Tier("small", Client(small_answer, avg_logprob), min_avg_logprob=-1.0)
+            router = ModelRouter([small, Tier("large", Client(good))], check, Log())
+            seen = []
+            text = router.generate("prompt", on_message=seen.append)
+            return router, text, seen
+        
+        router, text, seen = route('{"tool": "list_options"}', avg_logprob=-0.2)
+        assert router.last_tier == "small" and seen == ['{"to']
+        assert router.last_usage["completion_tokens"] == 5
+        
+        for answer, avg_logprob, reason in [("not json", None, "schema"),
+                                            ('{"tool": "rm_everything"}', None, "unknown_tool"),
+                                            ('{"tool": "list_options"}', -2.5, "low_confidence")]:
+            router, text, seen = route(answer, avg_logprob)
+            assert text == good and router.last_tier == "large"
+            assert router.last_usage["completion_tokens"] == 10
+            stats = router.stats()
+            assert stats["small"]["escalations"][reason] == 1 and stats["small"]["hit_rate"] == 0
+            assert stats["large"]["accepted"] == 1 and stats["large"]["mean_ms"] is not None
+        
+        print("✓ Model router works")
+        return True
+    except Exception as e:
+        print(f"✗ Model router testing failed: {e}")
+        return False
+
+def test_generation_cancel():
+    """Test per-request cancellation, queued daemon cancels and the deadline."""
+    print("\nTesting generation cancel...")
+    
+    try:
+        import tempfile
+        import threading
+        import time
+        from benchmarks.fake_llama import FakeLlama
+        from src.agent.daemon import AgentDaemon
+        from src.agent.llama_client import LlamaClient, GenerationCancelled
+        from src.agent.main import CognosAgent
+        
+        # 200 tokens at 10 ms each: two seconds unless stopped
+        client = LlamaClient(model=FakeLlama(response="x" * 800, token_latency=0.01))
+        
+        cancel_event = threading.Event()
+        threading.Timer(0.05, cancel_event.set).start()
+        start = time.perf_counter()
+        try:
+            client.generate("prompt", cancel_event=cancel_event)
+            raise AssertionError("generation was not cancelled")
+        except GenerationCancelled as e:
+            assert e.reason == "cancelled" and e.tokens < 20
+        assert time.perf_counter() - start < 0.5
+        
+        try:
+            client.generate("prompt", deadline=time.perf_counter() + 0.05)
+            raise AssertionError("deadline was not enforced")
+        except GenerationCancelled as e:
+            assert e.reason == "deadline"
+        
+        # Cancelling one request leaves a concurrent one alone
+        client.model.response = '{"action": "info", "message": "' + "x" * 80 + '"}'
+        agent = CognosAgent(llama_client=client)
+        agent.response_cache = None
+        first, second = threading.Event(), threading.Event()
+        results = {}
+        workers = [
+            threading.Thread(target=lambda: results.update(
+                first=agent.process_command("summarize the weather report", cancel_event=first))),
+            threading.Thread(target=lambda: results.update(
+                second=agent.process_command("summarize the news report", cancel_event=second)))
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(0.05)
+        first.set()
+        for worker in workers:
+            worker.join()
+        assert results["first"]["cancelled"] == "cancelled"
+        assert "cancelled" not in results["second"]
+        
+        # A daemon request queued behind another one can be cancelled
+        class Agent:
+            def process_command(self, command, context=None, on_message=None, cancel_event=None):
+                return {"action": "info", "cancelled": "cancelled" if cancel_event.is_set() else None}
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The socket is owner-only, and the umask is restored after bind()
+            umask = os.umask(0o022)
+            try:
+                daemon = AgentDaemon(os.path.join(tmp_dir, "agentd.sock"), agent=Agent())
+            finally:
+                restored = os.umask(umask)
+            assert restored == 0o022
+            try:
+                assert os.stat(daemon.socket_path).st_mode & 0o777 == 0o600
+                queued = {}
+                with daemon._lock:
+                    worker = threading.Thread(target=lambda: queued.update(
+                        response=daemon._process_command("ls", {}, None, "r1")))
+                    worker.start()
+                    while "r1" not in daemon._requests:
+                        time.sleep(0.001)
+                    assert daemon.dispatch({"op": "cancel", "request_id": "r1"})["cancelled"]
+                worker.join()
+                assert queued["response"]["cancelled"] == "cancelled"
+                assert not daemon.dispatch({"op": "cancel", "request_id": "r1"})["cancelled"]
+            finally:
+                daemon.server_close()
+        
+        # A request waiting for the model to load can be cancelled too
+        import src.agent.client as agent_client
+        loaded = threading.Event()
+        
+        class LocalAgent:
+            def process_command(self, command, on_message=None):
+                return {"action": "info", "message": command, "command": None}
+        
+        def load_slowly():
+            loaded.wait(5)
+            return LocalAgent()
+        
+        create_local_agent = agent_client.create_local_agent
+        agent_client.create_local_agent = load_slowly
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                shell_client = agent_client.AgentClient(os.path.join(tmp_dir, "none.sock"), background=True)
+                threading.Timer(0.05, shell_client.cancel).start()
+                start = time.perf_counter()
+                assert shell_client.process_command("ls")["cancelled"] == "cancelled"
+                assert time.perf_counter() - start < 1
+                loaded.set()
+                assert shell_client.process_command("ls")["message"] == "ls"
+        finally:
+            agent_client.create_local_agent = create_local_agent
+        
+        print("✓ Generation cancel works")
+        return True
+    except Exception as e:
+        print(f"✗ Generation cancel testing failed: {e}")
+        return False
+
+def test_autotune():
+    """Test the tuning sweep, its tie rule and profile storage."""
+    print("\nTesting autotune...")
+    
+    try:
+        import tempfile
+        from src.agent.autotune import Autotuner, available_cpus, load_profile, save_profile
+        from src.common.config import Config
+        
+        class SyntheticTuner(Autotuner):
+            def measure(self, params):
+                if params["use_mlock"]:
+                    raise OSError("cannot lock memory")
+                # More threads help; batch 256 is faster, but only by noise
+                score = 1.0 / params["n_threads"] + (0.99 if params["n_batch"] == 256 else 1.0)
+                return {"load_s": 0.1, "prefill_tps": 100 / score, "decode_tps": 10 / score, "score_s": score}
+        
+        logged = []
+        tuner = SyntheticTuner("model.gguf", max_ctx=2048, min_ctx=1024, log=logged.append)
+        profile = tuner.run()
+        assert profile["n_threads"] == available_cpus()
+        assert profile["n_batch"] == 128
+        assert profile["use_mmap"] and not profile["use_mlock"]
+        assert profile["n_ctx"] == 2048
+        assert any("failed" in line for line in logged)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = Config(os.path.join(tmp_dir, "config.json"))
+            config.set("agent.autotune.path", os.path.join(tmp_dir, "cache", "tuning.json"))
+            assert load_profile(config, "abc") is None
+            save_profile(config, "abc", profile)
+            assert load_profile(config, "abc") == profile
+            assert load_profile(config, "other-model") is None
+            config.set("agent.autotune.enabled", False)
+            assert load_profile(config, "abc") is None
+        
+        print("✓ Autotune works")
+        return True
+    except Exception as e:
+        print(f"✗ Autotune testing failed: {e}")
+        return False
+
+def test_memory_budget():
+    """Test GGUF footprint estimates and model selection under a memory budget."""
+    print("\nTesting memory budget...")
+    
+    try:
+        import struct
+        import tempfile
+        from src.agent.memory import (MB, MemoryBudgetError, gguf_metadata, kv_cache_bytes,
+                                      plan, select_configuration)
+        from src.common.config import Config
+        
+        def write_gguf(path, n_layer, n_embd, weights_mb):
+            def string(text):
+                return struct.pack("<Q", len(text)) + text.encode()
+            
+            fields = [("general.architecture", 8, string("llama")),
+                      ("tokenizer.ggml.tokens", 9, struct.pack("<IQ", 8, 2) + string("a") + string("b")),
+                      ("llama.block_count", 4, struct.pack("<I", n_layer)),
+                      ("llama.embedding_length", 4, struct.pack("<I", n_embd)),
+                      ("llama.attention.head_count", 4, struct.pack("<I", 32)),
+                      ("llama.attention.head_count_kv", 4, struct.pack("<I", 8))]
+            with open(path, "wb") as f:
+                f.write(b"GGUF" + struct.pack("<IQQ", 3, 0, len(fields)))
+                for key, value_type, value in fields:
+                    f.write(string(key) + struct.pack("<I", value_type) + value)
+                f.truncate(weights_mb * MB)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            large = os.path.join(tmp_dir, "large.gguf")
+            small = os.path.join(tmp_dir, "small.gguf")
+            write_gguf(large, 32, 4096, 400)
+            write_gguf(small, 22, 2048, 60)
+            
+            metadata = gguf_metadata(large)
+            assert metadata["llama.block_count"] == 32 and metadata["tokenizer.ggml.tokens"] == 2
+            # Grouped-query attention: 8 of 32 heads, so a quarter of n_embd per token
+            assert kv_cache_bytes(metadata, 2048) == 2 * 32 * 2048 * 1024 * 2
+            
+            config = Config(os.path.join(tmp_dir, "config.json"))
+            config.set("agent.context_length", 4096)
+            config.set("agent.memory.overhead_mb", 0)
+            config.set("agent.memory.reserve_mb", 100)
+            
+            # 900 MB budget: large needs 400 MB plus 512 MB of KV at 4096, 256 MB at 2048
+            result = plan(config, large, meminfo={"MemAvailable": 1000 * MB})
+            assert result["budget"] == 900 * MB
+            assert (result["choice"]["model_path"], result["choice"]["n_ctx"]) == (large, 2048)
+            assert not result["candidates"][0]["fits"]
+            
+            result = plan(config, large, meminfo={"MemAvailable": 400 * MB})
+            assert (result["choice"]["model_path"], result["choice"]["n_ctx"]) == (small, 4096)
+            assert plan(config, large, select_model=False, meminfo={"MemAvailable": 400 * MB})["choice"] is None
+            assert plan(config, large, meminfo={})["choice"]["estimate"] is None
+            
+            config.set("agent.memory.budget_mb", 10)
+            try:
+                select_configuration(config, large)
+                raise AssertionError("a configuration that would swap was accepted")
+            except MemoryBudgetError as e:
+                assert "would swap" in str(e)
+        
+        print("✓ Memory budget works")
+        return True
+    except Exception as e:
+        print(f"✗ Memory budget testing failed: {e}")
+        return False
+
+def test_response_cache():
+    """Test response cache hits, misses and eviction."""
+    print("\nTesting response cache...")
+    
+    try:
+        import tempfile
+        from src.agent.cache import ResponseCache
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResponseCache(os.path.join(tmp_dir, "responses.db"), max_entries=2)
+            context = {"pwd": "/home/pi", "user": "pi", "os": "Linux"}
+            
+            assert cache.get("show me files", context) is None
+            cache.put("show me files", context, {"action": "execute", "command": "ls -la"})
+            assert cache.get("  Show me   files! ", context)["command"] == "ls -la"
+            assert cache.get("show me files", {**context, "pwd": "/tmp"}) is None
+            
+            cache.put("what's here", context, {"action": "execute", "command": "ls"})
+            cache.put("make directory foo", context, {"action": "execute", "command": "mkdir foo"})
+            stats = cache.stats()
+            assert stats["entries"] == 2 and stats["evictions"] == 1
+            assert stats["hits"] == 1 and stats["misses"] == 2
+            
+            assert cache.invalidate() == 2
+            cache.close()
+        
+        print("✓ Response cache works")
+        return True
+    except Exception as e:
+        print(f"✗ Response cache testing failed: {e}")
+        return False
+
+def test_directory_index():
+    """Test directory index search and incremental refresh."""
+    print("\nTesting directory index...")
+    
+    try:
+        import tempfile
+        from src.tools.dirindex import DirectoryIndex
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = os.path.join(tmp_dir, "root")
+            for path in ("Downloads", "projects/downloads-old", "projects/app/node_modules/dl"):
+                os.makedirs(os.path.join(root, path))
+            
+            index = DirectoryIndex(os.path.join(tmp_dir, "dirindex.db"), root)
+            assert not index.is_built()
+            index.build()
+            
+            results = index.search("download")
+            assert results[0] == os.path.join(root, "Downloads")
+            assert len(results) == 2
+            assert index.search("dl") == []
+            
+            os.makedirs(os.path.join(root, "projects", "app", "Downloads"))
+            os.rmdir(os.path.join(root, "projects", "downloads-old"))
+            index.refresh()
+            results = index.search("downloads", under=os.path.join(root, "projects"))
+            assert results == [os.path.join(root, "projects", "app", "Downloads")]
+            
+            # Directories removed before a refresh are dropped, and the next
+            # match takes their place
+            os.rmdir(os.path.join(root, "Downloads"))
+            assert index.search("downloads", limit=1) == [os.path.join(root, "projects", "app", "Downloads")]
+            with index._connect() as db:
+                assert db.execute("SELECT COUNT(*) FROM dirs WHERE path = ?",
+                                  (os.path.join(root, "Downloads"),)).fetchone()[0] == 0
+        
+        print("✓ Directory index works")
+        return True
+    except Exception as e:
+        print(f"✗ Directory index testing failed: {e}")
+        return False
+
+def test_directory_walker():
+    """Test walker ranking, exclusions and early termination."""
+    print("\nTesting directory walker...")
+    
+    try:
+        import tempfile
+        from src.tools.walker import DirectoryWalker, match_rank
+        
+        with tempfile.TemporaryDirectory() as root:
+            for path in ("a/old-src", "src-tools", "b/c/src", ".git/src", "d/e/f/src-deep"):
+                os.makedirs(os.path.join(root, path))
+            
+            walker = DirectoryWalker(max_depth=4, exclude=[".git"], time_budget=5.0)
+            results = walker.search(root, "src", max_results=10)
+            assert results[0] == os.path.join(root, "b", "c", "src")
+            assert results[1] == os.path.join(root, "src-tools")
+            assert os.path.join(root, ".git", "src") not in results
+            assert os.path.join(root, "d", "e", "f", "src-deep") in results
+            
+            # Stops after the level where enough matches were found
+            assert walker.search(root, "src", max_results=1) == [os.path.join(root, "src-tools")]
+            assert match_rank("SRC", "src", 3) < match_rank("src-tools", "src", 1)
+        
+        print("✓ Directory walker works")
+        return True
+    except Exception as e:
+        print(f"✗ Directory walker testing failed: {e}")
+        return False
+
+def test_frecency():
+    """Test frecency ranking, aging and "go to" parsing."""
+    print("\nTesting frecency database...")
+    
+    try:
+        import tempfile
+        from src.shell.frecency import FrecencyDB, jump_target
+        
+        assert jump_target("go to the downloads folder") == "downloads"
+        assert jump_target("please take me to my Projects directory") == "Projects"
+        assert jump_target("go to the store and buy some milk") is None
+        assert jump_target("switch to myenv") is None
+        assert jump_target("move to staging") is None
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old = os.path.join(tmp_dir, "old", "downloads")
+            recent = os.path.join(tmp_dir, "recent", "downloads")
+            prefixed = os.path.join(tmp_dir, "downloads-archive")
+            for path in (old, recent, prefixed):
+                os.makedirs(path)
+            
+            db = FrecencyDB(os.path.join(tmp_dir, "frecency.db"), max_total_rank=20)
+            now = 1_000_000_000
+            for _ in range(5):
+                db.add(old, now=now - 30 * 86400)
+            db.add(recent, now=now - 60)
+            db.add(prefixed, now=now)
+            
+            # 1 visit a minute ago outscores 5 visits a month ago; exact beats prefix
+            assert db.query("Downloads", now=now) == [recent, old, prefixed]
+            
+            os.rmdir(recent)
+            assert db.query("downloads", now=now)[0] == old
+            
+            for _ in range(20):
+                db.add(prefixed, now=now)
+            total = db.db.execute("SELECT SUM(rank) FROM dirs").fetchone()[0]
+            assert total <= 20
+            db.close()
+        
+        print("✓ Frecency database works")
+        return True
+    except Exception as e:
+        print(f"✗ Frecency testing failed: {e}")
+        return False
+
+def test_persistent_shell():
+    """Test exit status capture and state kept between commands."""
+    print("\nTesting persistent shell backend...")
+    
+    if not os.path.exists("/bin/bash"):
+        print("⚠ bash not available, skipping")
+        return True
+    
+    try:
+        import io
+        from src.shell.backend import PersistentShell, ShellExited
+        
+        shell = PersistentShell()
+        output = io.BytesIO()
+        assert shell.run("echo hi; false", output=output) == 1
+        assert output.getvalue().replace(b"\r", b"") == b"hi\n"
+        
+        assert shell.run("cd / && export COGNOS_TEST=1", output=io.BytesIO()) == 0
+        assert shell.cwd == "/"
+        output = io.BytesIO()
+        shell.run('printf "%s" "$COGNOS_TEST"', output=output)
+        assert output.getvalue() == b"1"
+        
+        # An unterminated quote must not leave bash waiting for more input
+        assert shell.run('echo "oops', output=io.BytesIO()) != 0
+        
+        try:
+            shell.run("exit 3", output=io.BytesIO())
+            assert False, "exit did not end the shell"
+        except ShellExited as e:
+            assert e.status == 3 and not shell.alive
+        shell.close()
+        
+        print("✓ Persistent shell backend works")
+        return True
+    except Exception as e:
+        print(f"✗ Persistent shell testing failed: {e}")
+        return False
+
+def test_intent_matcher():
+    """Test fast-path intent rules."""
+    print("\nTesting intent matcher...")
+    
+    try:
+        from src.agent.intents import IntentMatcher
+        matcher = IntentMatcher()
+        
+        result = matcher.match("show me files")
+        assert result["tool_calls"] == [{"tool": "run_command", "args": {"command": "ls -la"}}]
+        
+        result = matcher.match("Please create a file called Notes.txt")
+        assert result["command"] == "touch Notes.txt"
+        
+        result = matcher.match("make directory a;reboot")
+        assert result["command"] == "mkdir 'a;reboot'"
+        
+        result = matcher.match("find the projects folder")
+        assert result["tool_calls"][0] == {"tool": "search_folder", "args": {"pattern": "projects"}}
+        
+        assert matcher.match("what is the weather like on mars") is None
+        
+        custom = IntentMatcher([{"patterns": [r"disk usage"], "tool": "run_command", "args": {"command": "df -h"}}])
+        assert custom.match("disk usage")["command"] == "df -h"
+        
+        print("✓ Intent matcher works")
+        return True
+    except Exception as e:
+        print(f"✗ Intent matcher testing failed: {e}")
+        return False
+
+def test_json_stream_scanner():
+    """Test incremental JSON scanning of streamed model output."""
+    print("\nTesting JSON stream scanner...")
+    
+    try:
+        from src.agent.streaming import JsonStreamScanner
+        
+        output = ' {"action": "info", "message": "Say \\"hi\\"", "tool_calls": []}\n\nextra text'
+        scanner = JsonStreamScanner()
+        message = ""
+        for i in range(0, len(output), 3):
+            message += scanner.feed(output[i:i + 3])
+            if scanner.complete:
+                break
+        
+        assert scanner.complete
+        assert message == 'Say "hi"'
+        assert scanner.text == '{"action": "info", "message": "Say \\"hi\\"", "tool_calls": []}'
+        
+        print("✓ JSON stream scanner works")
+        return True
+    except Exception as e:
+        print(f"✗ JSON stream scanner testing failed: {e}")
+        return False
+
 def test_llama_import():
     """Test llama-cpp-python import."""
     print("\nTesting llama-cpp-python...")
@@ -86,6 +1137,26 @@ def main():
     
     success &= test_imports()
     success &= test_tools()
+    success &= test_tool_executor()
+    success &= test_tool_grammar()
+    success &= test_config_reload()
+    success &= test_async_logging()
+    success &= test_tracing()
+    success &= test_output_cache()
+    success &= test_batch_runner()
+    success &= test_prompt_assembler()
+    success &= test_speculative_stats()
+    success &= test_model_router()
+    success &= test_generation_cancel()
+    success &= test_autotune()
+    success &= test_memory_budget()
+    success &= test_response_cache()
+    success &= test_directory_index()
+    success &= test_directory_walker()
+    success &= test_frecency()
+    success &= test_persistent_shell()
+    success &= test_intent_matcher()
+    success &= test_json_stream_scanner()
     success &= test_llama_import()
     
     print("\n" + "=" * 40)